@@ -0,0 +1,191 @@
+# ==============================================================================
+# 基準測試：bench_scan_syscalls.py
+# - 在合成目錄樹上比較三種掃描方式的 syscall 次數與耗時：
+#     walk+stat     ：最初的 os.walk + 每檔 os.stat
+#     listdir+lstat ：前一版增量掃描器（每個項目 lstat，符號連結再 stat 一次）
+#     scandir       ：現行 FileSnapshot（DirEntry 類型判斷 + 每檔一次 stat）
+# - 以 patch 包住 os.stat / os.lstat / os.listdir / os.scandir 與 DirEntry.stat 計數；
+#   DirEntry.is_dir() 在 d_type 未知的檔案系統上也可能 stat，這部分無法從 Python 端量到。
+#
+# 用法：python benchmarks/bench_scan_syscalls.py [目錄數，預設 200] [每目錄檔案數，預設 50]
+# ==============================================================================
+
+import os
+import sys
+import stat
+import time
+import shutil
+import tempfile
+from unittest.mock import patch
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.core.sentry_worker import FileSnapshot, SENTRY_INTERNAL_IGNORE
+
+
+def build_tree(root: str, dirs: int, files: int) -> None:
+    for d in range(dirs):
+        sub = os.path.join(root, f"pkg{d // 20:02d}", f"mod{d:03d}")
+        os.makedirs(sub, exist_ok=True)
+        for f in range(files):
+            with open(os.path.join(sub, f"f{f:03d}.py"), "w") as fh:
+                fh.write("x")
+        os.symlink(os.path.join(sub, "f000.py"), os.path.join(sub, "link.py"))
+    # 被忽略的子樹：應在 stat 之前就被剔除。
+    for name in (".git", "__pycache__"):
+        ignored = os.path.join(root, name, "objects")
+        os.makedirs(ignored, exist_ok=True)
+        for f in range(dirs * files // 10):
+            with open(os.path.join(ignored, f"o{f:05d}"), "w") as fh:
+                fh.write("x")
+
+
+def scan_walk_stat(root: str) -> dict:
+    files = {}
+    for current, dirs, names in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in SENTRY_INTERNAL_IGNORE]
+        for name in names:
+            if name in SENTRY_INTERNAL_IGNORE:
+                continue
+            full_path = os.path.join(current, name)
+            try:
+                st = os.stat(full_path)
+                files[full_path] = (st.st_mtime, st.st_size)
+            except OSError:
+                pass
+    return files
+
+
+def scan_listdir_lstat(root: str) -> dict:
+    files = {}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            os.stat(directory)
+            names = sorted(os.listdir(directory))
+        except OSError:
+            continue
+        for name in names:
+            if name in SENTRY_INTERNAL_IGNORE:
+                continue
+            full_path = os.path.join(directory, name)
+            try:
+                st = os.lstat(full_path)
+                if stat.S_ISLNK(st.st_mode):
+                    st = os.stat(full_path)
+                    if stat.S_ISDIR(st.st_mode):
+                        continue
+                elif stat.S_ISDIR(st.st_mode):
+                    stack.append(full_path)
+                    continue
+            except OSError:
+                continue
+            files[full_path] = (st.st_mtime, st.st_size)
+    return files
+
+
+def scan_scandir(root: str) -> FileSnapshot:
+    return FileSnapshot(root)
+
+
+class _CountingEntry:
+    def __init__(self, entry, counts):
+        self._entry = entry
+        self._counts = counts
+        self._stat = None
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self, *, follow_symlinks=True):
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        return self._entry.is_symlink()
+
+    def is_junction(self):
+        return False
+
+    def stat(self, *, follow_symlinks=True):
+        if self._stat is None:
+            self._counts["entry.stat"] += 1
+            self._stat = self._entry.stat(follow_symlinks=follow_symlinks)
+        return self._stat
+
+
+class _CountingScandir:
+    def __init__(self, iterator, counts):
+        self._it = iterator
+        self._counts = counts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._it.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return _CountingEntry(next(self._it), self._counts)
+
+
+def count_syscalls(func, root: str) -> dict:
+    counts = {"stat": 0, "lstat": 0, "listdir": 0, "scandir": 0, "entry.stat": 0}
+    real = {name: getattr(os, name) for name in ("stat", "lstat", "listdir", "scandir")}
+
+    def counting(name):
+        def wrapper(*args, **kwargs):
+            counts[name] += 1
+            result = real[name](*args, **kwargs)
+            return _CountingScandir(result, counts) if name == "scandir" else result
+        return wrapper
+
+    patches = [patch(f"os.{name}", counting(name)) for name in real]
+    for p in patches:
+        p.start()
+    try:
+        result = func(root)
+    finally:
+        for p in patches:
+            p.stop()
+    counts["total"] = sum(counts.values())
+    counts["files"] = len(result)
+    return counts
+
+
+def best_time(func, root: str, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(root)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    dirs = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    files = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    root = tempfile.mkdtemp(prefix="bench_scan_")
+    try:
+        build_tree(root, dirs, files)
+        print(f"合成樹：{dirs} 個目錄 x {files} 個檔案（另含被忽略的 .git / __pycache__）\n")
+        header = f"{'掃描方式':<16}{'files':>8}{'stat':>8}{'lstat':>8}{'listdir':>9}{'scandir':>9}{'entry.stat':>12}{'total':>8}{'ms':>9}"
+        print(header)
+        print("-" * len(header))
+        for label, func in (("walk+stat", scan_walk_stat),
+                            ("listdir+lstat", scan_listdir_lstat),
+                            ("scandir", scan_scandir)):
+            c = count_syscalls(func, root)
+            ms = best_time(func, root) * 1000
+            print(f"{label:<16}{c['files']:>8}{c['stat']:>8}{c['lstat']:>8}{c['listdir']:>9}"
+                  f"{c['scandir']:>9}{c['entry.stat']:>12}{c['total']:>8}{ms:>9.1f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# ==============================================================================
+# 基準測試：bench_snapshot_columns.py
+# - 比較「路徑字串字典」（舊版 FileSnapshot.files）與「駐留表 + 欄位」（現行 FileSnapshot）
+#   在大量檔案下的記憶體用量與比對時間。
+# - 不觸碰磁碟：以合成資料直接填入兩種結構，只量測資料結構本身。
+#
+# 用法：python benchmarks/bench_snapshot_columns.py [檔案數量，預設 1000000]
+# ==============================================================================
+
+import os
+import sys
+import time
+import tracemalloc
+from array import array
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.core.sentry_worker import FileSnapshot, PathTable, diff_snapshots, np
+
+ROOT = "/bench/project"
+FILES_PER_DIR = 50
+
+
+def _synthetic_entries(count: int):
+    """產生 (目錄, 檔名, mtime, size)，目錄與檔名都按字母序。"""
+    for i in range(count):
+        d = i // FILES_PER_DIR
+        yield f"{ROOT}/pkg{d // 100:04d}/mod{d % 100:02d}", f"file_{i % FILES_PER_DIR:03d}.py", 1_700_000_000.0 + i, 1000 + i % 997
+
+
+def build_dict(count: int):
+    return {os.path.join(d, n): (m, s) for d, n, m, s in _synthetic_entries(count)}
+
+
+def build_columns(count: int, table: PathTable = None) -> FileSnapshot:
+    snap = FileSnapshot.__new__(FileSnapshot)
+    snap.table = table if table is not None else PathTable()
+    snap.ids, snap.mtimes, snap.sizes, snap.inodes = array('q'), array('d'), array('q'), array('Q')
+    snap.dirs, snap.dir_keys = {}, {}
+    snap.scan_started_ns = 0
+    current, start = None, 0
+    for d, n, m, s in _synthetic_entries(count):
+        if d != current:
+            if current is not None:
+                snap.dirs[current] = (0, start, len(snap.ids), ())
+            current, start = d, len(snap.ids)
+        snap.ids.append(snap.table.file_id(snap.table.dir_id(d), n))
+        snap.mtimes.append(m)
+        snap.sizes.append(s)
+        snap.inodes.append(0)
+    if current is not None:
+        snap.dirs[current] = (0, start, len(snap.ids), ())
+    return snap
+
+
+def diff_dicts(old, new):
+    """舊版 diff_snapshots 的逐檔比對邏輯。"""
+    events = []
+    for path, (mtime, size) in new.items():
+        if path not in old:
+            events.append(('created', path))
+        else:
+            old_mtime, old_size = old[path]
+            if mtime > old_mtime or size != old_size:
+                events.append(('modified', path))
+    for path in old:
+        if path not in new:
+            events.append(('deleted', path))
+    return events
+
+
+def measure(label, func):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def timed(func, repeat=3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f"檔案數量: {count:,}  (NumPy: {'有' if np is not None else '無，使用 array 區塊比對'})")
+
+    old_dict, dict_bytes, _ = measure("dict", lambda: build_dict(count))
+    new_dict = build_dict(count)
+
+    # 第一份快照包含駐留表本身；第二份快照共用同一張表，只多三條欄位。
+    old_cols, first_bytes, _ = measure("columns", lambda: build_columns(count))
+    new_cols, second_bytes, _ = measure("columns", lambda: build_columns(count, old_cols.table))
+
+    print("\n[記憶體]")
+    print(f"  dict            : {dict_bytes / count:8.1f} bytes/檔案（每份快照）")
+    print(f"  欄位（含駐留表）: {first_bytes / count:8.1f} bytes/檔案（第一份快照）")
+    print(f"  欄位（共用表）  : {second_bytes / count:8.1f} bytes/檔案（之後每份快照）")
+
+    print("\n[比對：無變動]")
+    _, t_dict = timed(lambda: diff_dicts(old_dict, new_dict))
+    _, t_cols = timed(lambda: diff_snapshots(old_cols, new_cols))
+    print(f"  dict : {t_dict * 1000:8.1f} ms")
+    print(f"  欄位 : {t_cols * 1000:8.1f} ms  ({t_dict / t_cols:.0f}x)")
+
+    # 每 1000 個檔案修改一個。
+    for i in range(0, count, 1000):
+        path = new_cols.table.path_of(new_cols.ids[i])
+        new_dict[path] = (new_dict[path][0] + 1, new_dict[path][1])
+        new_cols.mtimes[i] += 1
+
+    print("\n[比對：0.1% 檔案修改]")
+    dict_events, t_dict = timed(lambda: diff_dicts(old_dict, new_dict))
+    col_events, t_cols = timed(lambda: diff_snapshots(old_cols, new_cols))
+    assert len(dict_events) == len(col_events)
+    print(f"  dict : {t_dict * 1000:8.1f} ms  ({len(dict_events):,} 事件)")
+    print(f"  欄位 : {t_cols * 1000:8.1f} ms  ({len(col_events):,} 事件, {t_dict / t_cols:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# ==============================================================================
+# 基準測試：bench_tree_walk.py
+# - 比較 engine._generate_tree 的兩種目錄遍歷方式：
+#     listdir+isdir ：前一版（os.listdir 後，分類與渲染各呼叫一次 os.path.isdir）
+#     scandir       ：現行版本（DirEntry.is_dir() 使用 readdir 帶回的類型，渲染時不再查詢）
+# - 以 patch 包住 os.stat / os.listdir / os.scandir 計數（os.path.isdir 內部即是 os.stat），
+#   並確認兩者輸出的行與節點完全一致。
+# - DirEntry.is_dir() 在 d_type 未知的檔案系統上也可能 stat，這部分無法從 Python 端量到。
+#
+# 用法：python benchmarks/bench_tree_walk.py [目錄數，預設 2000] [每目錄檔案數，預設 50]
+# ==============================================================================
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+from typing import List, Optional, Set
+from unittest.mock import patch
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.core import engine
+
+
+def build_tree(root: str, dirs: int, files: int) -> None:
+    for d in range(dirs):
+        sub = os.path.join(root, f"pkg{d // 50:02d}", f"mod{d:04d}")
+        os.makedirs(sub, exist_ok=True)
+        for f in range(files):
+            with open(os.path.join(sub, f"f{f:03d}.py"), "w") as fh:
+                fh.write("x")
+
+
+def legacy_walk(directory: str, prefix: str, depth: int, rel_path: str, ignore_set: Set[str],
+                max_depth: Optional[int], lines: List[str], nodes: List[engine.TreeNode]) -> None:
+    """前一版 _walk_directory 的遍歷方式（不含並行與資料夾間距），作為對照組。"""
+    if max_depth is not None and depth > max_depth:
+        return
+    try:
+        all_entries = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    dirs, files = [], []
+    for name in all_entries:
+        if name in ignore_set:
+            continue
+        (dirs if os.path.isdir(os.path.join(directory, name)) else files).append(name)
+    entries = sorted(dirs) + sorted(files)
+    for idx, entry_name in enumerate(entries):
+        is_last = (idx == len(entries) - 1)
+        full_path = os.path.join(directory, entry_name)
+        is_dir = os.path.isdir(full_path)
+        display_name = entry_name + "/" if is_dir else entry_name
+        line = f"{prefix}{'└── ' if is_last else '├── '}{display_name}"
+        key = rel_path + display_name
+        lines.append(line)
+        nodes.append((line, key))
+        if is_dir:
+            legacy_walk(full_path, prefix + ("    " if is_last else "│   "), depth + 1, key,
+                        ignore_set, max_depth, lines, nodes)
+
+
+def tree_legacy(root: str):
+    lines = [os.path.basename(os.path.normpath(root)) + "/"]
+    nodes = [(lines[0], "")]
+    legacy_walk(root, "", 1, "", set(engine.SYSTEM_DEFAULT_IGNORE), None, lines, nodes)
+    return lines, nodes
+
+
+def tree_scandir(root: str):
+    return engine._generate_tree(root)
+
+
+def count_syscalls(func, root: str):
+    counts = {"stat": 0, "listdir": 0, "scandir": 0}
+    real = {name: getattr(os, name) for name in counts}
+
+    def counting(name):
+        def wrapper(*args, **kwargs):
+            counts[name] += 1
+            return real[name](*args, **kwargs)
+        return wrapper
+
+    patches = [patch(f"os.{name}", counting(name)) for name in real]
+    for p in patches:
+        p.start()
+    try:
+        result = func(root)
+    finally:
+        for p in patches:
+            p.stop()
+    counts["total"] = sum(counts.values())
+    return counts, result
+
+
+def best_time(func, root: str, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(root)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    dirs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    files = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    root = tempfile.mkdtemp(prefix="bench_tree_")
+    try:
+        build_tree(root, dirs, files)
+        print(f"合成樹：{dirs} 個目錄 x {files} 個檔案\n")
+        header = f"{'遍歷方式':<16}{'lines':>9}{'stat':>9}{'listdir':>9}{'scandir':>9}{'total':>9}{'ms':>9}"
+        print(header)
+        print("-" * len(header))
+        outputs = []
+        for label, func in (("listdir+isdir", tree_legacy), ("scandir", tree_scandir)):
+            c, result = count_syscalls(func, root)
+            outputs.append(result)
+            ms = best_time(func, root) * 1000
+            print(f"{label:<16}{len(result[0]):>9}{c['stat']:>9}{c['listdir']:>9}"
+                  f"{c['scandir']:>9}{c['total']:>9}{ms:>9.1f}")
+        print(f"\n輸出一致：{outputs[0] == outputs[1]}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
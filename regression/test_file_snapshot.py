@@ -0,0 +1,476 @@
+import unittest
+import os
+import sys
+import shutil
+import json
+import tempfile
+from unittest.mock import patch
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# HACK: 確保能找到 src/core
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.core import engine, sentry_worker, snapshot_store
+from src.core.sentry_worker import (
+    FileSnapshot, PathPrefixTrie, PathTable, ProjectConfigWatcher, build_ignore_rules, diff_snapshots,
+    parse_ignore_patterns,
+)
+
+
+def _write(path, content="x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def _bump_mtime(path):
+    """把目錄 mtime 往後推一秒，避免粗粒度時鐘讓測試結果不穩定。"""
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+class _CountingEntry:
+    """包住 DirEntry，只在 stat() 真正觸發 syscall（第一次呼叫）時計數。"""
+
+    def __init__(self, entry, counts):
+        self._entry = entry
+        self._counts = counts
+        self._stat = None
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self, *, follow_symlinks=True):
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        return self._entry.is_symlink()
+
+    def inode(self):
+        return self._entry.inode()
+
+    def stat(self, *, follow_symlinks=True):
+        if self._stat is None:
+            self._counts["entry_stat"] += 1
+            self._stat = self._entry.stat(follow_symlinks=follow_symlinks)
+        return self._stat
+
+
+class _CountingScandir:
+    def __init__(self, iterator, counts):
+        self._it = iterator
+        self._counts = counts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._it.close()
+
+    def __iter__(self):
+        return (_CountingEntry(e, self._counts) for e in self._it)
+
+
+class _SyscallCounter:
+    """以 patch 包住 os 的目錄 / 狀態呼叫，統計次數。"""
+
+    def __init__(self):
+        self.counts = {"stat": 0, "scandir": 0, "entry_stat": 0}
+
+    def __enter__(self):
+        real_stat, real_scandir = os.stat, os.scandir
+
+        def counting_stat(*args, **kwargs):
+            self.counts["stat"] += 1
+            return real_stat(*args, **kwargs)
+
+        def counting_scandir(*args, **kwargs):
+            self.counts["scandir"] += 1
+            return _CountingScandir(real_scandir(*args, **kwargs), self.counts)
+
+        self._patches = [
+            patch("os.stat", counting_stat),
+            patch("os.scandir", counting_scandir),
+        ]
+        for p in self._patches:
+            p.start()
+        return self
+
+    def __exit__(self, *exc):
+        for p in self._patches:
+            p.stop()
+
+
+@patch.object(FileSnapshot, "RACY_WINDOW_NS", 0)
+class TestIncrementalSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="sentry_snapshot_")
+        for d in ("a", "b", "c"):
+            for i in range(5):
+                _write(os.path.join(self.root, d, f"f{i}.txt"))
+        _write(os.path.join(self.root, ".git", "HEAD"))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_idle_incremental_scan_only_stats_directories(self):
+        """沒有任何變動時，增量掃描只 stat 目錄，不 listdir、不 stat 檔案"""
+        base = FileSnapshot(self.root)
+        with _SyscallCounter() as counter:
+            again = FileSnapshot(self.root, previous=base)
+        self.assertEqual(counter.counts, {"stat": 4, "scandir": 0, "entry_stat": 0})
+        self.assertEqual(again.as_dict(), base.as_dict())
+
+    def test_changed_directory_is_relisted(self):
+        """只有 mtime 變動的目錄會被重新列出"""
+        base = FileSnapshot(self.root)
+        _write(os.path.join(self.root, "b", "new.txt"))
+        os.remove(os.path.join(self.root, "b", "f0.txt"))
+        _bump_mtime(os.path.join(self.root, "b"))
+
+        with _SyscallCounter() as counter:
+            current = FileSnapshot(self.root, previous=base)
+        self.assertEqual(counter.counts["scandir"], 1)
+        # 只 stat 被重列目錄中的檔案（5 - 1 + 1 = 5 個），其他目錄的檔案不碰。
+        self.assertEqual(counter.counts["entry_stat"], 5)
+
+        kinds = {(e.event_type, os.path.basename(e.src_path)) for e in diff_snapshots(base, current)}
+        self.assertEqual(kinds, {("created", "new.txt"), ("deleted", "f0.txt")})
+
+    def test_incremental_matches_full_scan_for_structure(self):
+        """增量掃描的檔案名單，必須與全量掃描一致"""
+        base = FileSnapshot(self.root)
+        shutil.rmtree(os.path.join(self.root, "c"))
+        _write(os.path.join(self.root, "d", "deep", "x.txt"))
+        _bump_mtime(self.root)
+
+        incremental = FileSnapshot(self.root, previous=base)
+        full = FileSnapshot(self.root)
+        self.assertEqual(incremental.as_dict().keys(), full.as_dict().keys())
+
+    def test_full_scan_stats_each_file_once(self):
+        """全量掃描每個檔案只 stat 一次，目錄靠 DirEntry 類型判斷，忽略名單不 stat"""
+        with _SyscallCounter() as counter:
+            FileSnapshot(self.root)
+        self.assertEqual(counter.counts, {"stat": 4, "scandir": 4, "entry_stat": 15})
+
+    def test_internal_ignore_is_pruned(self):
+        """內部忽略名單（.git）不會進入快照"""
+        snapshot = FileSnapshot(self.root)
+        self.assertFalse(any(os.sep + ".git" + os.sep in p for p in snapshot.as_dict()))
+
+    def test_structure_only_scan_never_stats_files(self):
+        """結構模式只列目錄，不 stat 任何檔案"""
+        with _SyscallCounter() as counter:
+            snapshot = FileSnapshot(self.root, structure_only=True)
+        self.assertEqual(counter.counts, {"stat": 4, "scandir": 4, "entry_stat": 0})
+        self.assertEqual(len(snapshot), 15)
+
+    def test_structure_only_ignores_content_edits(self):
+        """結構模式下內容修改不產生事件，新增與刪除照常回報"""
+        base = FileSnapshot(self.root, structure_only=True)
+        _write(os.path.join(self.root, "a", "f0.txt"), "changed content")
+        _write(os.path.join(self.root, "b", "new.txt"))
+        os.remove(os.path.join(self.root, "c", "f1.txt"))
+        current = FileSnapshot(self.root, table=base.table, structure_only=True)
+        kinds = sorted((e.event_type, os.path.basename(e.src_path)) for e in diff_snapshots(base, current))
+        self.assertEqual(kinds, [("created", "new.txt"), ("deleted", "f1.txt")])
+
+    def test_project_ignore_prunes_directories(self):
+        """專案忽略規則中的目錄整棵剪掉，連 scandir 都不做"""
+        with _SyscallCounter() as counter:
+            snapshot = FileSnapshot(self.root, ignore=build_ignore_rules(["b"]))
+        self.assertEqual(counter.counts["scandir"], 3)
+        self.assertEqual(len(snapshot), 10)
+        self.assertNotIn(os.path.join(self.root, "b"), snapshot.dirs)
+
+    def test_ignore_rule_change_diffs_as_structure(self):
+        """移除忽略規則後重掃，重新納入的檔案以 created 回報"""
+        base = FileSnapshot(self.root, ignore=build_ignore_rules(["b"]))
+        current = FileSnapshot(self.root, table=base.table, ignore=build_ignore_rules([]))
+        created = sorted(os.path.relpath(e.src_path, self.root) for e in diff_snapshots(base, current))
+        self.assertEqual(created, [os.path.join("b", f"f{i}.txt") for i in range(5)])
+
+    def test_muted_subtree_is_frozen_even_in_full_scan(self):
+        """靜默子樹整段沿用：全量對帳也不列出，其中的變動要等解除靜默後才出現"""
+        base = FileSnapshot(self.root)
+        _write(os.path.join(self.root, "b", "burst.txt"))
+        _write(os.path.join(self.root, "c", "new.txt"))
+        muted = PathPrefixTrie([os.path.join(self.root, "b")])
+
+        with _SyscallCounter() as counter:
+            current = FileSnapshot(self.root, previous=base, muted=muted, full=True)
+        self.assertEqual(counter.counts["scandir"], 3)
+        kinds = [(e.event_type, os.path.basename(e.src_path)) for e in diff_snapshots(base, current)]
+        self.assertEqual(kinds, [("created", "new.txt")])
+
+        released = FileSnapshot(self.root, previous=current, full=True)
+        kinds = [(e.event_type, os.path.basename(e.src_path)) for e in diff_snapshots(current, released)]
+        self.assertEqual(kinds, [("created", "burst.txt")])
+
+    def _moves(self, events):
+        return [(e.event_type, os.path.relpath(e.src_path, self.root),
+                 e.dest_path and os.path.relpath(e.dest_path, self.root)) for e in events]
+
+    def test_rename_is_reported_as_one_move(self):
+        """改名以 inode 配對成一個 moved 事件，不再是刪除 + 建立"""
+        for structure_only in (False, True):
+            with self.subTest(structure_only=structure_only):
+                base = FileSnapshot(self.root, structure_only=structure_only)
+                os.rename(os.path.join(self.root, "a", "f0.txt"), os.path.join(self.root, "b", "renamed.txt"))
+                current = FileSnapshot(self.root, previous=base, structure_only=structure_only, full=True)
+                self.assertEqual(self._moves(diff_snapshots(base, current)),
+                                 [("moved", os.path.join("a", "f0.txt"), os.path.join("b", "renamed.txt"))])
+                os.rename(os.path.join(self.root, "b", "renamed.txt"), os.path.join(self.root, "a", "f0.txt"))
+
+    def test_directory_move_collapses_into_one_event(self):
+        """整棵目錄搬移只產生一個目錄層級的 moved，搬移途中新增的檔案另外回報"""
+        _write(os.path.join(self.root, "c", "deep", "x.txt"))
+        base = FileSnapshot(self.root)
+        os.rename(os.path.join(self.root, "c"), os.path.join(self.root, "a", "c2"))
+        _write(os.path.join(self.root, "a", "c2", "deep", "late.txt"))
+
+        current = FileSnapshot(self.root, previous=base)
+        events = diff_snapshots(base, current)
+        self.assertEqual(self._moves(events), [
+            ("moved", "c", os.path.join("a", "c2")),
+            ("created", os.path.join("a", "c2", "deep", "late.txt"), None),
+        ])
+        self.assertTrue(events[0].is_directory)
+
+    def test_identity_survives_checkpoint_round_trip(self):
+        """inode 欄位與目錄身分隨 checkpoint 保存，暖啟動後仍能辨識改名"""
+        base = FileSnapshot(self.root)
+        restored = FileSnapshot.from_bytes(self.root, base.to_bytes(self.root))
+        self.assertEqual(list(restored.inodes), list(base.inodes))
+        self.assertEqual(restored.dir_keys, base.dir_keys)
+
+        os.rename(os.path.join(self.root, "b", "f1.txt"), os.path.join(self.root, "b", "g1.txt"))
+        current = FileSnapshot(self.root, previous=restored)
+        self.assertEqual(self._moves(diff_snapshots(restored, current)),
+                         [("moved", os.path.join("b", "f1.txt"), os.path.join("b", "g1.txt"))])
+
+
+class TestIgnoreReload(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="sentry_ignore_")
+        self.projects_file = os.path.join(self.workdir, "projects.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def _write_projects(self, patterns, mtime_offset=0):
+        with open(self.projects_file, "w", encoding="utf-8") as f:
+            json.dump([{"uuid": "other"}, {"uuid": "p", "ignore_patterns": patterns}], f)
+        st = os.stat(self.projects_file)
+        os.utime(self.projects_file, ns=(st.st_atime_ns, st.st_mtime_ns + mtime_offset * 1_000_000_000))
+
+    def test_ignore_set_matches_engine(self):
+        """哨兵掃描的忽略名單與目錄樹隱藏的項目相同；內部名單不在其中（只在事件階段剔除）"""
+        ignore = build_ignore_rules(["node_modules"])
+        self.assertEqual(ignore, engine._build_ignore_rules({"node_modules"}))
+        self.assertTrue({".pytest_cache", ".mypy_cache", "node_modules"} <= ignore.names)
+        self.assertNotIn("temp", ignore.names)
+
+    def test_ignore_argument_is_parsed_defensively(self):
+        """忽略規則參數缺少或損壞時視為沒有規則"""
+        self.assertEqual(parse_ignore_patterns(None), [])
+        self.assertEqual(parse_ignore_patterns("not json"), [])
+        self.assertEqual(parse_ignore_patterns('{"a": 1}'), [])
+        self.assertEqual(parse_ignore_patterns('["b", "a", 3, "", "a"]'), ["a", "b"])
+
+    def test_config_is_reread_only_when_mtime_changes(self):
+        """projects.json 的 mtime 沒變就不重讀；變了才回傳本專案的新設定"""
+        self._write_projects(["build"])
+        watcher = ProjectConfigWatcher("p", self.projects_file)
+        self.assertEqual(watcher.poll()["ignore_patterns"], ["build"])
+        self.assertIsNone(watcher.poll())
+        self._write_projects(["build", "dist"], mtime_offset=1)
+        self.assertEqual(watcher.poll()["ignore_patterns"], ["build", "dist"])
+
+    def test_registered_reports_deleted_project(self):
+        """專案從 projects.json 移除後 registered() 為 False；讀不到設定檔時當作仍登記"""
+        watcher = ProjectConfigWatcher("p", self.projects_file)
+        self._write_projects(["build"])
+        self.assertTrue(watcher.registered())
+        with open(self.projects_file, "w", encoding="utf-8") as f:
+            json.dump([{"uuid": "other"}], f)
+        self.assertFalse(watcher.registered())
+        with open(self.projects_file, "w", encoding="utf-8") as f:
+            f.write('[{"uuid": ')
+        self.assertTrue(watcher.registered())
+
+    def test_half_written_config_is_retried(self):
+        """讀到損壞的 projects.json 時不記錄 mtime，下一次再試"""
+        with open(self.projects_file, "w", encoding="utf-8") as f:
+            f.write('[{"uuid": "p", ')
+        watcher = ProjectConfigWatcher("p", self.projects_file)
+        self.assertIsNone(watcher.poll())
+        self._write_projects(["build"])
+        self.assertEqual(watcher.poll()["ignore_patterns"], ["build"])
+
+
+class TestColumnarSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="sentry_columns_")
+        for d in ("a", "b"):
+            for i in range(4):
+                _write(os.path.join(self.root, d, f"f{i}.txt"))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_snapshots_share_path_table(self):
+        """沿用上一份快照時共用同一張駐留表，相同路徑的 id 相同"""
+        base = FileSnapshot(self.root)
+        again = FileSnapshot(self.root, table=base.table)
+        self.assertIs(again.table, base.table)
+        self.assertEqual(list(again.ids), list(base.ids))
+        self.assertEqual(len(base.table), 8)
+
+    def test_modified_rows_are_found_by_column_diff(self):
+        """結構不變時走整欄比對，仍能找出大小變動的檔案"""
+        base = FileSnapshot(self.root)
+        _write(os.path.join(self.root, "b", "f2.txt"), "longer content")
+        current = FileSnapshot(self.root, table=base.table)
+
+        events = diff_snapshots(base, current)
+        self.assertEqual([(e.event_type, os.path.basename(e.src_path)) for e in events], [("modified", "f2.txt")])
+
+    def test_diff_across_different_tables(self):
+        """兩份快照使用不同駐留表時，比對結果與共用表時一致"""
+        base = FileSnapshot(self.root)
+        os.remove(os.path.join(self.root, "a", "f1.txt"))
+        _write(os.path.join(self.root, "c", "new.txt"))
+
+        shared = diff_snapshots(base, FileSnapshot(self.root, table=base.table))
+        separate = diff_snapshots(base, FileSnapshot(self.root, table=PathTable()))
+        key = lambda e: (e.event_type, e.src_path)
+        self.assertEqual(sorted(map(key, shared)), sorted(map(key, separate)))
+        self.assertEqual({key(e)[0] for e in shared}, {"created", "deleted"})
+
+    def _changed_names(self, old, new, start=0, length=None):
+        """以 _changed_rows 比對兩份快照，回傳有變動的檔名（相對於 root）。"""
+        if length is None:
+            length = len(new.ids)
+        rows = sentry_worker._changed_rows(old, start, new, start, length)
+        return [os.path.relpath(new.table.path_of(new.ids[start + i]), self.root) for i in rows]
+
+    def _touched_snapshots(self):
+        """大小變動、mtime 前進、mtime 倒退各一個檔案，結構不變。"""
+        base = FileSnapshot(self.root)
+        _write(os.path.join(self.root, "a", "f1.txt"), "longer content")
+        for name, delta in (("f0.txt", 1_000_000_000), ("f3.txt", -1_000_000_000)):
+            path = os.path.join(self.root, "b", name)
+            st = os.stat(path)
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + delta))
+        return base, FileSnapshot(self.root, table=base.table)
+
+    def test_changed_rows_pure_python(self):
+        """沒有 NumPy 時以區塊比對找出變動列：大小變動或 mtime 前進才算，mtime 倒退不算"""
+        base, current = self._touched_snapshots()
+        with patch.object(sentry_worker, "np", None):
+            self.assertEqual(sorted(self._changed_names(base, current)),
+                             [os.path.join("a", "f1.txt"), os.path.join("b", "f0.txt")])
+            self.assertEqual(self._changed_names(base, base), [])
+
+    @unittest.skipIf(numpy is None, "NumPy 未安裝")
+    def test_changed_rows_numpy_matches_pure_python(self):
+        """NumPy 向量化路徑與純 Python 路徑結果一致（含非零起始列的子區段）"""
+        base, current = self._touched_snapshots()
+        _, start, end, _ = current.dirs[os.path.join(self.root, "b")]
+        for kwargs in ({}, {"start": start, "length": end - start}):
+            with patch.object(sentry_worker, "np", None):
+                expected = self._changed_names(base, current, **kwargs)
+            with patch.object(sentry_worker, "np", numpy):
+                self.assertEqual(self._changed_names(base, current, **kwargs), expected)
+
+    def test_compacted_drops_stale_ids(self):
+        """重建駐留表後，已刪除檔案的 id 被回收，內容不變"""
+        base = FileSnapshot(self.root)
+        shutil.rmtree(os.path.join(self.root, "a"))
+        current = FileSnapshot(self.root, table=base.table)
+        compacted = current.compacted()
+
+        self.assertEqual(len(current.table), 8)
+        self.assertEqual(len(compacted.table), 4)
+        self.assertEqual(compacted.as_dict(), current.as_dict())
+        self.assertEqual(diff_snapshots(current, compacted), [])
+
+
+class TestSnapshotCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="sentry_checkpoint_")
+        self.store_dir = tempfile.mkdtemp(prefix="sentry_store_")
+        for d in ("a", "b"):
+            for i in range(3):
+                _write(os.path.join(self.root, d, f"f{i}.txt"))
+        self._patch = patch.object(snapshot_store, "TEMP_PROJECTS_DIR", self.store_dir)
+        self._patch.start()
+        self.fingerprint = snapshot_store.compute_fingerprint(self.root, ["/out.md"], ["build"])
+
+    def tearDown(self):
+        self._patch.stop()
+        shutil.rmtree(self.root, ignore_errors=True)
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+
+    def test_round_trip_preserves_files_and_dirs(self):
+        """編碼後再解碼，檔案與目錄記錄必須完全一致"""
+        snapshot = FileSnapshot(self.root)
+        snapshot_store.save_checkpoint("uuid-1", self.fingerprint, snapshot.to_bytes(self.root))
+
+        payload = snapshot_store.load_checkpoint("uuid-1", self.fingerprint)
+        restored = FileSnapshot.from_bytes(self.root, payload)
+        self.assertEqual(restored.as_dict(), snapshot.as_dict())
+        self.assertEqual(restored.dirs, snapshot.dirs)
+        self.assertEqual(restored.scan_started_ns, snapshot.scan_started_ns)
+
+    def test_fingerprint_mismatch_forces_cold_start(self):
+        """設定（忽略規則）一變，舊 checkpoint 必須作廢"""
+        snapshot = FileSnapshot(self.root)
+        snapshot_store.save_checkpoint("uuid-2", self.fingerprint, snapshot.to_bytes(self.root))
+        other = snapshot_store.compute_fingerprint(self.root, ["/out.md"], ["build", "dist"])
+
+        self.assertTrue(snapshot_store.has_checkpoint("uuid-2", self.fingerprint))
+        self.assertFalse(snapshot_store.has_checkpoint("uuid-2", other))
+        self.assertIsNone(snapshot_store.load_checkpoint("uuid-2", other))
+
+    def test_structure_only_is_part_of_the_fingerprint(self):
+        """結構模式與完整模式的快照欄位不同，指紋必須區分"""
+        structure = snapshot_store.compute_fingerprint(self.root, ["/out.md"], ["build"], structure_only=True)
+        self.assertNotEqual(structure, self.fingerprint)
+
+    def test_corrupted_checkpoint_is_ignored(self):
+        """損壞的 checkpoint 一律視為不存在，不拋例外"""
+        snapshot = FileSnapshot(self.root)
+        snapshot_store.save_checkpoint("uuid-3", self.fingerprint, snapshot.to_bytes(self.root))
+        with open(snapshot_store.checkpoint_path("uuid-3"), "r+b") as f:
+            f.seek(-4, os.SEEK_END)
+            f.write(b"\x00\x00\x00\x00")
+        self.assertIsNone(snapshot_store.load_checkpoint("uuid-3", self.fingerprint))
+
+    @patch.object(FileSnapshot, "RACY_WINDOW_NS", 0)
+    def test_warm_diff_reports_changes_made_while_down(self):
+        """從 checkpoint 還原後做增量比對，能抓到停機期間的結構變動"""
+        snapshot = FileSnapshot(self.root)
+        restored = FileSnapshot.from_bytes(self.root, snapshot.to_bytes(self.root))
+
+        _write(os.path.join(self.root, "a", "added.txt"))
+        _bump_mtime(os.path.join(self.root, "a"))
+
+        current = FileSnapshot(self.root, previous=restored)
+        kinds = {(e.event_type, os.path.basename(e.src_path)) for e in diff_snapshots(restored, current)}
+        self.assertEqual(kinds, {("created", "added.txt")})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,251 @@
+import unittest
+import os
+import sys
+import pickle
+import shutil
+import tempfile
+from unittest.mock import patch
+
+# HACK: 確保能找到 src/core
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.core import engine
+from src.core import ignore_rules
+from src.core.ignore_rules import IgnoreMatcher, build_matcher, compile_ignore, parse_gitignore, relative_dir
+from src.core.sentry_worker import (FileSnapshot, MockEvent, build_ignore_rules, changed_directories,
+                                    collect_dirty_dirs, touches_gitignore)
+
+
+def _write(path, content="x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+class TestIgnoreMatcher(unittest.TestCase):
+
+    def test_rule_syntax(self):
+        """名稱、萬用字元、只比對資料夾、錨定路徑與 ** 的比對結果"""
+        matcher = IgnoreMatcher(["node_modules", "*.log", "src/generated/", "/dist", "build/**",
+                                 "a/**/z", "**/cache", "tmp?", "[!a]x.txt", "docs/*.md"])
+        cases = [
+            ("node_modules", True, True),
+            ("pkg/node_modules", True, True),
+            ("logs/app.log", False, True),
+            ("app.log.txt", False, False),
+            ("src/generated", True, True),
+            ("src/generated", False, False),
+            ("lib/src/generated", True, False),
+            ("dist", True, True),
+            ("pkg/dist", True, False),
+            ("build", True, False),
+            ("build/out/x.o", False, True),
+            ("a/z", True, True),
+            ("a/b/c/z", False, True),
+            ("x/a/z", False, False),
+            ("deep/cache", True, True),
+            ("tmp1", False, True),
+            ("tmp12", False, False),
+            ("bx.txt", False, True),
+            ("ax.txt", False, False),
+            ("docs/guide.md", False, True),
+            ("docs/api/guide.md", False, False),
+        ]
+        for rel, is_dir, expected in cases:
+            with self.subTest(rel=rel, is_dir=is_dir):
+                self.assertEqual(matcher.ignores_path(rel, is_dir), expected)
+
+    def test_ancestors_and_contents(self):
+        """上層被忽略或內容全被忽略時，回報第一個被忽略的層"""
+        matcher = IgnoreMatcher(["vendor", "build/**"])
+        self.assertEqual(matcher.first_ignored(["a", "vendor", "x.py"], False), 1)
+        self.assertEqual(matcher.first_ignored(["build", "out"]), 1)
+        self.assertIsNone(matcher.first_ignored(["build"]))
+        self.assertTrue(matcher.hides_contents("build/"))
+        self.assertFalse(matcher.hides_contents("a/build/"))
+
+    def test_compiled_once_comparable_and_picklable(self):
+        """同一組規則共用編譯結果；相等可作為快取 key；可傳給子行程"""
+        matcher = compile_ignore(["*.log", "src/generated/"])
+        self.assertIs(compile_ignore({"src/generated/", "*.log"}), matcher)
+        self.assertEqual(IgnoreMatcher(["*.log", "src/generated/"]), matcher)
+        restored = pickle.loads(pickle.dumps(matcher))
+        self.assertEqual(restored, matcher)
+        self.assertTrue(restored.ignores("src/", "generated", True))
+
+    def test_relative_dir(self):
+        root = os.path.join(os.sep, "p", "root")
+        self.assertEqual(relative_dir(root, root), "")
+        self.assertEqual(relative_dir(root + os.sep, os.path.join(root, "src", "core")), "src/core/")
+        self.assertEqual(relative_dir(root, os.path.join(os.sep, "p", "rootless")), "")
+
+
+class TestWalkersShareRules(unittest.TestCase):
+
+    PATTERNS = ["*.log", "build/**", "src/generated/"]
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="ignore_rules_")
+        _write(os.path.join(self.root, "app.log"))
+        _write(os.path.join(self.root, "build", "out", "a.o"))
+        _write(os.path.join(self.root, "src", "generated", "g.py"))
+        _write(os.path.join(self.root, "src", "main.py"))
+        _write(os.path.join(self.root, "lib", "generated"))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_engine_prunes_before_listing(self):
+        """目錄樹套用同一組規則：被忽略的資料夾與內容全被忽略的資料夾都不列出"""
+        with patch.object(engine, "_list_directory", wraps=engine._list_directory) as lister:
+            tree = engine.generate_annotated_tree(self.root, None, ignore_patterns=set(self.PATTERNS))
+        listed = {os.path.relpath(c.args[0], self.root) for c in lister.call_args_list}
+        self.assertEqual(listed, {".", "lib", "src"})
+        self.assertIn("build/", tree)
+        self.assertIn("generated", tree)  # lib/generated 是檔案，只比對資料夾的規則不適用
+        self.assertNotIn("generated/", tree)
+        self.assertNotIn("app.log", tree)
+        self.assertNotIn("a.o", tree)
+
+    def test_snapshot_and_events_use_the_same_rules(self):
+        """快照掃描與事件過濾使用與 engine 相同的規則"""
+        ignore = build_ignore_rules(self.PATTERNS)
+        snapshot = FileSnapshot(self.root, ignore=ignore)
+        files = sorted(os.path.relpath(p, self.root) for p in snapshot.as_dict())
+        self.assertEqual(files, [os.path.join("lib", "generated"), os.path.join("src", "main.py")])
+
+        raw = [
+            ("created", os.path.join(self.root, "build", "out", "b.o"), False),
+            ("created", os.path.join(self.root, "src", "generated", "h.py"), False),
+            ("modified", os.path.join(self.root, "src", "debug.log"), False),
+            ("created", os.path.join(self.root, "src", "util.py"), False),
+        ]
+        dirty_dirs, dirty_trees = collect_dirty_dirs(self.root, raw, ignore)
+        self.assertEqual(dirty_dirs, {os.path.join(self.root, "src")})
+        self.assertEqual(dirty_trees, set())
+
+
+class TestGitignore(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="gitignore_")
+        _write(os.path.join(self.root, ".gitignore"), "*.log\n!keep.log\nout/\n# 註解\n\n")
+        _write(os.path.join(self.root, "keep.log"))
+        _write(os.path.join(self.root, "app.log"))
+        _write(os.path.join(self.root, "out", "bin.o"))
+        _write(os.path.join(self.root, "out.txt"))
+        _write(os.path.join(self.root, "pkg", ".gitignore"), "/local\n!app.log\n")
+        _write(os.path.join(self.root, "pkg", "app.log"))
+        _write(os.path.join(self.root, "pkg", "local", "x.py"))
+        _write(os.path.join(self.root, "pkg", "sub", "local", "y.py"))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _rel(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def test_parse_gitignore(self):
+        """略過空行與註解，辨識否定規則、跳脫字元與跳脫的結尾空白"""
+        text = "# c\n\n*.o  \n!keep.o\n\\#hash\n\\!bang\nsp\\ \n"
+        self.assertEqual(parse_gitignore(text),
+                         [("*.o", False), ("keep.o", True), ("#hash", False), ("!bang", False), ("sp\\ ", False)])
+
+    def test_nested_files_negation_and_dir_rules(self):
+        """較深的 .gitignore 優先；否定規則重新納入；只比對資料夾的規則不套用到檔案"""
+        matcher = build_matcher(engine.SYSTEM_DEFAULT_IGNORE, self.root)
+        cases = [
+            ("app.log", False, True),
+            ("keep.log", False, False),
+            ("out", True, True),
+            ("out.txt", False, False),
+            ("pkg/app.log", False, False),
+            ("pkg/local", True, True),
+            ("pkg/sub/local", True, False),
+            ("pkg/sub/debug.log", False, True),
+            ("out/bin.o", False, True),
+        ]
+        for rel, is_dir, expected in cases:
+            with self.subTest(rel=rel):
+                self.assertEqual(matcher.ignores_path(rel, is_dir), expected)
+        self.assertEqual(pickle.loads(pickle.dumps(matcher)), matcher)
+
+    def test_ignored_directories_are_never_listed(self):
+        """目錄樹與快照都不列出被 .gitignore 忽略的資料夾"""
+        with patch.object(engine, "_list_directory", wraps=engine._list_directory) as lister:
+            tree = engine.generate_annotated_tree(self.root, None, use_gitignore=True)
+        listed = {self._rel(c.args[0]) for c in lister.call_args_list}
+        self.assertEqual(listed, {".", "pkg", "pkg/sub", "pkg/sub/local"})
+        self.assertIn("keep.log", tree)
+        self.assertNotIn("bin.o", tree)
+        self.assertNotIn("x.py", tree)
+        self.assertIn("out/", engine.generate_annotated_tree(self.root, None))
+
+        snapshot = FileSnapshot(self.root, ignore=build_ignore_rules([], self.root))
+        files = sorted(self._rel(p) for p in snapshot.as_dict())
+        self.assertEqual(files, [".gitignore", "keep.log", "out.txt", "pkg/.gitignore", "pkg/app.log",
+                                 "pkg/sub/local/y.py"])
+
+    def test_recompiled_only_when_file_changes(self):
+        """編譯結果以 (mtime, size) 快取，檔案變動後才重新編譯"""
+        path = os.path.join(self.root, "pkg", ".gitignore")
+        first = ignore_rules.load_gitignore(path)[1]
+        self.assertIs(ignore_rules.load_gitignore(path)[1], first)
+        _write(path, "/local\n")
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        self.assertIsNot(ignore_rules.load_gitignore(path)[1], first)
+        os.remove(path)
+        self.assertEqual(ignore_rules.load_gitignore(path), (None, None))
+
+    def test_incremental_render_falls_back_when_gitignore_changes(self):
+        """變動的資料夾中 .gitignore 改變時，增量重繪改為完整重繪，結果與完整重繪一致"""
+        cache = engine.TreeCache()
+        engine.generate_annotated_tree(self.root, None, tree_cache=cache, use_gitignore=True)
+        _write(os.path.join(self.root, "pkg", "sub", ".gitignore"), "local/\n")
+        changed = {os.path.join(self.root, "pkg", "sub")}
+        with patch.object(engine, "_list_directory", wraps=engine._list_directory) as lister:
+            tree = engine.generate_annotated_tree(self.root, None, tree_cache=cache, changed_dirs=changed,
+                                                  use_gitignore=True)
+        self.assertGreater(lister.call_count, 1)
+        self.assertNotIn("y.py", tree)
+        self.assertEqual(tree, engine.generate_annotated_tree(self.root, None, use_gitignore=True))
+
+        _write(os.path.join(self.root, "pkg", "sub", "new.py"))
+        with patch.object(engine, "_list_directory", wraps=engine._list_directory) as lister:
+            tree = engine.generate_annotated_tree(self.root, None, tree_cache=cache, changed_dirs=changed,
+                                                  use_gitignore=True)
+        self.assertEqual(lister.call_count, 1)
+        self.assertIn("new.py", tree)
+
+    def test_edited_gitignore_updates_incremental_render(self):
+        """既有 .gitignore 新增規則後，所在目錄被點名重列；只點名新被忽略的資料夾時改由上層重列"""
+        _write(os.path.join(self.root, "build", "out.o"))
+        cache = engine.TreeCache()
+        engine.generate_annotated_tree(self.root, None, tree_cache=cache, use_gitignore=True)
+        with open(os.path.join(self.root, ".gitignore"), "a") as f:
+            f.write("build/\n")
+
+        gitignore = os.path.join(self.root, ".gitignore")
+        self.assertEqual(changed_directories([MockEvent(gitignore, "modified")]), {self.root})
+        ignore = engine._build_ignore_rules(None, self.root, True)
+        self.assertEqual(engine._dirty_keys(self.root, {os.path.join(self.root, "build")}, cache.listings,
+                                            ignore, None), {""})
+
+        tree = engine.generate_annotated_tree(self.root, None, tree_cache=cache, use_gitignore=True,
+                                              changed_dirs={self.root, os.path.join(self.root, "build")})
+        self.assertNotIn("build/", tree)
+        self.assertNotIn("out.o", tree)
+        self.assertEqual(tree, engine.generate_annotated_tree(self.root, None, use_gitignore=True))
+
+    def test_touches_gitignore(self):
+        """新舊路徑任一個是 .gitignore 時，哨兵需要重新套用規則"""
+        self.assertTrue(touches_gitignore([MockEvent("/p/a/.gitignore", "modified")]))
+        self.assertTrue(touches_gitignore([MockEvent("/p/tmp", "moved", dest_path="/p/.gitignore")]))
+        self.assertFalse(touches_gitignore([MockEvent("/p/a/gitignore.txt", "created")]))
+
+
+if __name__ == '__main__':
+    unittest.main()
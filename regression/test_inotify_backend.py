@@ -0,0 +1,101 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+# HACK: 確保能找到 src/core
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.core import inotify_backend
+from src.core.sentry_worker import FileSnapshot, collect_dirty_dirs, diff_snapshots
+
+
+@unittest.skipUnless(inotify_backend.is_available(), "當前平台不支援 inotify")
+class TestInotifyBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="sentry_inotify_")
+        os.makedirs(os.path.join(self.root, "src"))
+        with open(os.path.join(self.root, "src", "a.py"), "w") as f:
+            f.write("a")
+        self.watcher = inotify_backend.InotifyWatcher({".git", "__pycache__"})
+        self.watcher.add_tree(self.root)
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_events_are_translated(self):
+        """建立 / 修改 / 刪除檔案都應被翻譯成對應的事件類型"""
+        new_file = os.path.join(self.root, "src", "b.py")
+        with open(new_file, "w") as f:
+            f.write("b")
+        with open(os.path.join(self.root, "src", "a.py"), "a") as f:
+            f.write("more")
+        os.remove(new_file)
+
+        events = self.watcher.read_events()
+        kinds = {(etype, os.path.basename(path)) for etype, path, _ in events}
+        self.assertIn(("created", "b.py"), kinds)
+        self.assertIn(("modified", "a.py"), kinds)
+        self.assertIn(("deleted", "b.py"), kinds)
+
+    def test_new_directories_are_watched_recursively(self):
+        """新建目錄會自動補上監看，之後其內部的事件也能被讀到"""
+        new_dir = os.path.join(self.root, "pkg")
+        os.makedirs(new_dir)
+        self.watcher.read_events()
+        self.assertIn(new_dir, self.watcher.path_to_wd)
+
+        with open(os.path.join(new_dir, "c.py"), "w") as f:
+            f.write("c")
+        events = self.watcher.read_events()
+        self.assertIn(("created", os.path.join(new_dir, "c.py"), False), events)
+
+    def test_ignored_directories_are_not_watched(self):
+        """內部忽略名單中的目錄不應建立監看"""
+        git_dir = os.path.join(self.root, ".git")
+        os.makedirs(git_dir)
+        self.watcher.read_events()
+        self.assertNotIn(git_dir, self.watcher.path_to_wd)
+
+    def test_path_rules_prune_watches_and_events(self):
+        """路徑規則以 root 為基準：被忽略的目錄不監看，其下事件與符合規則的檔案不回報"""
+        self.watcher.close()
+        os.makedirs(os.path.join(self.root, "src", "generated"))
+        self.watcher = inotify_backend.InotifyWatcher(["src/generated/", "*.log"], root=self.root)
+        self.watcher.add_tree(self.root)
+        self.assertNotIn(os.path.join(self.root, "src", "generated"), self.watcher.path_to_wd)
+
+        for name in ("debug.log", "b.py"):
+            with open(os.path.join(self.root, "src", name), "w") as f:
+                f.write("x")
+        events = self.watcher.read_events()
+        self.assertEqual({os.path.basename(path) for _, path, _ in events}, {"b.py"})
+
+    def test_applied_events_match_full_rescan(self):
+        """只重列被事件點名的目錄，結果必須與全量重掃完全一致"""
+        snapshot = FileSnapshot(self.root)
+
+        os.makedirs(os.path.join(self.root, "pkg", "sub"))
+        with open(os.path.join(self.root, "pkg", "sub", "d.py"), "w") as f:
+            f.write("d")
+        with open(os.path.join(self.root, "src", "a.py"), "a") as f:
+            f.write("changed")
+        shutil.rmtree(os.path.join(self.root, "src"))
+
+        dirty_dirs, dirty_trees = collect_dirty_dirs(self.root, self.watcher.read_events())
+        current = FileSnapshot(self.root, previous=snapshot, dirty_dirs=dirty_dirs, dirty_trees=dirty_trees)
+        events = diff_snapshots(snapshot, current)
+        kinds = {(evt.event_type, os.path.basename(evt.src_path)) for evt in events}
+        self.assertIn(("created", "d.py"), kinds)
+        self.assertIn(("deleted", "a.py"), kinds)
+
+        self.assertEqual(diff_snapshots(current, FileSnapshot(self.root)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
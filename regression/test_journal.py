@@ -0,0 +1,109 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+from unittest.mock import patch
+
+# HACK: 確保能找到 src/core
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.core import daemon, journal
+from src.core.journal import ChangeJournal, read_since
+from src.core.sentry_worker import MockEvent
+
+
+def _events(count, prefix="f"):
+    return [MockEvent(f"/p/{prefix}{i}.py", "created") for i in range(count)]
+
+
+class TestChangeJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.store_dir = tempfile.mkdtemp(prefix="sentry_journal_")
+        self._patches = [
+            patch.object(journal, "TEMP_PROJECTS_DIR", self.store_dir),
+            patch.object(journal, "INDEX_STRIDE", 4),
+        ]
+        for p in self._patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self._patches:
+            p.stop()
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+
+    def test_cursor_returns_only_new_events(self):
+        """帶入上次的游標只取新事件；路徑以字典共用"""
+        writer = ChangeJournal("p")
+        writer.append(_events(3) + [MockEvent("/p/f0.py", "moved", dest_path="/p/g0.py")], wall_time=100.0)
+        first = read_since("p")
+        self.assertEqual([e["type"] for e in first["events"]], ["created"] * 3 + ["moved"])
+        self.assertEqual(first["events"][3]["dest_path"], "/p/g0.py")
+        self.assertEqual(first["cursor"], writer.cursor)
+
+        writer.append([MockEvent("/p/f1.py", "deleted")], wall_time=101.0)
+        second = read_since("p", first["cursor"])
+        self.assertEqual(second["events"], [{"seq": 4, "time": 101.0, "type": "deleted", "path": "/p/f1.py"}])
+        self.assertEqual(read_since("p", second["cursor"])["events"], [])
+        self.assertEqual(len(writer.path_ids), 4)
+        writer.close()
+
+    def test_index_jumps_across_strides(self):
+        """游標跨過多個索引區段時，結果與逐筆讀取一致"""
+        writer = ChangeJournal("p")
+        writer.append(_events(11), wall_time=1.0)
+        writer.close()
+        everything = read_since("p", limit=100)["events"]
+        cursor = read_since("p", limit=9)["cursor"]
+        self.assertEqual(read_since("p", cursor)["events"], everything[9:])
+        self.assertEqual(os.path.getsize(os.path.join(self.store_dir, "p", journal.JOURNAL_INDEX_FILENAME)), 3 * 8)
+
+    def test_torn_tail_is_ignored_and_repaired(self):
+        """尾端寫到一半的紀錄讀取時略過，下次開啟時截掉，之後照常追加"""
+        writer = ChangeJournal("p")
+        writer.append(_events(4), wall_time=1.0)
+        writer.close()
+        journal_file = os.path.join(self.store_dir, "p", journal.JOURNAL_FILENAME)
+        with open(journal_file, "ab") as f:
+            f.write(b"\x11\x00\x01\x02")
+        self.assertEqual(len(read_since("p")["events"]), 4)
+
+        reopened = ChangeJournal("p")
+        self.assertEqual(reopened.count, 4)
+        reopened.append([MockEvent("/p/f0.py", "modified")], wall_time=2.0)
+        events = read_since("p")["events"]
+        self.assertEqual([(e["seq"], e["type"], e["path"]) for e in events[-1:]], [(4, "modified", "/p/f0.py")])
+        reopened.close()
+
+    def test_recreated_journal_resets_the_cursor(self):
+        """日誌被刪除重建後，舊游標從頭讀起並標記 reset"""
+        writer = ChangeJournal("p")
+        writer.append(_events(3), wall_time=1.0)
+        writer.close()
+        cursor = read_since("p")["cursor"]
+        shutil.rmtree(os.path.join(self.store_dir, "p"))
+
+        writer = ChangeJournal("p")
+        writer.append(_events(1, "new"), wall_time=2.0)
+        writer.close()
+        result = read_since("p", cursor)
+        self.assertTrue(result["reset"])
+        self.assertEqual([e["path"] for e in result["events"]], ["/p/new0.py"])
+
+    def test_daemon_command_reads_since_cursor(self):
+        """read_journal 指令：不存在的日誌回傳空結果，limit 限制單次筆數"""
+        self.assertEqual(daemon.handle_read_journal(["missing"]), {"cursor": "", "events": [], "reset": False})
+        writer = ChangeJournal("p")
+        writer.append(_events(5), wall_time=1.0)
+        writer.close()
+        page = daemon.handle_read_journal(["p", "", "2"])
+        self.assertEqual([e["seq"] for e in page["events"]], [0, 1])
+        rest = daemon.handle_read_journal(["p", page["cursor"]])
+        self.assertEqual([e["seq"] for e in rest["events"]], [2, 3, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import unittest
+import io
+import os
+import sys
+import shutil
+import tempfile
+from unittest.mock import patch
+
+# HACK: 確保能找到 src/core
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.core import engine, scan_pool
+from src.core.sentry_worker import FileSnapshot, diff_snapshots
+
+
+def _write(path, content="x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+class TestParallelScan(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="sentry_parallel_")
+        for top in ("alpha", "beta", "gamma", "delta"):
+            for sub in ("x", "y"):
+                for i in range(3):
+                    _write(os.path.join(self.root, top, sub, f"f{i}.py"))
+        _write(os.path.join(self.root, "root_file.md"))
+        _write(os.path.join(self.root, ".git", "HEAD"))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _assert_same_snapshot(self, expected, actual):
+        self.assertEqual(list(actual.ids), list(expected.ids))
+        self.assertEqual(actual.dirs, expected.dirs)
+        self.assertEqual(actual.as_dict(), expected.as_dict())
+
+    def test_thread_pool_matches_sequential_scan(self):
+        """執行緒池並行掃描的欄位與目錄記錄，與單執行緒掃描逐列一致"""
+        sequential = FileSnapshot(self.root)
+        pool = scan_pool.open_pool(3, "thread")
+        try:
+            parallel = FileSnapshot(self.root, table=sequential.table, pool=pool)
+        finally:
+            pool.shutdown()
+        self._assert_same_snapshot(sequential, parallel)
+
+    def test_process_pool_matches_sequential_scan(self):
+        """子行程池同樣按名稱順序合併"""
+        sequential = FileSnapshot(self.root)
+        pool = scan_pool.open_pool(2, "process")
+        try:
+            parallel = FileSnapshot(self.root, table=sequential.table, pool=pool)
+        finally:
+            pool.shutdown()
+        self._assert_same_snapshot(sequential, parallel)
+
+    @patch.object(FileSnapshot, "RACY_WINDOW_NS", 0)
+    def test_parallel_incremental_scan_reports_changes(self):
+        """並行模式下的增量掃描仍能抓到子樹內的結構變動"""
+        base = FileSnapshot(self.root)
+        _write(os.path.join(self.root, "gamma", "y", "new.py"))
+        st = os.stat(os.path.join(self.root, "gamma", "y"))
+        os.utime(os.path.join(self.root, "gamma", "y"), ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+        pool = scan_pool.open_pool(2, "process")
+        try:
+            current = FileSnapshot(self.root, previous=base, pool=pool)
+        finally:
+            pool.shutdown()
+        kinds = [(e.event_type, os.path.basename(e.src_path)) for e in diff_snapshots(base, current)]
+        self.assertEqual(kinds, [("created", "new.py")])
+
+    def test_engine_tree_is_identical(self):
+        """engine 的目錄樹在並行模式下輸出完全一致"""
+        expected = engine.generate_annotated_tree(self.root, None, folder_spacing=1)
+        for kind in scan_pool.SCAN_POOL_KINDS:
+            actual = engine.generate_annotated_tree(self.root, None, folder_spacing=1, scan_workers=3, scan_pool=kind)
+            self.assertEqual(actual, expected)
+
+    def test_scan_settings_are_normalized(self):
+        """projects.json 中的無效設定一律退回單執行緒"""
+        self.assertEqual(scan_pool.scan_settings_from_project({}), (1, "thread"))
+        self.assertEqual(scan_pool.scan_settings_from_project({"scan_workers": "8", "scan_pool": "process"}), (8, "process"))
+        self.assertEqual(scan_pool.scan_settings_from_project({"scan_workers": 0, "scan_pool": "gpu"}), (1, "thread"))
+        self.assertEqual(scan_pool.normalize_scan_settings(999)[0], scan_pool.MAX_SCAN_WORKERS)
+        self.assertIsNone(scan_pool.open_pool(1))
+
+
+
+class TestEngineTreeWalk(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="engine_walk_")
+        _write(os.path.join(self.root, "src", "b.py"))
+        _write(os.path.join(self.root, "src", "a.py"))
+        _write(os.path.join(self.root, "README.md"))
+        _write(os.path.join(self.root, "__pycache__", "x.pyc"))
+        os.symlink(os.path.join(self.root, "src"), os.path.join(self.root, "linked"))
+        os.symlink(os.path.join(self.root, "missing"), os.path.join(self.root, "dangling"))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_scandir_walk_needs_no_per_entry_isdir(self):
+        """目錄樹只靠 scandir 的項目類型排序與渲染；連結到資料夾視為資料夾，斷掉的連結視為檔案"""
+        with patch.object(engine.os.path, "isdir", side_effect=AssertionError("isdir called")):
+            lines, nodes = engine._generate_tree(self.root)
+        name = os.path.basename(self.root)
+        self.assertEqual(lines, [
+            f"{name}/",
+            "├── linked/",
+            "│   ├── a.py",
+            "│   └── b.py",
+            "├── src/",
+            "│   ├── a.py",
+            "│   └── b.py",
+            "├── README.md",
+            "└── dangling",
+        ])
+        self.assertEqual([key for _, key in nodes],
+                         ["", "linked/", "linked/a.py", "linked/b.py", "src/", "src/a.py", "src/b.py",
+                          "README.md", "dangling"])
+
+    def test_deep_tree_does_not_recurse(self):
+        """走訪以顯式堆疊進行：目錄深度超過遞迴上限也能產生"""
+        deep = self.root
+        for _ in range(150):
+            deep = os.path.join(deep, "d")
+        os.makedirs(deep)
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(100)
+        try:
+            _, nodes = engine._generate_tree(self.root)
+            tree = engine.generate_annotated_tree(self.root, None)
+        finally:
+            sys.setrecursionlimit(limit)
+        self.assertIn("d/" * 150, [key for _, key in nodes])
+        self.assertEqual(len(tree.splitlines()), len(nodes))
+
+    def test_streamed_output_lists_each_directory_once(self):
+        """兩趟對齊只讀一次檔案系統；分批寫出的內容與一次產生的字串相同"""
+        comments = "<!-- AUTO_TREE_START -->\n├── src/  # 原始碼\n<!-- AUTO_TREE_END -->"
+        expected = engine.generate_annotated_tree(self.root, comments, folder_spacing=1)
+        out = io.StringIO()
+        with patch.object(engine, "_list_directory", wraps=engine._list_directory) as lister:
+            engine.write_annotated_tree(out, self.root, comments, chunk_lines=2, folder_spacing=1)
+        self.assertEqual(out.getvalue(), expected)
+        self.assertEqual(lister.call_count, 3)
+        self.assertTrue(expected.splitlines()[4].startswith("├── src/ "))
+        self.assertTrue(expected.splitlines()[4].endswith("# 原始碼"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,13 +4,16 @@ import sys
 import shutil
 import json
 import time
+import subprocess
+import tempfile
+from unittest.mock import patch
 
 # HACK: 確保能找到 src/core
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-from src.core import daemon
+from src.core import daemon, journal, snapshot_store
 
 class TestSentryPersistence(unittest.TestCase):
 
@@ -23,7 +26,8 @@ class TestSentryPersistence(unittest.TestCase):
         """
         測試前準備：
         1. 準備沙盒 data 目錄 (放 projects.json)
-        2. 清理真實的 sentry 目錄 (確保測試環境乾淨)
+        2. 把 temp/ 與 logs/ 整個改到臨時目錄：本行程直接替換路徑，
+           哨兵子行程則透過 TEST_TEMP_DIR 繼承，checkpoint / 日誌 / 備份都不會寫進 repo
         """
         # 1. 準備 projects.json 沙盒
         shutil.rmtree(self.TEST_WORKSPACE, ignore_errors=True)
@@ -32,14 +36,23 @@ class TestSentryPersistence(unittest.TestCase):
             f.write('[]')
         os.environ['TEST_PROJECTS_FILE'] = self.TEST_PROJECTS_FILE
 
-        # 2. 【核心策略調整】直接使用 daemon 的真實路徑，但要先清理乾淨
-        #    注意：這會暫時清空你現在正在運行的所有哨兵記錄，請在測試機上運行。
-        if os.path.exists(daemon.SENTRY_DIR):
-            shutil.rmtree(daemon.SENTRY_DIR)
-        os.makedirs(daemon.SENTRY_DIR, exist_ok=True)
-        
-        # 3. 確保 temp/projects 也存在
-        os.makedirs(daemon.TEMP_PROJECTS_DIR, exist_ok=True)
+        # 2. 臨時的 temp/ 與 logs/
+        self._temp = tempfile.TemporaryDirectory(prefix="sentry_persistence_")
+        temp_dir = os.path.join(self._temp.name, 'temp')
+        os.environ['TEST_TEMP_DIR'] = temp_dir
+        self.patches = [
+            patch.object(daemon, "TEMP_DIR", temp_dir),
+            patch.object(daemon, "TEMP_LISTS_DIR", os.path.join(temp_dir, 'lists')),
+            patch.object(daemon, "SENTRY_DIR", os.path.join(temp_dir, 'sentry')),
+            patch.object(daemon, "TEMP_PROJECTS_DIR", os.path.join(temp_dir, 'projects')),
+            patch.object(daemon, "LOGS_DIR", os.path.join(self._temp.name, 'logs')),
+            patch.object(snapshot_store, "TEMP_PROJECTS_DIR", os.path.join(temp_dir, 'projects')),
+            patch.object(journal, "TEMP_PROJECTS_DIR", os.path.join(temp_dir, 'projects')),
+        ]
+        for p in self.patches:
+            p.start()
+        for path in (daemon.TEMP_LISTS_DIR, daemon.SENTRY_DIR, daemon.TEMP_PROJECTS_DIR):
+            os.makedirs(path, exist_ok=True)
 
     def tearDown(self):
         """測試後清理"""
@@ -47,11 +60,12 @@ class TestSentryPersistence(unittest.TestCase):
         shutil.rmtree(self.TEST_WORKSPACE, ignore_errors=True)
         if 'TEST_PROJECTS_FILE' in os.environ:
             del os.environ['TEST_PROJECTS_FILE']
-            
-        # 2. 再次清理真實 sentry 目錄，避免殘留
-        if os.path.exists(daemon.SENTRY_DIR):
-            shutil.rmtree(daemon.SENTRY_DIR)
-        os.makedirs(daemon.SENTRY_DIR, exist_ok=True)
+
+        # 2. 還原路徑並刪除臨時目錄
+        for p in self.patches:
+            p.stop()
+        os.environ.pop('TEST_TEMP_DIR', None)
+        self._temp.cleanup()
 
     def test_placeholder(self):
         self.assertTrue(True)
@@ -79,8 +93,8 @@ class TestSentryPersistence(unittest.TestCase):
         with open(os.path.join(daemon.SENTRY_DIR, pid_files[0]), 'r') as f:
             self.assertEqual(f.read().strip(), fake_uuid)
 
-        # 清理：停止它
-        daemon.main_dispatcher(['stop_sentry', fake_uuid])
+        # 清理：停止它，並等它收尾完畢（之後臨時目錄就會被刪除）
+        daemon.handle_stop_sentry([fake_uuid], wait_seconds=5)
 
     def test_stop_sentry_removes_pid_file(self):
         """驗證停止哨兵後，PID 文件被刪除"""
@@ -97,15 +111,47 @@ class TestSentryPersistence(unittest.TestCase):
         time.sleep(1)
         
         # 確認啟動成功
-        self.assertTrue(len(os.listdir(daemon.SENTRY_DIR)) > 0)
-        
-        # 停止
+        pid_files = [f for f in os.listdir(daemon.SENTRY_DIR) if f.endswith('.sentry')]
+        self.assertTrue(len(pid_files) > 0)
+        pid = int(pid_files[0].split('.')[0])
+
+        # 停止，並等它收尾完畢
         daemon.main_dispatcher(['stop_sentry', fake_uuid])
-        time.sleep(0.5)
+        daemon._wait_for_pid_exit(pid, 5)
         
         # 斷言：目錄應該空了
         pid_files = [f for f in os.listdir(daemon.SENTRY_DIR) if f.endswith('.sentry')]
         self.assertEqual(len(pid_files), 0, "停止後 PID 文件依然存在！")
 
+    def test_wait_for_pid_exit(self):
+        """等待行程結束並回收；逾時回傳 False"""
+        quick = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(0.2)"])
+        self.assertTrue(daemon._wait_for_pid_exit(quick.pid, 5))
+        slow = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+        try:
+            self.assertFalse(daemon._wait_for_pid_exit(slow.pid, 0.1))
+        finally:
+            slow.kill()
+            slow.wait()
+
+    def test_delete_project_waits_for_sentry_before_cleanup(self):
+        """刪除專案時先等哨兵結束收尾，再清理暫存目錄"""
+        projects = [{"uuid": "uuid-delete-test", "name": "TestDelete", "path": self.TEST_WORKSPACE}]
+        with open(self.TEST_PROJECTS_FILE, 'w') as f:
+            json.dump(projects, f)
+        calls = []
+        throttle_file = os.path.join(self.TEST_WORKSPACE, "uuid-delete-test.sentry_throttle")
+        with open(throttle_file, 'w') as f:
+            f.write('{}')
+        with patch.object(daemon, "handle_stop_sentry", side_effect=lambda *a, **kw: calls.append(("stop", kw))), \
+                patch.object(daemon, "_cleanup_project_temp_dir", side_effect=lambda u: calls.append(("cleanup", u))), \
+                patch.object(daemon, "_cleanup_project_logs"), \
+                patch.object(daemon, "_get_throttle_state_file_path", return_value=throttle_file):
+            daemon.handle_delete_project(["uuid-delete-test"])
+        self.assertEqual(calls, [("stop", {"wait_seconds": daemon.SENTRY_STOP_WAIT_SECONDS}),
+                                 ("cleanup", "uuid-delete-test")])
+        # 節流器狀態檔也一併清除。
+        self.assertFalse(os.path.exists(throttle_file))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
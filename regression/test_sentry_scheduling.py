@@ -0,0 +1,267 @@
+import unittest
+import os
+import sys
+import json
+import uuid
+import threading
+from unittest.mock import patch
+
+# HACK: 確保能找到 src/core
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.core import daemon, formatter
+from src.core.sentry_worker import (
+    AdaptiveInterval, UpdateDebouncer, BackgroundUpdater, StormDetector, MockEvent, parse_poll_ceiling,
+    summarize_changes, run_manual_update, POLL_INTERVAL_MAX_SECONDS,
+)
+
+
+class TestAdaptiveInterval(unittest.TestCase):
+
+    def test_idle_ticks_back_off_to_ceiling(self):
+        """連續閒置時間隔逐輪加倍，並停在上限"""
+        interval = AdaptiveInterval(minimum=0.5, ceiling=3.0, factor=2.0)
+        seen = []
+        for _ in range(5):
+            interval.record(False)
+            seen.append(interval.current)
+        self.assertEqual(seen, [1.0, 2.0, 3.0, 3.0, 3.0])
+
+    def test_activity_resets_to_fast_interval(self):
+        """一有變動就立刻回到最快間隔"""
+        interval = AdaptiveInterval(minimum=0.5, ceiling=8.0)
+        for _ in range(4):
+            interval.record(False)
+        self.assertTrue(interval.record(True))
+        self.assertEqual(interval.current, 0.5)
+        self.assertFalse(interval.record(True))
+
+    def test_ceiling_setting_is_parsed_defensively(self):
+        """無效的上限設定退回預設值，過大或過小的值被夾住"""
+        self.assertEqual(parse_poll_ceiling(None), POLL_INTERVAL_MAX_SECONDS)
+        self.assertEqual(parse_poll_ceiling(""), POLL_INTERVAL_MAX_SECONDS)
+        self.assertEqual(parse_poll_ceiling("-1"), POLL_INTERVAL_MAX_SECONDS)
+        self.assertEqual(parse_poll_ceiling("30"), 30.0)
+        self.assertEqual(parse_poll_ceiling("0.1"), 0.5)
+        self.assertEqual(parse_poll_ceiling("99999"), 300.0)
+
+
+class TestUpdateDebouncer(unittest.TestCase):
+
+    def test_waits_for_quiet_period(self):
+        """持續有變動時不觸發；最後一次變動後靜默滿 quiet 秒才觸發"""
+        debouncer = UpdateDebouncer(quiet=2.0, max_latency=30.0)
+        for t in range(0, 6):
+            debouncer.add([MockEvent(f"/p/f{t}.py", "created")], now=float(t))
+            self.assertFalse(debouncer.is_due(float(t) + 1.0))
+        self.assertEqual(debouncer.seconds_until_due(5.0), 2.0)
+        self.assertTrue(debouncer.is_due(7.0))
+        self.assertEqual(len(debouncer.drain()), 6)
+        self.assertFalse(debouncer)
+
+    def test_max_latency_caps_the_wait(self):
+        """變動永不停歇時，第一次變動後滿 max_latency 秒仍會觸發"""
+        debouncer = UpdateDebouncer(quiet=2.0, max_latency=5.0)
+        for t in range(0, 6):
+            debouncer.add([MockEvent("/p/hot.py", "modified")], now=float(t))
+        self.assertTrue(debouncer.is_due(5.0))
+        self.assertEqual(debouncer.drain(), {"/p/hot.py": "modified"})
+
+    def test_events_coalesce_to_net_effect(self):
+        """同一路徑的事件合併成淨效果"""
+        debouncer = UpdateDebouncer()
+        debouncer.add([
+            MockEvent("/p/tmp.lock", "created"), MockEvent("/p/tmp.lock", "modified"), MockEvent("/p/tmp.lock", "deleted"),
+            MockEvent("/p/a.py", "deleted"), MockEvent("/p/a.py", "created"),
+            MockEvent("/p/b.py", "created"), MockEvent("/p/b.py", "modified"),
+            MockEvent("/p/c.py", "modified"), MockEvent("/p/c.py", "deleted"),
+        ], now=0.0)
+        changes = debouncer.drain()
+        self.assertEqual(changes, {"/p/a.py": "modified", "/p/b.py": "created", "/p/c.py": "deleted"})
+        self.assertEqual(summarize_changes(changes), "created: 1, modified: 1, deleted: 1")
+
+    def test_moves_are_recorded_at_the_destination(self):
+        """搬移記在新位置；建立後搬走等於在新位置建立，搬入剛刪除的路徑等於修改"""
+        debouncer = UpdateDebouncer()
+        debouncer.add([
+            MockEvent("/p/a.py", "moved", dest_path="/p/b.py"),
+            MockEvent("/p/tmp.txt", "created"), MockEvent("/p/tmp.txt", "moved", dest_path="/p/final.txt"),
+            MockEvent("/p/old.py", "deleted"), MockEvent("/p/new.py", "moved", dest_path="/p/old.py"),
+        ], now=0.0)
+        changes = debouncer.drain()
+        self.assertEqual(changes, {"/p/b.py": "moved", "/p/final.txt": "created", "/p/old.py": "modified"})
+        self.assertEqual(summarize_changes(changes), "created: 1, modified: 1, moved: 1")
+
+    def test_empty_batches_do_not_reset_the_timer(self):
+        """沒有變動的節拍不會延後觸發時間"""
+        debouncer = UpdateDebouncer(quiet=1.0, max_latency=10.0)
+        debouncer.add([MockEvent("/p/a.py", "created")], now=0.0)
+        debouncer.add([], now=0.9)
+        self.assertTrue(debouncer.is_due(1.0))
+
+
+def _burst(count, prefix="f"):
+    return [MockEvent(f"/p/{prefix}{i}.py", "created") for i in range(count)]
+
+
+class TestStormDetector(unittest.TestCase):
+
+    def test_small_ticks_are_left_to_the_throttler(self):
+        """未達門檻的節拍照常交回逐筆審查"""
+        storm = StormDetector(threshold=10, calm=2.0)
+        self.assertFalse(storm.absorb(_burst(9), now=0.0))
+        self.assertFalse(storm)
+
+    def test_storm_holds_events_until_calm(self):
+        """達到門檻後暫存所有變動，安靜滿 calm 秒才一次交出"""
+        storm = StormDetector(threshold=10, calm=2.0)
+        self.assertTrue(storm.absorb(_burst(10, "a"), now=0.0))
+        self.assertTrue(storm)
+        # 風暴中的小節拍也由風暴模式接手，不再逐筆審查。
+        self.assertTrue(storm.absorb(_burst(3, "b"), now=1.0))
+        self.assertIsNone(storm.end_if_calm(1.5))
+        self.assertTrue(storm.absorb([], now=2.0))
+        held = storm.end_if_calm(2.0)
+        self.assertEqual(len(held), 13)
+        self.assertFalse(storm)
+        self.assertFalse(storm.absorb(_burst(1, "c"), now=2.5))
+
+    def test_repeated_surges_extend_the_storm(self):
+        """每次再達門檻都重新計算安靜時間"""
+        storm = StormDetector(threshold=5, calm=2.0)
+        storm.absorb(_burst(5, "a"), now=0.0)
+        storm.absorb(_burst(5, "b"), now=1.5)
+        self.assertIsNone(storm.end_if_calm(3.0))
+        self.assertEqual(len(storm.end_if_calm(3.5)), 10)
+
+    def test_settings_come_from_the_project(self):
+        """門檻與平息時間可由 projects.json 調整"""
+        storm = StormDetector()
+        settings = daemon.throttle_settings_from_project({"storm_event_threshold": 50, "storm_calm_seconds": 1})
+        self.assertTrue(storm.configure(settings))
+        self.assertEqual((storm.threshold, storm.calm), (50, 1.0))
+        self.assertFalse(storm.configure(settings))
+        defaults = daemon.throttle_settings_from_project({"storm_event_threshold": 1})
+        self.assertEqual(defaults["storm_event_threshold"], 500)
+
+
+class _BlockingRun:
+    """假的更新函式：每次呼叫都卡住，直到測試放行。"""
+
+    def __init__(self):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, project_uuid):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+
+
+class TestBackgroundUpdater(unittest.TestCase):
+
+    def test_request_does_not_block_the_caller(self):
+        """送出請求後立刻返回，更新在背景執行"""
+        run = _BlockingRun()
+        updater = BackgroundUpdater("p", run=run)
+        updater.request()
+        self.assertTrue(run.started.wait(5))
+        self.assertTrue(updater.busy)
+        run.release.set()
+        self.assertTrue(updater.wait_idle(5))
+        self.assertFalse(updater.busy)
+        self.assertTrue(updater.close())
+
+    def test_requests_during_an_update_coalesce_into_one_rerun(self):
+        """更新進行中收到的多次請求只補跑一次"""
+        run = _BlockingRun()
+        updater = BackgroundUpdater("p", run=run)
+        updater.request()
+        self.assertTrue(run.started.wait(5))
+        for _ in range(5):
+            updater.request()
+        run.release.set()
+        self.assertTrue(updater.wait_idle(5))
+        self.assertEqual(run.calls, 2)
+        self.assertEqual(updater.completed, 2)
+        updater.close()
+
+    def test_close_reports_unfinished_work(self):
+        """關閉時仍在排隊的更新不會開始，並回報為未完成"""
+        run = _BlockingRun()
+        updater = BackgroundUpdater("p", run=run)
+        updater.request()
+        self.assertTrue(run.started.wait(5))
+        updater.request()
+        threading.Timer(0.1, run.release.set).start()
+        self.assertFalse(updater.close(timeout=5))
+        self.assertEqual(run.calls, 1)
+
+    def test_failing_update_keeps_the_thread_alive(self):
+        """更新失敗不會讓背景執行緒停止服務"""
+        calls = []
+
+        def flaky(project_uuid):
+            calls.append(project_uuid)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+
+        updater = BackgroundUpdater("p", run=flaky)
+        updater.request()
+        self.assertTrue(updater.wait_idle(5))
+        updater.request()
+        self.assertTrue(updater.wait_idle(5))
+        self.assertEqual(calls, ["p", "p"])
+        self.assertTrue(updater.close())
+
+    def test_restored_from_backup_is_retried_once(self):
+        """設定檔從備份恢復時自動重試一次（同 main.py 的退出碼 10）"""
+        with patch.object(daemon, "handle_manual_update",
+                          side_effect=[daemon.DataRestoredFromBackupWarning("restored"), None]) as handler:
+            self.assertTrue(run_manual_update("p"))
+        self.assertEqual(handler.call_count, 2)
+        with patch.object(daemon, "handle_manual_update", side_effect=ValueError("未找到")):
+            self.assertFalse(run_manual_update("p"))
+
+    def test_formatter_strategy_matches_cli_output(self):
+        """apply_strategy 與 formatter CLI 的包裝結果一致，worker 不必再替換 stdin/stdout"""
+        self.assertEqual(formatter.apply_strategy("a\nb\n", "obsidian"), "```\na\nb\n```")
+        self.assertEqual(formatter.apply_strategy("a\n"), "a\n")
+
+
+class TestStatusFileFormats(unittest.TestCase):
+
+    def setUp(self):
+        self.uuid = f"test-status-{uuid.uuid4()}"
+        self.status_file = daemon._get_status_file_path(self.uuid)
+
+    def tearDown(self):
+        if os.path.exists(self.status_file):
+            os.remove(self.status_file)
+
+    def _write(self, payload):
+        with open(self.status_file, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+
+    def test_new_format_reports_muted_paths_and_interval(self):
+        """新格式的狀態檔同時帶有靜默名單與輪詢間隔"""
+        self._write({"muted_paths": ["/p/a"], "poll_interval": 4.0, "updated_at": "2026-01-01 00:00:00"})
+        self.assertEqual(daemon.handle_get_muted_paths([self.uuid]), ["/p/a"])
+        self.assertEqual(daemon._read_status_file(self.uuid)["poll_interval"], 4.0)
+
+    def test_legacy_list_format_is_still_accepted(self):
+        """舊版哨兵寫入的純列表格式仍可讀取"""
+        self._write(["/p/a", "/p/b"])
+        self.assertEqual(daemon.handle_get_muted_paths([self.uuid]), ["/p/a", "/p/b"])
+
+    def test_missing_status_file_means_nothing_muted(self):
+        """狀態檔不存在時視為沒有靜默路徑"""
+        self.assertEqual(daemon._read_status_file(self.uuid), {})
+        self.assertEqual(daemon.handle_get_muted_paths([self.uuid]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
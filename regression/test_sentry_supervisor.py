@@ -0,0 +1,144 @@
+import unittest
+import os
+import sys
+import io
+import json
+import tempfile
+import threading
+from unittest.mock import patch
+
+# HACK: 確保能找到 src/core
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.core import daemon, journal, sentry_supervisor, snapshot_store
+from src.core.sentry_supervisor import SentrySupervisor, ThreadRoutedStream
+
+
+class _FakeSentries:
+    """取代 run_sentry：記錄每次啟動的參數，收到停止事件才結束；crash 集合中的專案立刻結束。"""
+
+    def __init__(self):
+        self.started = []
+        self.crash = set()
+
+    def __call__(self, args, stop):
+        self.started.append(list(args))
+        if args[0] in self.crash:
+            return
+        stop.wait(5)
+
+
+class TestSentrySupervisor(unittest.TestCase):
+
+    def setUp(self):
+        # 所有狀態檔都寫進沙盒，不碰 repo 的 temp/ 與 logs/
+        self._temp = tempfile.TemporaryDirectory(prefix="sentry_supervisor_")
+        self.sentry_dir = os.path.join(self._temp.name, "sentry")
+        projects_dir = os.path.join(self._temp.name, "projects")
+        os.makedirs(self.sentry_dir)
+        self.fake = _FakeSentries()
+        self.patches = [
+            patch.object(daemon, "SENTRY_DIR", self.sentry_dir),
+            patch.object(daemon, "SUPERVISOR_PID_FILE", os.path.join(self.sentry_dir, "supervisor.pid")),
+            patch.object(daemon, "TEMP_PROJECTS_DIR", projects_dir),
+            patch.object(daemon, "LOGS_DIR", os.path.join(self._temp.name, "logs")),
+            patch.object(snapshot_store, "TEMP_PROJECTS_DIR", projects_dir),
+            patch.object(journal, "TEMP_PROJECTS_DIR", projects_dir),
+            patch.object(sentry_supervisor.sentry_worker, "run_sentry", self.fake),
+        ]
+        for p in self.patches:
+            p.start()
+        self.supervisor = SentrySupervisor(pid=4242)
+
+    def tearDown(self):
+        self.supervisor.shutdown()
+        for p in self.patches:
+            p.stop()
+        self._temp.cleanup()
+
+    def _register(self, sentry_uuid, path="/p"):
+        with open(daemon.get_supervised_args_file_path(4242, sentry_uuid), "w", encoding="utf-8") as f:
+            json.dump({"args": [sentry_uuid, path], "log_file": None}, f)
+        with open(daemon.get_supervised_pid_file_path(4242, sentry_uuid), "w", encoding="utf-8") as f:
+            f.write(sentry_uuid)
+
+    def _settle(self):
+        """等所有停止中的執行緒結束，再對帳一次。"""
+        for runner in self.supervisor.stopping:
+            runner.thread.join(5)
+        self.supervisor.reconcile()
+
+    def test_registrations_start_and_stop_projects(self):
+        """登記即啟動，註銷即停止；同一行程可同時託管多個專案"""
+        self._register("a")
+        self._register("b")
+        self.supervisor.reconcile()
+        self.assertEqual(sorted(self.supervisor.runners), ["a", "b"])
+
+        daemon._remove_supervised_registration(daemon.get_supervised_pid_file_path(4242, "a"))
+        self.supervisor.reconcile()
+        self.assertEqual(sorted(self.supervisor.runners), ["b"])
+        self._settle()
+        self.assertEqual(self.supervisor.stopping, [])
+        self.assertFalse(os.path.exists(daemon.get_supervised_args_file_path(4242, "a")))
+
+    def test_changed_arguments_restart_the_project(self):
+        """參數改變時先停下舊執行緒，收尾後以新參數重新啟動"""
+        self._register("a", "/old")
+        self.supervisor.reconcile()
+        self._register("a", "/new")
+        self.supervisor.reconcile()
+        self.assertNotIn("a", self.supervisor.runners)
+        self._settle()
+        self.assertEqual(self.fake.started, [["a", "/old"], ["a", "/new"]])
+
+    def test_crashed_project_is_deregistered(self):
+        """專案執行緒自行結束時註銷戶籍，list_projects 會看到它停止"""
+        self.fake.crash.add("a")
+        self._register("a")
+        self.supervisor.reconcile()
+        self.supervisor.runners["a"].thread.join(5)
+        self.supervisor.reconcile()
+        self.assertEqual(self.supervisor.runners, {})
+        self.assertFalse(os.path.exists(daemon.get_supervised_pid_file_path(4242, "a")))
+        self.assertEqual(len(self.fake.started), 1)
+
+    def test_incomplete_registration_is_ignored(self):
+        """只有戶籍、還沒有參數檔的登記不會被啟動"""
+        with open(daemon.get_supervised_pid_file_path(4242, "a"), "w", encoding="utf-8") as f:
+            f.write("a")
+        self.assertEqual(self.supervisor.registered(), {})
+
+    def test_stop_sentry_never_signals_the_supervisor(self):
+        """stop_sentry 對託管的哨兵只註銷戶籍，不會終止整個監督行程"""
+        own_pid = os.getpid()
+        for sentry_uuid in ("a", "b"):
+            with open(daemon.get_supervised_args_file_path(own_pid, sentry_uuid), "w", encoding="utf-8") as f:
+                json.dump({"args": [sentry_uuid, "/p"]}, f)
+            with open(daemon.get_supervised_pid_file_path(own_pid, sentry_uuid), "w", encoding="utf-8") as f:
+                f.write(sentry_uuid)
+        with patch.object(daemon.os, "kill") as kill:
+            daemon.handle_stop_sentry(["a"])
+        kill.assert_not_called()
+        self.assertEqual(sorted(os.listdir(self.sentry_dir)), [f"{own_pid}.b.args", f"{own_pid}.b.sentry"])
+
+
+class TestThreadRoutedStream(unittest.TestCase):
+
+    def test_output_follows_the_thread_name(self):
+        """各專案執行緒的輸出寫入各自的日誌，其餘寫入監督行程自己的輸出"""
+        fallback, project_log = io.StringIO(), io.StringIO()
+        stream = ThreadRoutedStream(fallback)
+        with patch.dict(sentry_supervisor._log_routes, {"sentry-a": project_log}):
+            worker = threading.Thread(target=lambda: stream.write("from a\n"), name="sentry-a")
+            worker.start()
+            worker.join()
+            stream.write("from supervisor\n")
+        self.assertEqual(project_log.getvalue(), "from a\n")
+        self.assertEqual(fallback.getvalue(), "from supervisor\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
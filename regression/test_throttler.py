@@ -3,6 +3,8 @@ import unittest
 import os
 import sys
 import time
+import shutil
+import tempfile
 from unittest.mock import patch
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -10,7 +12,11 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 # 使用 worker 裡面的 MockEvent (因為我們不再依賴 watchdog)
-from src.core.sentry_worker import SmartThrottler, MockEvent
+from src.core import daemon
+from src.core.sentry_worker import (
+    SmartThrottler, SlidingBucketSums, MockEvent, PathPrefixTrie, process_events, save_throttler_state,
+    load_throttler_state,
+)
 
 class TestSmartThrottler(unittest.TestCase):
 
@@ -58,5 +64,254 @@ class TestSmartThrottler(unittest.TestCase):
         self.assertIn(target_file, throttler.muted_paths)
         print("PASS")
 
+    def test_sliding_window_uses_injected_monotonic_clock(self):
+        print("\n【SmartThrottler 測試】: 正在驗證『滑動窗口 (monotonic)』...")
+        throttler = SmartThrottler()
+        target_file = "/path/to/slow.py"
+
+        # 每 2 秒修改一次：5 秒窗口內最多 3 次，永遠不會過熱。
+        for i in range(10):
+            self.assertTrue(throttler.should_process(MockEvent(target_file, 'modified'), now=100.0 + 2 * i))
+        self.assertNotIn(target_file, throttler.muted_paths)
+        # 緩衝長度固定為閾值，不隨事件數成長。
+        self.assertEqual(len(throttler.hot_events[target_file]), throttler.hot_threshold)
+        print("PASS")
+
+    def test_batch_matches_one_by_one(self):
+        print("\n【SmartThrottler 測試】: 正在驗證『批次判斷』...")
+        events = [MockEvent(f"/path/to/logs/log_{i}.txt", 'created') for i in range(8)]
+        events += [MockEvent("/path/to/hot.py", 'modified') for _ in range(6)]
+
+        single = SmartThrottler(burst_creation_threshold=5)
+        expected = [single.should_process(e, now=50.0) for e in events]
+        batch = SmartThrottler(burst_creation_threshold=5)
+        self.assertEqual(batch.should_process_batch(events, now=50.0), expected)
+        self.assertEqual(set(batch.muted_paths), {"/path/to/logs", "/path/to/hot.py"})
+        print("PASS")
+
+    def test_idle_keys_are_evicted(self):
+        print("\n【SmartThrottler 測試】: 正在驗證『閒置路徑清理』...")
+        throttler = SmartThrottler(size_growth_period_seconds=60.0)
+        start = throttler.last_evict
+        throttler.should_process_batch([MockEvent(f"/p/f{i}.py", 'modified', file_size=1) for i in range(100)], now=start)
+        throttler.should_process_batch([MockEvent("/p/d/new.py", 'created')], now=start + 1)
+        self.assertEqual((len(throttler.hot_events), len(throttler.file_sizes), len(throttler.dir_events)), (100, 100, 1))
+
+        # 清理間隔到了，但 R4 窗口（60 秒）還沒過：只清掉 R1 / R3 的紀錄。
+        throttler.should_process_batch([], now=start + SmartThrottler.EVICT_INTERVAL_SECONDS)
+        self.assertEqual((len(throttler.hot_events), len(throttler.file_sizes), len(throttler.dir_events)), (0, 100, 0))
+        # 所有窗口都過了：全部清空。
+        throttler.should_process_batch([], now=start + 120.0)
+        self.assertEqual(throttler.file_sizes, {})
+        print("PASS")
+
+    def test_deep_paths_under_muted_directory_are_blocked(self):
+        print("\n【SmartThrottler 測試】: 正在驗證『靜默子樹』...")
+        throttler = SmartThrottler(burst_creation_threshold=5)
+        for i in range(6):
+            throttler.should_process(MockEvent(f"/path/to/logs/log_{i}.txt", 'created'))
+
+        self.assertFalse(throttler.should_process(MockEvent("/path/to/logs/2026/01/x.txt", 'created')))
+        self.assertTrue(throttler.should_process(MockEvent("/path/to/logs_old/x.txt", 'created')))
+        print("PASS")
+
+    def _overheat(self, throttler, path, now):
+        for i in range(throttler.hot_threshold):
+            throttler.should_process(MockEvent(path, 'modified'), now=now + 0.1 * i)
+
+    def test_mute_expires_with_exponential_cool_down(self):
+        print("\n【SmartThrottler 測試】: 正在驗證『靜默指數冷卻』...")
+        throttler = SmartThrottler(mute_ttl_seconds=10.0, mute_ttl_max_seconds=30.0)
+        target_file = "/path/to/main.py"
+
+        # 第一次靜默 10 秒，到期自動解除。
+        self._overheat(throttler, target_file, now=0.0)
+        self.assertIn(target_file, throttler.muted_paths)
+        self.assertEqual(throttler.release_expired(now=9.0), [])
+        self.assertEqual(throttler.release_expired(now=10.5), [target_file])
+        self.assertNotIn(target_file, throttler.muted_paths)
+
+        # 解除後馬上又過熱：升一級，靜默 20 秒；再一次則被上限夾在 30 秒。
+        self._overheat(throttler, target_file, now=11.0)
+        self.assertEqual(throttler.mute_until[target_file][0], 11.4 + 20.0)
+        throttler.release_expired(now=40.0)
+        self._overheat(throttler, target_file, now=41.0)
+        self.assertEqual(throttler.mute_until[target_file][0], 41.4 + 30.0)
+        print("PASS")
+
+    def test_cool_down_level_decays_when_quiet(self):
+        print("\n【SmartThrottler 測試】: 正在驗證『冷卻等級衰減』...")
+        throttler = SmartThrottler(mute_ttl_seconds=10.0)
+        target_file = "/path/to/main.py"
+        self._overheat(throttler, target_file, now=0.0)
+        throttler.release_expired(now=11.0)
+        # 解除後安靜超過下一段靜默時長（20 秒），冷卻等級歸零。
+        self._overheat(throttler, target_file, now=40.0)
+        self.assertEqual(throttler.mute_until[target_file], (40.4 + 10.0, 0))
+        print("PASS")
+
+    def test_directory_aggregate_growth_triggers_directory_muting(self):
+        print("\n【SmartThrottler 測試】: 正在驗證『目錄膨脹 (R5)』...")
+        throttler = SmartThrottler(dir_growth_file_threshold=50, dir_growth_period_seconds=60.0)
+        target_dir = "/path/to/cache"
+
+        # 每 0.5 秒一個新檔：R3（10 秒內超過 20 個）永遠不會觸發，但 60 秒內累計超過 50 個。
+        verdicts = [throttler.should_process(MockEvent(f"{target_dir}/c_{i}.bin", 'created'), now=0.5 * i)
+                    for i in range(51)]
+        self.assertTrue(all(verdicts[:50]))
+        self.assertFalse(verdicts[50])
+        self.assertIn(target_dir, throttler.muted_paths)
+        print("PASS")
+
+    def test_directory_growth_counts_bytes_of_small_files(self):
+        print("\n【SmartThrottler 測試】: 正在驗證『目錄膨脹 (R5) 位元組』...")
+        throttler = SmartThrottler(dir_growth_threshold_mb=1, dir_growth_period_seconds=60.0)
+        target_dir = "/path/to/logs"
+        # 兩個檔案各自成長 0.6MB：單檔都沒超過 R4，但目錄合計超過 1MB。
+        for name in ("a.log", "b.log"):
+            throttler.should_process(MockEvent(f"{target_dir}/{name}", 'modified', file_size=0), now=1.0)
+        self.assertTrue(throttler.should_process(MockEvent(f"{target_dir}/a.log", 'modified', file_size=600 * 1024), now=2.0))
+        self.assertFalse(throttler.should_process(MockEvent(f"{target_dir}/b.log", 'modified', file_size=600 * 1024), now=3.0))
+        self.assertIn(target_dir, throttler.muted_paths)
+        print("PASS")
+
+    def test_bucket_sums_slide_out_of_the_window(self):
+        print("\n【SmartThrottler 測試】: 正在驗證『分桶滑動累計』...")
+        sums = SlidingBucketSums(period=12.0)
+        for t in range(12):
+            sums.add(float(t), 10, 1)
+        self.assertEqual((sums.total_count, sums.total_bytes), (12, 120))
+        # 前進 3 秒：最舊的 3 個桶滑出窗口。
+        sums.advance(14.5)
+        self.assertEqual((sums.total_count, sums.total_bytes), (9, 90))
+        # 長時間沒有成長：整個窗口歸零並視為閒置。
+        sums.advance(100.0)
+        self.assertEqual((sums.total_count, sums.total_bytes), (0, 0))
+        self.assertTrue(sums.idle(100.0))
+        print("PASS")
+
+    def test_move_counts_as_one_creation_at_the_destination(self):
+        print("\n【SmartThrottler 測試】: 正在驗證『搬移事件』...")
+        throttler = SmartThrottler(burst_creation_threshold=2)
+        moves = [MockEvent(f"/p/src/{i}.py", 'moved', dest_path=f"/p/dst/{i}.py") for i in range(3)]
+        self.assertEqual(throttler.should_process_batch(moves), [True, True, False])
+        self.assertIn("/p/dst", throttler.muted_paths)
+
+        # 搬進靜默目錄的事件被擋下時，舊位置的消失仍要反映到輸出。
+        with patch("builtins.print"):
+            effective = process_events([MockEvent("/p/src/9.py", 'moved', dest_path="/p/dst/9.py")], throttler, set())
+        self.assertEqual([(e.event_type, e.src_path) for e in effective], [('deleted', "/p/src/9.py")])
+        print("PASS")
+
+    def test_settings_are_hot_reloaded(self):
+        print("\n【SmartThrottler 測試】: 正在驗證『節流設定熱更新』...")
+        throttler = SmartThrottler()
+        settings = daemon.throttle_settings_from_project({
+            "throttle_hot_threshold": 2, "throttle_size_growth_mb": 1, "mute_ttl_seconds": "oops",
+        })
+        self.assertEqual(settings["mute_ttl_seconds"], 60.0)
+        self.assertTrue(throttler.configure(settings))
+        self.assertFalse(throttler.configure(settings))
+        self.assertEqual(throttler.size_threshold_bytes, 1024 * 1024)
+
+        # 過熱閾值降為 2：第二次修改就靜默。
+        self.assertTrue(throttler.should_process(MockEvent("/p/a.py", 'modified'), now=1.0))
+        self.assertFalse(throttler.should_process(MockEvent("/p/a.py", 'modified'), now=1.5))
+        self.assertIn("/p/a.py", throttler.muted_paths)
+        print("PASS")
+
+
+class TestThrottlerPersistence(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="sentry_throttle_")
+        self.state_file = os.path.join(self.workdir, "p.sentry_throttle")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_state_survives_a_restart(self):
+        print("\n【SmartThrottler 測試】: 正在驗證『狀態跨重啟還原』...")
+        # 舊行程：monotonic 時鐘 100 秒時靜默 main.py 60 秒，並留下 R3 窗口紀錄。
+        old = SmartThrottler(burst_creation_threshold=5)
+        for i in range(5):
+            old.should_process(MockEvent("/p/main.py", 'modified'), now=100.0)
+        old.should_process(MockEvent("/p/logs/a.txt", 'created'), now=100.0)
+        state = old.to_state(now=100.0, wall_now=1_000_000.0)
+
+        # 新行程 30 秒後啟動，monotonic 時鐘從 5 秒開始：靜默剩 30 秒，R3 紀錄已超出 10 秒窗口。
+        new = SmartThrottler(burst_creation_threshold=5)
+        self.assertEqual(new.restore_state(state, now=5.0, wall_now=1_000_030.0), 1)
+        self.assertIn("/p/main.py", new.muted_paths)
+        self.assertAlmostEqual(new.mute_until["/p/main.py"][0], 35.0, places=6)
+        self.assertEqual(new.dir_events, {})
+        self.assertEqual(new.release_expired(now=36.0), ["/p/main.py"])
+        print("PASS")
+
+    def test_directory_growth_survives_a_restart(self):
+        print("\n【SmartThrottler 測試】: 正在驗證『R5 累計跨重啟還原』...")
+        old = SmartThrottler(dir_growth_file_threshold=10, dir_growth_period_seconds=60.0)
+        for i in range(8):
+            old.should_process(MockEvent(f"/p/cache/{i}.bin", 'created'), now=100.0 + i)
+        state = old.to_state(now=110.0, wall_now=1_000_000.0)
+
+        new = SmartThrottler(dir_growth_file_threshold=10, dir_growth_period_seconds=60.0)
+        new.restore_state(state, now=5.0, wall_now=1_000_010.0)
+        self.assertEqual(new.dir_growth["/p/cache"].total_count, 8)
+        for i in range(3):
+            new.should_process(MockEvent(f"/p/cache/n{i}.bin", 'created'), now=6.0)
+        self.assertIn("/p/cache", new.muted_paths)
+        print("PASS")
+
+    def test_expired_mutes_are_dropped_on_load(self):
+        print("\n【SmartThrottler 測試】: 正在驗證『載入時丟棄過期紀錄』...")
+        old = SmartThrottler(mute_ttl_seconds=10.0)
+        for i in range(5):
+            old.should_process(MockEvent("/p/main.py", 'modified'), now=0.0)
+        state = old.to_state(now=0.0, wall_now=500.0)
+        new = SmartThrottler()
+        self.assertEqual(new.restore_state(state, now=0.0, wall_now=600.0), 0)
+        self.assertEqual(len(new.muted_paths), 0)
+        self.assertEqual(new.hot_events, {})
+        print("PASS")
+
+    def test_state_file_round_trip_and_corruption(self):
+        print("\n【SmartThrottler 測試】: 正在驗證『狀態檔讀寫』...")
+        old = SmartThrottler()
+        for i in range(5):
+            old.should_process(MockEvent("/p/main.py", 'modified'))
+        self.assertTrue(save_throttler_state(old, self.state_file))
+        new = SmartThrottler()
+        self.assertEqual(load_throttler_state(new, self.state_file), 1)
+        self.assertIn("/p/main.py", new.muted_paths)
+
+        with open(self.state_file, "w", encoding="utf-8") as f:
+            f.write('{"version": 1, "mutes": {"/p/x": 3}}')
+        self.assertEqual(load_throttler_state(SmartThrottler(), self.state_file), 0)
+        self.assertEqual(load_throttler_state(SmartThrottler(), os.path.join(self.workdir, "missing")), 0)
+        print("PASS")
+
+
+class TestPathPrefixTrie(unittest.TestCase):
+
+    def test_covers_is_component_based(self):
+        trie = PathPrefixTrie(["/p/build", "/p/src/hot.py"])
+        self.assertTrue(trie.covers("/p/build"))
+        self.assertTrue(trie.covers("/p/build/a/b/c.o"))
+        self.assertTrue(trie.covers("/p/src/hot.py"))
+        self.assertFalse(trie.covers("/p/builder/x"))
+        self.assertFalse(trie.covers("/p/src"))
+        self.assertIn("/p/build", trie)
+        self.assertNotIn("/p/build/a", trie)
+        self.assertEqual(sorted(trie), ["/p/build", "/p/src/hot.py"])
+
+    def test_discard_prunes_empty_nodes(self):
+        trie = PathPrefixTrie(["/p/a/b", "/p/a"])
+        trie.discard("/p/a")
+        self.assertTrue(trie.covers("/p/a/b/c"))
+        self.assertFalse(trie.covers("/p/a/x"))
+        trie.discard("/p/a/b")
+        self.assertEqual((len(trie), trie._root), (0, {}))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
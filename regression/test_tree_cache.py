@@ -0,0 +1,202 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+from unittest.mock import patch
+
+# HACK: 確保能找到 src/core
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.core import engine, sentry_worker
+from src.core.sentry_worker import (BackgroundUpdater, FileSnapshot, MockEvent, build_ignore_rules,
+                                    changed_directories, drop_internal_events, vanished_or_new_dir_parents)
+
+
+def _write(path, content="x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+class TestIncrementalTree(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="engine_cache_")
+        for top in ("alpha", "beta", "gamma"):
+            for sub in ("x", "y"):
+                for i in range(3):
+                    _write(os.path.join(self.root, top, sub, f"f{i}.py"))
+        _write(os.path.join(self.root, "zeta.md"))
+        _write(os.path.join(self.root, "__pycache__", "a.pyc"))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def _assert_matches_full_render(self, cache, changed, **options):
+        incremental = engine.generate_annotated_tree(self.root, None, tree_cache=cache, changed_dirs=changed, **options)
+        self.assertEqual(incremental, engine.generate_annotated_tree(self.root, None, **options))
+
+    def test_splices_match_full_render(self):
+        """新增、刪除、改名、檔案換成資料夾等變動，增量重繪與完整重繪逐字一致"""
+        for options in ({}, {"folder_spacing": 1}, {"max_depth": 2}):
+            with self.subTest(options=options):
+                self.tearDown()
+                self.setUp()
+                cache = engine.TreeCache()
+                engine.generate_annotated_tree(self.root, None, tree_cache=cache, **options)
+
+                _write(self._path("beta", "y", "new.py"))
+                self._assert_matches_full_render(cache, {self._path("beta", "y")}, **options)
+
+                # 最後一個資料夾的分支符號改變，底下整棵子樹的前綴都要重排。
+                _write(self._path("delta", "z", "g.py"))
+                self._assert_matches_full_render(cache, {self._path("delta", "z")}, **options)
+
+                os.rename(self._path("alpha", "x"), self._path("gamma", "moved"))
+                self._assert_matches_full_render(cache, {self._path("alpha"), self._path("gamma")}, **options)
+
+                # 只回報被刪除資料夾本身：改由上一層重列。
+                shutil.rmtree(self._path("beta", "x"))
+                self._assert_matches_full_render(cache, {self._path("beta", "x")}, **options)
+
+                os.remove(self._path("zeta.md"))
+                _write(self._path("zeta.md", "inside.txt"))
+                self._assert_matches_full_render(cache, {self.root, self._path("zeta.md")}, **options)
+
+                # 被忽略或根目錄以外的變動不影響輸出。
+                _write(self._path("__pycache__", "b.pyc"))
+                self._assert_matches_full_render(cache, {self._path("__pycache__"), "/elsewhere"}, **options)
+
+    def test_only_changed_directories_are_listed(self):
+        """增量重繪只重列回報的資料夾，其餘子樹沿用快取"""
+        cache = engine.TreeCache()
+        engine.generate_annotated_tree(self.root, None, tree_cache=cache)
+        _write(self._path("gamma", "x", "new.py"))
+        with patch.object(engine, "_list_directory", wraps=engine._list_directory) as lister:
+            tree = engine.generate_annotated_tree(self.root, None, tree_cache=cache,
+                                                  changed_dirs={self._path("gamma", "x")})
+        self.assertEqual([c.args[0] for c in lister.call_args_list], [self._path("gamma", "x")])
+        self.assertIn("new.py", tree)
+
+        with patch.object(engine, "_list_directory", wraps=engine._list_directory) as lister:
+            engine.generate_annotated_tree(self.root, None, tree_cache=cache, changed_dirs=set())
+        lister.assert_not_called()
+
+    def test_unknown_or_changed_options_force_full_render(self):
+        """沒有變動目錄（未知）、選項改變或快取過期時改為完整重繪"""
+        cache = engine.TreeCache(max_age=60)
+        engine.generate_annotated_tree(self.root, None, tree_cache=cache)
+        _write(self._path("alpha", "hidden.py"))
+        stale = engine.generate_annotated_tree(self.root, None, tree_cache=cache, changed_dirs=set())
+        self.assertNotIn("hidden.py", stale)
+        self.assertIn("hidden.py", engine.generate_annotated_tree(self.root, None, tree_cache=cache))
+
+        _write(self._path("beta", "later.py"))
+        self.assertIn("later.py", engine.generate_annotated_tree(
+            self.root, None, tree_cache=cache, changed_dirs=set(), ignore_patterns={"gamma"}))
+
+        _write(self._path("beta", "expired.py"))
+        cache.rendered_at -= 60
+        self.assertIn("expired.py", engine.generate_annotated_tree(
+            self.root, None, tree_cache=cache, changed_dirs=set(), ignore_patterns={"gamma"}))
+
+
+class TestSentryDirtyTracking(unittest.TestCase):
+
+    def test_changed_directories(self):
+        """內容修改不影響目錄樹；搬移同時點名新舊兩個目錄"""
+        events = [
+            MockEvent("/p/a/f.py", "modified"),
+            MockEvent("/p/b/g.py", "created"),
+            MockEvent("/p/c/h.py", "moved", dest_path="/p/d/h.py"),
+        ]
+        self.assertEqual(changed_directories(events), {"/p/b", "/p/c", "/p/d"})
+
+    def test_empty_directories_mark_their_parent(self):
+        """新增或刪除空資料夾不產生檔案事件，仍要點名其上層，增量重繪才與完整重繪一致"""
+        root = tempfile.mkdtemp(prefix="engine_cache_")
+        self.addCleanup(shutil.rmtree, root, True)
+        _write(os.path.join(root, "src", "a.py"))
+        cache = engine.TreeCache()
+        engine.generate_annotated_tree(root, None, tree_cache=cache)
+        before = FileSnapshot(root)
+
+        os.mkdir(os.path.join(root, "docs"))
+        _write(os.path.join(root, "src", "b.py"))
+        after = FileSnapshot(root, previous=before, full=True)
+        self.assertEqual(vanished_or_new_dir_parents(before, after), {root})
+        changed = changed_directories(sentry_worker.diff_snapshots(before, after))
+        changed |= vanished_or_new_dir_parents(before, after)
+        tree = engine.generate_annotated_tree(root, None, tree_cache=cache, changed_dirs=changed)
+        self.assertIn("docs/", tree)
+        self.assertEqual(tree, engine.generate_annotated_tree(root, None))
+
+        os.rmdir(os.path.join(root, "docs"))
+        final = FileSnapshot(root, previous=after, full=True)
+        self.assertEqual(sentry_worker.diff_snapshots(after, final), [])
+        tree = engine.generate_annotated_tree(root, None, tree_cache=cache,
+                                              changed_dirs=vanished_or_new_dir_parents(after, final))
+        self.assertNotIn("docs/", tree)
+        self.assertEqual(tree, engine.generate_annotated_tree(root, None))
+        self.assertEqual(vanished_or_new_dir_parents(final, final), set())
+
+    def test_internal_names_keep_cached_tree_in_sync(self):
+        """內部名單（README.md、data、logs、temp）的變動不觸發更新，但快取的目錄樹仍與完整重繪一致"""
+        root = tempfile.mkdtemp(prefix="engine_cache_")
+        self.addCleanup(shutil.rmtree, root, True)
+        _write(os.path.join(root, "src", "a.py"))
+        _write(os.path.join(root, "pkg", "data", "d.csv"))
+        _write(os.path.join(root, "pkg", "logs", "old.log"))
+        ignore = build_ignore_rules([])
+        cache = engine.TreeCache()
+        engine.generate_annotated_tree(root, None, tree_cache=cache)
+        before = FileSnapshot(root, ignore=ignore)
+
+        _write(os.path.join(root, "src", "README.md"))
+        _write(os.path.join(root, "temp", "x.bak"))
+        os.rename(os.path.join(root, "pkg", "data"), os.path.join(root, "pkg", "data2"))
+        os.remove(os.path.join(root, "pkg", "logs", "old.log"))
+        _write(os.path.join(root, "pkg", "logs", "new.log"))
+        after = FileSnapshot(root, previous=before, ignore=ignore, full=True)
+        events = sentry_worker.diff_snapshots(before, after)
+        changed = changed_directories(events) | vanished_or_new_dir_parents(before, after)
+        tree = engine.generate_annotated_tree(root, None, tree_cache=cache, changed_dirs=changed)
+        self.assertEqual(tree, engine.generate_annotated_tree(root, None))
+
+        # 只有搬出內部名單的資料夾改名會觸發更新，其餘變動都被剔除。
+        kept = drop_internal_events(root, events)
+        self.assertEqual([(e.event_type, os.path.basename(e.dest_path or e.src_path)) for e in kept],
+                         [("moved", "data2")])
+
+    def test_updater_hands_over_dirty_dirs_and_drops_cache_on_failure(self):
+        """更新開始時取出累積的變動目錄；更新失敗時丟棄快取"""
+        cache = engine.TreeCache()
+        cache.options = ("stale",)
+        seen = []
+
+        def fake_run(project_uuid, tree_cache, changed_dirs):
+            seen.append(set(changed_dirs))
+            return len(seen) == 1
+
+        with patch.object(sentry_worker, "run_manual_update", side_effect=fake_run):
+            updater = BackgroundUpdater("p", tree_cache=cache)
+            updater.mark_dirty({"/p/a"})
+            updater.mark_dirty({"/p/b"})
+            updater.request()
+            self.assertTrue(updater.wait_idle(5))
+            self.assertEqual(cache.options, ("stale",))
+            updater.request()
+            self.assertTrue(updater.wait_idle(5))
+            updater.close()
+        self.assertEqual(seen, [{"/p/a", "/p/b"}, set()])
+        self.assertIsNone(cache.options)
+
+
+if __name__ == '__main__':
+    unittest.main()
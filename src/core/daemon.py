@@ -7,7 +7,7 @@ import os
 import sys
 import time
 import signal
-from typing import Optional, Tuple, List, Dict, Any
+from typing import Optional, Tuple, List, Dict, Any, Iterable
 import subprocess
 import shutil
 
@@ -22,14 +22,26 @@ from .worker import execute_update_workflow
 from .io_gateway import safe_read_modify_write
 # 【核心重構】我們導入全新的「I/O 網關」，以及它可能會發射的「警告信號彈」。
 from .io_gateway import safe_read_modify_write, DataRestoredFromBackupWarning
+# 哨兵快照 checkpoint：用來判斷哨兵能否暖啟動。
+from . import snapshot_store
+from . import scan_pool
+# 哨兵變動日誌：read_journal 以游標增量讀取。
+from . import journal
+# 增量重繪快取的型別（快取本身由哨兵持有）。
+from . import engine
+# 與 engine / 哨兵共用的忽略規則比對器。
+from . import ignore_rules
 
 
 # --- 全局配置 ---
 # 我們計算出專案的根目錄路徑。
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 
-# 我們定義 temp 目錄的默認路徑。
-TEMP_DIR = os.path.join(project_root, 'temp')
+# 我們定義 temp 目錄的默認路徑（測試時可用環境變數 TEST_TEMP_DIR 整個改到沙盒，哨兵子行程會繼承）。
+TEMP_DIR = os.environ.get('TEST_TEMP_DIR') or os.path.join(project_root, 'temp')
+
+# 我們定義 logs 目錄的路徑（哨兵日誌、監督行程日誌）。
+LOGS_DIR = os.path.join(project_root, 'logs')
 
 # 三大族譜：lists / sentry / projects
 TEMP_LISTS_DIR = os.path.join(TEMP_DIR, 'lists')      # 全局名單 / 設定備份
@@ -65,8 +77,7 @@ def _cleanup_project_logs(project_config: Dict[str, Any]) -> None:
     project_name = project_config.get("name", "Unnamed_Project")
     safe_prefix = "".join(c if c.isalnum() else "_" for c in project_name)
 
-    log_dir = os.path.join(project_root, "logs")
-    log_file = os.path.join(log_dir, f"{safe_prefix}.log")
+    log_file = os.path.join(LOGS_DIR, f"{safe_prefix}.log")
 
     if os.path.exists(log_file):
         try:
@@ -76,6 +87,22 @@ def _cleanup_project_logs(project_config: Dict[str, Any]) -> None:
             print(f"【守護進程警告】：刪除 log 檔案 {safe_prefix}.log 時失敗: {e}", file=sys.stderr)
 
 
+def _cleanup_project_state_files(project_uuid: str) -> None:
+    """
+    刪除單一專案放在 /tmp 的哨兵狀態檔（節流器狀態 /tmp/<uuid>.sentry_throttle）。
+
+    ⚠ 必須在哨兵停止之後呼叫：哨兵收尾時會再寫一次節流器狀態。
+    """
+    state_file = _get_throttle_state_file_path(project_uuid)
+    try:
+        os.remove(state_file)
+        print(f"[INFO] 已清除節流器狀態檔: {state_file}")
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"[警告] 刪除節流器狀態檔失敗: {e}", file=sys.stderr)
+
+
 def is_self_project_path(path: str) -> bool:
     """
     判斷給定路徑是否位於 laplace_sentry_control_v2 專案內部。
@@ -103,6 +130,148 @@ running_sentries: Dict[str, Any] = {}
 # 【正規修復】用來保管日誌檔案物件，防止被垃圾回收關閉
 sentry_log_files: Dict[str, Any] = {}
 
+# --- 【SENTRY-SUPERVISOR】單一監督行程模式 ---
+# 理由：專案數量很多時，「每個專案一個哨兵行程」會佔用大量記憶體與檔案句柄。
+# 設定環境變數 LAPLACE_SENTRY_MODE=supervisor 後，所有哨兵改由同一個監督行程（sentry_supervisor.py）
+# 以執行緒託管。戶籍契約不變：檔名開頭仍是 PID、內容仍是 uuid，只是檔名多帶 uuid 以避免同一 PID 互相覆蓋：
+#   <監督行程 PID>.<uuid>.sentry   戶籍文件
+#   <監督行程 PID>.<uuid>.args     哨兵參數（JSON），由監督行程讀取
+SENTRY_MODE_ENV = 'LAPLACE_SENTRY_MODE'
+SUPERVISOR_PID_FILE = os.path.join(SENTRY_DIR, 'supervisor.pid')
+
+
+def use_sentry_supervisor() -> bool:
+    """是否啟用單一監督行程模式（預設關閉，維持每個專案一個哨兵行程）。"""
+    return os.environ.get(SENTRY_MODE_ENV, '').strip().lower() == 'supervisor'
+
+
+def get_supervised_pid_file_path(pid: int, sentry_uuid: str) -> str:
+    """監督行程託管的哨兵戶籍文件路徑。"""
+    return os.path.join(SENTRY_DIR, f"{pid}.{sentry_uuid}.sentry")
+
+
+def get_supervised_args_file_path(pid: int, sentry_uuid: str) -> str:
+    """監督行程託管的哨兵參數檔路徑。"""
+    return os.path.join(SENTRY_DIR, f"{pid}.{sentry_uuid}.args")
+
+
+def _is_supervised_pid_file(filename: str) -> bool:
+    """獨立哨兵的戶籍是 <pid>.sentry；監督行程託管的戶籍是 <pid>.<uuid>.sentry。"""
+    return filename.endswith('.sentry') and filename.count('.') >= 2
+
+
+def read_supervisor_pid() -> Optional[int]:
+    """讀取仍存活的監督行程 PID；檔案不存在、損壞或行程已死亡時回傳 None。"""
+    try:
+        with open(SUPERVISOR_PID_FILE, 'r', encoding='utf-8') as f:
+            pid = int(f.read().strip())
+        os.kill(pid, 0)
+        return pid
+    except (OSError, ValueError):
+        return None
+
+
+def write_supervisor_pid(pid: int) -> None:
+    """登記監督行程 PID（臨時檔 + 改名，讀取端不會讀到一半）。"""
+    temp_file = f"{SUPERVISOR_PID_FILE}.{pid}.tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        f.write(str(pid))
+    os.replace(temp_file, SUPERVISOR_PID_FILE)
+
+
+def release_supervisor_pid(pid: int) -> None:
+    """監督行程退出前註銷自己的登記；已被新監督行程取代時不動它。"""
+    try:
+        with open(SUPERVISOR_PID_FILE, 'r', encoding='utf-8') as f:
+            if f.read().strip() != str(pid):
+                return
+        os.remove(SUPERVISOR_PID_FILE)
+    except OSError:
+        pass
+
+
+def _remove_supervised_registration(pid_file_path: str) -> None:
+    """刪除託管哨兵的戶籍與參數檔；監督行程下一輪對帳時就會停止該專案。"""
+    args_file_path = pid_file_path[:-len('.sentry')] + '.args'
+    for path in (pid_file_path, args_file_path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class SupervisedSentryProxy:
+    """
+    running_sentries 中代表「監督行程託管的哨兵」的物件。
+    介面與 PidProxy 相同（.pid / poll() / kill()），但 kill() 只註銷這個專案，
+    不會把整個監督行程（以及其他專案）一起殺掉。
+    """
+
+    def __init__(self, pid: int, pid_file_path: str):
+        self.pid = pid
+        self.pid_file_path = pid_file_path
+
+    def poll(self):
+        try:
+            os.kill(self.pid, 0)
+        except ProcessLookupError:
+            return 1
+        return None if os.path.exists(self.pid_file_path) else 1
+
+    def kill(self):
+        _remove_supervised_registration(self.pid_file_path)
+
+
+def _ensure_sentry_supervisor() -> int:
+    """回傳存活中的監督行程 PID；沒有就在背景拉起一個。"""
+    pid = read_supervisor_pid()
+    if pid is not None:
+        return pid
+
+    supervisor_script_path = os.path.join(project_root, 'src', 'core', 'sentry_supervisor.py')
+    os.makedirs(LOGS_DIR, exist_ok=True)
+    log_file = open(os.path.join(LOGS_DIR, 'sentry_supervisor.log'), 'a', encoding='utf-8')
+
+    sentry_env = os.environ.copy()
+    sentry_env["PYTHONIOENCODING"] = "utf-8"
+    sentry_env["PYTHONUTF8"] = "1"
+    # 與獨立哨兵相同：start_new_session=True，短命的 daemon 退出時監督行程不會被連帶殺死。
+    process = subprocess.Popen([sys.executable, "-u", supervisor_script_path],
+                               stdout=log_file, stderr=log_file, text=True, env=sentry_env, start_new_session=True)
+    try:
+        write_supervisor_pid(process.pid)
+    except OSError as e:
+        process.kill()
+        raise RuntimeError(f"登記哨兵監督行程失敗: {e}")
+    # 【正規修復】同獨立哨兵，保管日誌檔案物件，防止被垃圾回收關閉。
+    sentry_log_files['__supervisor__'] = log_file
+    print(f"【守護進程】: 已啟動哨兵監督行程。進程 PID: {process.pid}")
+    return process.pid
+
+
+def _register_supervised_sentry(sentry_uuid: str, sentry_args: List[str], log_file_path: str) -> None:
+    """
+    向監督行程登記一個專案：先寫參數檔，再寫戶籍文件。
+    監督行程只認「戶籍 + 參數都在」的專案，所以它永遠不會讀到缺參數的登記。
+    """
+    supervisor_pid = _ensure_sentry_supervisor()
+    pid_file_path = get_supervised_pid_file_path(supervisor_pid, sentry_uuid)
+    args_file_path = get_supervised_args_file_path(supervisor_pid, sentry_uuid)
+    try:
+        temp_file = f"{args_file_path}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({"args": sentry_args, "log_file": log_file_path}, f, ensure_ascii=False)
+        os.replace(temp_file, args_file_path)
+        with open(pid_file_path, 'w', encoding='utf-8') as f:
+            f.write(sentry_uuid)
+    except OSError as e:
+        _remove_supervised_registration(pid_file_path)
+        raise RuntimeError(f"向哨兵監督行程 (PID: {supervisor_pid}) 登記失敗: {e}")
+
+    running_sentries[sentry_uuid] = SupervisedSentryProxy(supervisor_pid, pid_file_path)
+    print(f"【守護進程】: 哨兵已交由監督行程託管。進程 PID: {supervisor_pid}，日誌: {log_file_path}")
+
+
 # --- 用下面的代碼，完整替換舊的 _get_projects_file_path ---
 def get_projects_file_path(provided_path: Optional[str] = None) -> str:
     """
@@ -194,7 +363,11 @@ def _get_targets_from_project(project_data: Dict[str, Any]) -> List[str]:    # (
 
 # --- 統一更新入口 ---
 # 這個函式負責執行一次完整的「單文件更新」流程。
-def _run_single_update_workflow(project_path: str, target_doc: str, ignore_patterns: Optional[set] = None) -> Tuple[int, str]:
+def _run_single_update_workflow(project_path: str, target_doc: str, ignore_patterns: Optional[set] = None,
+                                scan_workers: int = 1, scan_pool_kind: str = "thread",
+                                tree_cache: Optional[engine.TreeCache] = None,
+                                changed_dirs: Optional[Iterable[str]] = None,
+                                use_gitignore: bool = False) -> Tuple[int, str]:
     # (此函式在之前的重構中已添加過註解，且邏輯未變，此處保持簡潔，暫不重複註解)
     if not isinstance(project_path, str) or not os.path.isdir(project_path):
         return (2, f"【更新失敗】: 專案路徑不存在或無效 -> {project_path}")
@@ -216,7 +389,11 @@ def _run_single_update_workflow(project_path: str, target_doc: str, ignore_patte
         return (3, err)
 
     # 在 _run_single_update_workflow 函式內部
-    exit_code, result = execute_update_workflow(project_path, target_doc, old_content, ignore_patterns=ignore_patterns)
+    exit_code, result = execute_update_workflow(
+        project_path, target_doc, old_content, ignore_patterns=ignore_patterns,
+        scan_workers=scan_workers, scan_pool=scan_pool_kind,
+        tree_cache=tree_cache, changed_dirs=changed_dirs, use_gitignore=use_gitignore,
+    )
 
     timestamp_done = time.strftime('%Y-%m-%d %H:%M:%S')
     status = "成功" if exit_code == 0 else "失敗"
@@ -233,6 +410,33 @@ def _get_status_file_path(sentry_uuid: str) -> str:
     """
     return f"/tmp/{sentry_uuid}.sentry_status"
 
+
+def _get_throttle_state_file_path(sentry_uuid: str) -> str:
+    """
+    回傳指定哨兵的節流器狀態檔路徑（與 .sentry_status 放在一起）。
+
+    哨兵停機時與定期寫入靜默名單、冷卻等級與各規則的滑動窗口，下次啟動時還原，
+    重啟後不必讓同一批熱檔案再觸發幾次更新才重新學會。
+    """
+    return f"/tmp/{sentry_uuid}.sentry_throttle"
+
+def _read_status_file(sentry_uuid: str) -> Dict[str, Any]:
+    """
+    讀取並正規化 .sentry_status 狀態檔（純讀取，無副作用）。
+
+    - 新格式：{"muted_paths": [...], "poll_interval": float, "updated_at": str}
+    - 舊格式：["/muted/a", ...]（舊版哨兵寫入），視為只有 muted_paths。
+    - 檔案不存在 → 回傳空字典；JSON 損壞或讀取失敗 → 拋出原始例外，由呼叫端決定如何處理。
+    """
+    status_file = _get_status_file_path(sentry_uuid)
+    if not os.path.exists(status_file):
+        return {}
+    with open(status_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return {"muted_paths": data}
+    return data if isinstance(data, dict) else {}
+
 def handle_get_muted_paths(args: List[str]) -> List[str]:
     """
     【審計接口】讀取指定哨兵的靜默路徑列表（純讀取，無副作用）。
@@ -246,16 +450,10 @@ def handle_get_muted_paths(args: List[str]) -> List[str]:
         raise ValueError("handle_get_muted_paths 需要 1 個參數 (uuid)。")
 
     sentry_uuid = args[0]
-    status_file = _get_status_file_path(sentry_uuid)
 
-    # 若檔案不存在 → 回傳空列表
-    if not os.path.exists(status_file):
-        return []
-
-    # 嘗試讀取 JSON
+    # 嘗試讀取狀態檔（不存在時為空字典）
     try:
-        with open(status_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = _read_status_file(sentry_uuid).get("muted_paths")
     except Exception:
         # 若讀取失敗 → 視為空列表（不拋例外，以保持穩定）
         return []
@@ -325,9 +523,9 @@ def handle_add_ignore_patterns(args: List[str]) -> List[str]:
     if not os.path.exists(status_file):
         return []
 
+    # 狀態檔可能是新格式（字典）或舊格式（列表），統一交給 _read_status_file 正規化。
     try:
-        with open(status_file, "r", encoding="utf-8") as f:
-            muted_paths = json.load(f)
+        muted_paths = _read_status_file(sentry_uuid).get("muted_paths", [])
     except Exception:
         muted_paths = []
 
@@ -386,7 +584,8 @@ def handle_add_ignore_patterns(args: List[str]) -> List[str]:
 
     return patterns_to_add
 
-SYSTEM_DEFAULT_IGNORE_NAMES = {".git", "__pycache__", ".venv", ".vscode"}
+# 與 engine 相同的系統預設忽略規則（同一個比對器，不再各自維護一份名單）。
+SYSTEM_DEFAULT_IGNORE_RULES = ignore_rules.compile_ignore(engine.SYSTEM_DEFAULT_IGNORE)
 
 def list_ignore_patterns_for_project(uuid: str, projects_file_path: Optional[str] = None) -> List[str]:
     PROJECTS_FILE = get_projects_file_path(projects_file_path)
@@ -424,7 +623,7 @@ def list_ignore_candidates_for_project(uuid: str, projects_file_path: Optional[s
             pass
 
     # 3) 移除系統內建忽略名，避免混淆
-    candidates = {n for n in candidates if n not in SYSTEM_DEFAULT_IGNORE_NAMES}
+    candidates = {n for n in candidates if not SYSTEM_DEFAULT_IGNORE_RULES.ignores("", n, True)}
 
     return sorted(candidates)
 
@@ -496,7 +695,11 @@ def handle_list_projects(projects_file_path: Optional[str] = None):
                                 except ProcessLookupError:
                                     pass # 如果已經死了，就什麼都不做
 
-                        running_sentries[sentry_uuid] = PidProxy(pid)
+                        # 監督行程託管的哨兵：kill() 只註銷該專案，不殺掉整個監督行程。
+                        if _is_supervised_pid_file(filename):
+                            running_sentries[sentry_uuid] = SupervisedSentryProxy(pid, pid_file_path)
+                        else:
+                            running_sentries[sentry_uuid] = PidProxy(pid)
                         # 【新增探針 1】確認普查成功
                         print(f"【普查成功 DEBUG】發現存活哨兵: UUID={sentry_uuid}, PID={pid}", file=sys.stderr)
 
@@ -505,7 +708,11 @@ def handle_list_projects(projects_file_path: Optional[str] = None):
                     # print(f"【殭屍普查】：發現無效或已死亡的戶籍文件 {filename}，正在自動清理...", file=sys.stderr)
                     print(f"【殭屍普查 DEBUG】：PID {pid} 被判定死亡 (Error: {e})，正在清理戶籍 {filename}...", file=sys.stderr)
                     try:
-                        os.remove(pid_file_path)
+                        # 監督行程託管的戶籍連同參數檔一起清理。
+                        if _is_supervised_pid_file(filename):
+                            _remove_supervised_registration(pid_file_path)
+                        else:
+                            os.remove(pid_file_path)
                     except OSError as e:
                         print(f"【殭屍普查警告】：清理殭屍戶籍 {filename} 時失敗: {e}", file=sys.stderr)
                 except Exception:
@@ -571,18 +778,16 @@ def handle_list_projects(projects_file_path: Optional[str] = None):
             continue
         
         # 構造 .sentry_status 文件的路徑（哨兵工人寫入到 /tmp/ 目錄）
-        status_file_path = f"/tmp/{uuid}.sentry_status"
+        status_file_path = _get_status_file_path(uuid)
         
-        # 嘗試讀取文件
+        # 嘗試讀取文件（同時相容舊版的純列表格式）
         try:
-            if os.path.exists(status_file_path):
-                with open(status_file_path, 'r', encoding='utf-8') as f:
-                    muted_paths = json.load(f)
-                
-                # 只有當靜默列表非空，且專案狀態不是 'invalid_path' 時，才覆蓋為 'muting'
-                if isinstance(muted_paths, list) and len(muted_paths) > 0:
-                    if project.get('status') != 'invalid_path':
-                        project['status'] = 'muting'
+            muted_paths = _read_status_file(uuid).get("muted_paths")
+
+            # 只有當靜默列表非空，且專案狀態不是 'invalid_path' 時，才覆蓋為 'muting'
+            if isinstance(muted_paths, list) and len(muted_paths) > 0:
+                if project.get('status') != 'invalid_path':
+                    project['status'] = 'muting'
         except (json.JSONDecodeError, IOError) as e:
             # 如果文件損壞或讀取失敗，我們選擇「靜默地忽略」，不影響其他狀態判定
             print(f"【靜默狀態檢查警告】：讀取 {status_file_path} 時失敗: {e}", file=sys.stderr)
@@ -660,13 +865,72 @@ def handle_add_project(args: List[str], projects_file_path: Optional[str] = None
 
 
 # 處理「edit_project」命令。
+# 哨兵節奏相關的選填欄位（秒）與允許的上限；順序即傳給哨兵的參數順序（第七到九個參數）。
+SENTRY_TIMING_FIELDS = {
+    'poll_interval_max': 300.0,
+    'debounce_quiet_seconds': 60.0,
+    'debounce_max_latency_seconds': 600.0,
+}
+
+# 結構模式（structure_only，預設開啟）：目錄樹只取決於名稱與目錄結構，
+# 哨兵只在新增 / 刪除 / 改名時觸發更新，且不 stat 任何檔案；設為 false 才會連內容修改一起追蹤。
+STRUCTURE_ONLY_DEFAULT = True
+_FLAG_VALUES = {'true': True, '1': True, 'on': True, 'yes': True,
+                'false': False, '0': False, 'off': False, 'no': False}
+
+
+def structure_only_from_project(project_config: Dict[str, Any]) -> bool:
+    """讀取專案的結構模式設定；缺省或非布林值一律視為預設（開啟）。"""
+    value = project_config.get('structure_only', STRUCTURE_ONLY_DEFAULT)
+    return value if isinstance(value, bool) else STRUCTURE_ONLY_DEFAULT
+
+# 套用 .gitignore（use_gitignore，預設關閉）：目錄樹與哨兵都另外讀取專案內各層的 .gitignore（含否定規則），
+# 與 ignore_patterns 聯集；被忽略的資料夾不會被走訪。
+USE_GITIGNORE_DEFAULT = False
+
+
+def use_gitignore_from_project(project_config: Dict[str, Any]) -> bool:
+    """讀取專案是否套用 .gitignore；缺省或非布林值一律視為預設（關閉）。"""
+    value = project_config.get('use_gitignore', USE_GITIGNORE_DEFAULT)
+    return value if isinstance(value, bool) else USE_GITIGNORE_DEFAULT
+
+# 節流器（SmartThrottler）的選填欄位：欄位 -> (預設值, 下限, 上限, 是否為整數)。
+# 哨兵每個節拍都會檢查 projects.json，這些欄位改了立即生效，不需要重啟，因此不經過命令列參數。
+SENTRY_THROTTLE_FIELDS = {
+    'throttle_hot_threshold': (5, 1, 1000, True),                  # R1：窗口內修改幾次算過熱
+    'throttle_hot_period_seconds': (5.0, 0.5, 3600.0, False),      # R1：窗口長度
+    'throttle_burst_threshold': (20, 1, 100000, True),             # R3：窗口內創建超過幾個算爆量
+    'throttle_burst_period_seconds': (10.0, 0.5, 3600.0, False),   # R3：窗口長度
+    'throttle_size_growth_mb': (100, 1, 1048576, True),            # R4：窗口內成長超過幾 MB 算異常
+    'throttle_size_period_seconds': (60.0, 1.0, 86400.0, False),   # R4：窗口長度
+    'throttle_dir_growth_mb': (200, 1, 1048576, True),             # R5：目錄窗口內新增超過幾 MB 算膨脹
+    'throttle_dir_growth_files': (500, 1, 10000000, True),         # R5：目錄窗口內新增超過幾個檔案算膨脹
+    'throttle_dir_period_seconds': (300.0, 1.0, 86400.0, False),   # R5：窗口長度
+    'mute_ttl_seconds': (60.0, 1.0, 86400.0, False),               # 第一次靜默的時長
+    'mute_ttl_max_seconds': (3600.0, 1.0, 604800.0, False),        # 反覆靜默時指數加長的上限
+    'storm_event_threshold': (500, 10, 10000000, True),            # 單一節拍達到幾個變動算風暴
+    'storm_calm_seconds': (3.0, 0.5, 300.0, False),                # 風暴後安靜多久才更新
+}
+
+
+def throttle_settings_from_project(project_config: Dict[str, Any]) -> Dict[str, float]:
+    """讀取專案的節流器設定；缺省、非數字或超出範圍的值一律退回預設。"""
+    settings: Dict[str, float] = {}
+    for field, (default, lower, upper, integer) in SENTRY_THROTTLE_FIELDS.items():
+        value = project_config.get(field, default)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not lower <= value <= upper:
+            value = default
+        settings[field] = int(value) if integer else float(value)
+    return settings
+
 def handle_edit_project(args: List[str], projects_file_path: Optional[str] = None):
     PROJECTS_FILE = get_projects_file_path(projects_file_path)
     if len(args) != 3:
         raise ValueError("【編輯失敗】：參數數量不正確。")
     
     uuid_to_edit, field, new_value = args
-    allowed_fields = ['name', 'path', 'output_file']
+    allowed_fields = (['name', 'path', 'output_file', 'scan_workers', 'scan_pool', 'structure_only', 'use_gitignore']
+                      + list(SENTRY_TIMING_FIELDS) + list(SENTRY_THROTTLE_FIELDS))
     if field not in allowed_fields:
         raise ValueError(f"無效的欄位名稱 '{field}'。")
 
@@ -716,6 +980,37 @@ def handle_edit_project(args: List[str], projects_file_path: Optional[str] = Non
                     raise ValueError(f"目標文件 '{clean_new_output_file}' 已被專案 '{p.get('name')}' 使用。")
             project_to_edit['output_file'] = [clean_new_output_file]
             project_to_edit['target_files'] = [clean_new_output_file]
+        elif field == 'scan_workers':
+            if not new_value.isdigit() or not 1 <= int(new_value) <= scan_pool.MAX_SCAN_WORKERS:
+                raise ValueError(f"scan_workers 必須是 1 到 {scan_pool.MAX_SCAN_WORKERS} 之間的整數。")
+            project_to_edit['scan_workers'] = int(new_value)
+        elif field == 'scan_pool':
+            if new_value not in scan_pool.SCAN_POOL_KINDS:
+                raise ValueError(f"scan_pool 只能是 {' / '.join(scan_pool.SCAN_POOL_KINDS)}。")
+            project_to_edit['scan_pool'] = new_value
+        elif field in ('structure_only', 'use_gitignore'):
+            flag = _FLAG_VALUES.get(new_value.strip().lower())
+            if flag is None:
+                raise ValueError(f"{field} 只能是 true / false。")
+            project_to_edit[field] = flag
+        elif field in SENTRY_TIMING_FIELDS:
+            upper = SENTRY_TIMING_FIELDS[field]
+            try:
+                seconds = float(new_value)
+            except ValueError:
+                raise ValueError(f"{field} 必須是以秒為單位的數字。")
+            if not 0 < seconds <= upper:
+                raise ValueError(f"{field} 必須介於 0 到 {upper:g} 秒之間。")
+            project_to_edit[field] = seconds
+        elif field in SENTRY_THROTTLE_FIELDS:
+            _, lower, upper, integer = SENTRY_THROTTLE_FIELDS[field]
+            try:
+                number = int(new_value) if integer else float(new_value)
+            except ValueError:
+                raise ValueError(f"{field} 必須是{'整數' if integer else '數字'}。")
+            if not lower <= number <= upper:
+                raise ValueError(f"{field} 必須介於 {lower:g} 到 {upper:g} 之間。")
+            project_to_edit[field] = number
             
         return projects_data
 
@@ -870,20 +1165,26 @@ def handle_delete_project(args: List[str], projects_file_path: Optional[str] = N
 
     # --- 第二步：嘗試停止該專案的哨兵 ---
     try:
-        # 這裡直接重用已有的 handle_stop_sentry 邏輯
-        handle_stop_sentry([uuid_to_delete])
+        # 這裡直接重用已有的 handle_stop_sentry 邏輯，並等待獨立哨兵真正結束：
+        # 哨兵收尾時會寫入 checkpoint 與節流器狀態，必須在清理暫存之前完成，否則會把刪掉的目錄重新建立。
+        # （監督行程託管的哨兵由監督行程非同步停止；哨兵收尾時發現專案已從 projects.json 移除，就不再寫入。）
+        handle_stop_sentry([uuid_to_delete], wait_seconds=SENTRY_STOP_WAIT_SECONDS)
     except Exception as e:
         # 沒有哨兵在跑、或戶籍壞掉，都只列印警告，不阻止刪除專案
         print(f"【刪除專案警告】：停止專案哨兵時出現問題：{e}", file=sys.stderr)
 
-    # --- 第三步：清空專案專屬 temp/projects/<uuid>/ ---
+    # --- 第三步：清空專案專屬 temp/projects/<uuid>/ 與 /tmp 下的節流器狀態檔 ---
     _cleanup_project_temp_dir(uuid_to_delete)
+    _cleanup_project_state_files(uuid_to_delete)
 
     # --- 第四步：清理 logs/<safe_project_name>.log ---
     _cleanup_project_logs(deleted_project_config)
 
 
-def handle_manual_update(args: List[str], projects_file_path: Optional[str] = None):
+def handle_manual_update(args: List[str], projects_file_path: Optional[str] = None,
+                         tree_cache: Optional[engine.TreeCache] = None,
+                         changed_dirs: Optional[Iterable[str]] = None):
+    # tree_cache / changed_dirs 由常駐的哨兵提供：只重繪上次更新後有變動的子樹；CLI 呼叫時一律完整重繪。
     PROJECTS_FILE = get_projects_file_path(projects_file_path)
 
     if len(args) != 1:
@@ -904,6 +1205,10 @@ def handle_manual_update(args: List[str], projects_file_path: Optional[str] = No
     ignore_list = selected_project.get("ignore_patterns")
     # 我們檢查它是否是一個列表，如果是，就用 set() 將它轉換為一個集合。
     ignore_patterns = set(ignore_list) if isinstance(ignore_list, list) else None
+    # 我們讀取這個專案的掃描並行度（scan_workers / scan_pool，未設定時為單執行緒）。
+    scan_workers, scan_pool_kind = scan_pool.scan_settings_from_project(selected_project)
+    # 我們讀取是否要另外套用專案內的 .gitignore（預設不套用）。
+    use_gitignore = use_gitignore_from_project(selected_project)
 
     if not project_path or not targets:
         raise ValueError(f"專案 '{selected_project.get('name')}' 缺少有效的路徑配置。")
@@ -917,8 +1222,16 @@ def handle_manual_update(args: List[str], projects_file_path: Optional[str] = No
         exit_code, formatted_tree_block = _run_single_update_workflow(
             project_path,
             target_doc_path,
-            ignore_patterns=ignore_patterns
+            ignore_patterns=ignore_patterns,
+            scan_workers=scan_workers,
+            scan_pool_kind=scan_pool_kind,
+            tree_cache=tree_cache,
+            changed_dirs=changed_dirs,
+            use_gitignore=use_gitignore,
         )
+        # 第一個目標檔已把變動套用到快取，其餘目標檔直接沿用同一棵樹。
+        if changed_dirs is not None:
+            changed_dirs = ()
         
         if exit_code != 0:
             raise RuntimeError(
@@ -1003,11 +1316,10 @@ def handle_start_sentry(args: List[str], projects_file_path: Optional[str] = Non
     project_name = project_config.get("name", "Unnamed_Project")
     # 我們將專案名中的空格和特殊字符替換掉，以創建一個安全的文件名。
     log_filename = "".join(c if c.isalnum() else "_" for c in project_name) + ".log"
-    log_dir = os.path.join(project_root, 'logs')
-    log_file_path = os.path.join(log_dir, log_filename)
+    log_file_path = os.path.join(LOGS_DIR, log_filename)
 
     # 我們確保 logs 目錄存在。
-    os.makedirs(log_dir, exist_ok=True)
+    os.makedirs(LOGS_DIR, exist_ok=True)
 
 # 我們定義要執行的命令。
     sentry_script_path = os.path.join(project_root, 'src', 'core', 'sentry_worker.py')
@@ -1038,66 +1350,135 @@ def handle_start_sentry(args: List[str], projects_file_path: Optional[str] = Non
     # 我們將這個字符串作為第三個參數添加到命令中。
     command.append(output_files_str)
 
+    # 【WARM-START】設定指紋作為第四個參數。
+    # 理由：哨兵只會載入「設定相符」的快照 checkpoint；路徑、目標檔或忽略規則一變，
+    # 輸出內容就不再對應舊快照，必須冷啟動並重新產生。
+    ignore_list = project_config.get('ignore_patterns')
+    structure_only = structure_only_from_project(project_config)
+    use_gitignore = use_gitignore_from_project(project_config)
+    fingerprint = snapshot_store.compute_fingerprint(
+        project_path,
+        _get_targets_from_project(project_config),
+        ignore_list if isinstance(ignore_list, list) else None,
+        structure_only=structure_only,
+        use_gitignore=use_gitignore,
+    )
+    command.append(fingerprint)
+    # 【SCAN-WORKERS】掃描並行度作為第五、六個參數（worker 數, 池類型）。
+    # 理由：專案極大或位於慢速掛載點時，頂層子樹可並行掃描；不影響輸出內容，因此不計入指紋。
+    scan_workers, scan_pool_kind = scan_pool.scan_settings_from_project(project_config)
+    command.extend([str(scan_workers), scan_pool_kind])
+    # 【ADAPTIVE-POLL / DEBOUNCE】輪詢間隔上限、去抖動靜默期與最大延遲（秒）作為第七到九個參數；
+    # 未設定時傳空字串，由哨兵使用預設值。
+    for timing_field in SENTRY_TIMING_FIELDS:
+        timing_value = project_config.get(timing_field)
+        command.append(str(timing_value) if isinstance(timing_value, (int, float)) else '')
+    # 【STRUCTURE-ONLY】結構模式作為第十個參數（1 / 0）。
+    command.append('1' if structure_only else '0')
+    # 【SENTRY-IGNORE】忽略規則作為第十一個參數（JSON 列表）。
+    # 理由：哨兵掃描時要剪掉與目錄樹相同的目錄，否則被忽略的 node_modules / build 仍會被遍歷並觸發更新。
+    # 之後規則變更時，哨兵會自行從 projects.json 重新讀取，不需要重啟。
+    sentry_ignore = sorted({x for x in ignore_list if isinstance(x, str) and x}) if isinstance(ignore_list, list) else []
+    command.append(json.dumps(sentry_ignore, ensure_ascii=False))
+    # 【GITIGNORE】是否套用專案內的 .gitignore 作為第十二個參數（1 / 0）。
+    command.append('1' if use_gitignore else '0')
+    # 我們在啟動前就判斷，避免與哨兵稍後寫入的新 checkpoint 互相干擾。
+    warm_start = snapshot_store.has_checkpoint(uuid_to_start, fingerprint)
+
     try:    
-        # 我們以「追加模式(a)」打開日誌文件。
-        log_file = open(log_file_path, 'a', encoding='utf-8')
-
-        print(f"【守護進程】: 正在為專案 '{project_name}' 啟動哨兵...")
-        print(f"【守護進程】: 命令: {' '.join(command)}")
-        print(f"【守護進程】: 日誌將被寫入: {log_file_path}")
-
-        # 【修正】強制設定環境變數，讓 Windows 下的 Python 子進程乖乖吐出 UTF-8
-        sentry_env = os.environ.copy()
-        sentry_env["PYTHONIOENCODING"] = "utf-8"
-        sentry_env["PYTHONUTF8"] = "1"
-
-# 【核心動作】我們使用 Popen 在背景啟動子進程。
-        # 【關鍵修復】start_new_session=True 讓子進程脫離父進程的會話組 (setsid)
-        # 這樣當短暫的 daemon.py 執行完畢退出時，哨兵才不會被 WSL 連帶殺死。
-        process = subprocess.Popen(command, stdout=log_file, stderr=log_file, text=True, env=sentry_env, start_new_session=True)
-        # 【TECH-DEBT-STATELESS-SENTRY 核心改造】
-        # 理由：實現持久化的「出生登記」。
-        # 我們在 Popen 成功後，立刻獲取新進程的 PID。
-        pid = process.pid
-        # 我們構造出這個哨兵的「戶籍文件」路徑。
-        # 注意：我們需要一個統一的地方來管理 temp 目錄的路徑。
-        # 我們先在文件頂部定義一個全局的 TEMP_DIR。
-        pid_file_path = os.path.join(SENTRY_DIR, f"{pid}.sentry")
+        # 【SENTRY-SUPERVISOR】監督行程模式：不另起哨兵行程，改為向監督行程登記戶籍與參數。
+        if use_sentry_supervisor():
+            _register_supervised_sentry(uuid_to_start, command[3:], log_file_path)
+        else:
+            # 我們以「追加模式(a)」打開日誌文件。
+            log_file = open(log_file_path, 'a', encoding='utf-8')
+
+            print(f"【守護進程】: 正在為專案 '{project_name}' 啟動哨兵...")
+            print(f"【守護進程】: 命令: {' '.join(command)}")
+            print(f"【守護進程】: 日誌將被寫入: {log_file_path}")
+
+            # 【修正】強制設定環境變數，讓 Windows 下的 Python 子進程乖乖吐出 UTF-8
+            sentry_env = os.environ.copy()
+            sentry_env["PYTHONIOENCODING"] = "utf-8"
+            sentry_env["PYTHONUTF8"] = "1"
+
+    # 【核心動作】我們使用 Popen 在背景啟動子進程。
+            # 【關鍵修復】start_new_session=True 讓子進程脫離父進程的會話組 (setsid)
+            # 這樣當短暫的 daemon.py 執行完畢退出時，哨兵才不會被 WSL 連帶殺死。
+            process = subprocess.Popen(command, stdout=log_file, stderr=log_file, text=True, env=sentry_env, start_new_session=True)
+            # 【TECH-DEBT-STATELESS-SENTRY 核心改造】
+            # 理由：實現持久化的「出生登記」。
+            # 我們在 Popen 成功後，立刻獲取新進程的 PID。
+            pid = process.pid
+            # 我們構造出這個哨兵的「戶籍文件」路徑。
+            # 注意：我們需要一個統一的地方來管理 temp 目錄的路徑。
+            # 我們先在文件頂部定義一個全局的 TEMP_DIR。
+            pid_file_path = os.path.join(SENTRY_DIR, f"{pid}.sentry")
         
-        # 我們將專案的 UUID，寫入這個戶籍文件中。
-        try:
-            with open(pid_file_path, 'w', encoding='utf-8') as f:
-                f.write(uuid_to_start)
-        except IOError as e:
-            # 如果戶籍登記失敗，這是一個致命錯誤。我們必須立刻終止剛剛啟動的進程，防止產生沒有戶口的「黑戶」。
-            print(f"【守護進程致命錯誤】：為 PID {pid} 創建戶籍文件失敗: {e}", file=sys.stderr)
-            process.kill() # 立即終止
-            # 向上拋出一個更嚴重的異常，讓調用者知道啟動失敗了。
-            raise RuntimeError(f"創建哨兵戶籍文件 {pid_file_path} 失敗。")
-
-
-        # 【登記戶口】我們將這個新的進程對象，記錄到我們的「戶口名簿」中。
-        # 【關鍵修復】將 log_file 綁定到 process 物件上，防止函式結束後 log_file 被垃圾回收而關閉，
-        # 導致子進程失去 stdout/stderr 而崩潰。
-    # 【正規修復】將 log_file 存入全局字典，確保它不會被垃圾回收
-        sentry_log_files[uuid_to_start] = log_file
+            # 我們將專案的 UUID，寫入這個戶籍文件中。
+            try:
+                with open(pid_file_path, 'w', encoding='utf-8') as f:
+                    f.write(uuid_to_start)
+            except IOError as e:
+                # 如果戶籍登記失敗，這是一個致命錯誤。我們必須立刻終止剛剛啟動的進程，防止產生沒有戶口的「黑戶」。
+                print(f"【守護進程致命錯誤】：為 PID {pid} 創建戶籍文件失敗: {e}", file=sys.stderr)
+                process.kill() # 立即終止
+                # 向上拋出一個更嚴重的異常，讓調用者知道啟動失敗了。
+                raise RuntimeError(f"創建哨兵戶籍文件 {pid_file_path} 失敗。")
+
+
+            # 【登記戶口】我們將這個新的進程對象，記錄到我們的「戶口名簿」中。
+            # 【關鍵修復】將 log_file 綁定到 process 物件上，防止函式結束後 log_file 被垃圾回收而關閉，
+            # 導致子進程失去 stdout/stderr 而崩潰。
+        # 【正規修復】將 log_file 存入全局字典，確保它不會被垃圾回收
+            sentry_log_files[uuid_to_start] = log_file
         
-        # 【登記戶口】我們將這個新的進程對象，記錄到我們的「戶口名簿」中。
-        running_sentries[uuid_to_start] = process
+            # 【登記戶口】我們將這個新的進程對象，記錄到我們的「戶口名簿」中。
+            running_sentries[uuid_to_start] = process
 
-        print(f"【守護進程】: 哨兵已成功啟動。進程 PID: {process.pid}")
+            print(f"【守護進程】: 哨兵已成功啟動。進程 PID: {process.pid}")
 
         # --- 【v-HOT-RELOAD】啟動即更新 ---
         # 理由：確保哨兵上工時，文件狀態是最新的，且利用此操作的寫入事件來驗證黑名單是否生效。
-        print(f"【守護進程】: 正在執行啟動後的初始更新...", file=sys.stderr)
-        handle_manual_update([uuid_to_start], projects_file_path=projects_file_path)
+        # 【WARM-START】有相符的 checkpoint 時，改由哨兵比對停機期間的結構變動，
+        # 只有結構真的變了才會觸發更新。
+        if warm_start:
+            print(f"【守護進程】: 發現相符的快照 checkpoint，交由哨兵判斷是否需要更新。", file=sys.stderr)
+        else:
+            print(f"【守護進程】: 正在執行啟動後的初始更新...", file=sys.stderr)
+            handle_manual_update([uuid_to_start], projects_file_path=projects_file_path)
 
     except Exception as e:
         # 任何在啟動過程中發生的錯誤，都會被這個安全網捕獲。
         raise RuntimeError(f"啟動哨兵子進程時發生致命錯誤: {e}")
 
+# 刪除專案時，等待獨立哨兵結束收尾（更新器最多等 5 秒）的上限（秒）。
+SENTRY_STOP_WAIT_SECONDS = 10.0
+
+
+def _wait_for_pid_exit(pid: int, timeout: float) -> bool:
+    """等待行程結束（是本行程的子行程時順便回收），回傳是否在 timeout 秒內結束。"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if os.waitpid(pid, os.WNOHANG)[0]:
+                return True
+        except ChildProcessError:
+            # 不是本行程的子行程：只能探測是否還存在。
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                return True
+            except PermissionError:
+                pass
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+
+
 # 理由：為「停止哨兵」函式填充真實的、帶有日誌和錯誤處理的 terminate 邏輯。
-def handle_stop_sentry(args: List[str], projects_file_path: Optional[str] = None):
+def handle_stop_sentry(args: List[str], projects_file_path: Optional[str] = None, wait_seconds: float = 0.0):
+    # wait_seconds > 0 時，送出 SIGTERM 後等待獨立哨兵結束（刪除專案時用，確保收尾寫入已完成）。
     # 【TECH-DEBT-STATELESS-SENTRY 核心改造】
     # 理由：徹底重寫，使其從「基於內存」變為「基於文件系統」。
     if len(args) != 1:
@@ -1144,6 +1525,14 @@ def handle_stop_sentry(args: List[str], projects_file_path: Optional[str] = None
         else:
             raise ValueError(f"未找到正在運行的、屬於專案 {uuid_to_stop} 的哨兵。")
 
+    # 【SENTRY-SUPERVISOR】監督行程託管的哨兵：只註銷戶籍，監督行程下一輪對帳時停止該專案；
+    # 絕不能對監督行程發送 SIGTERM，否則同一行程中的其他專案也會一起停止。
+    if _is_supervised_pid_file(os.path.basename(pid_file_to_remove)):
+        _remove_supervised_registration(pid_file_to_remove)
+        running_sentries.pop(uuid_to_stop, None)
+        print(f"【守護進程】: 已通知監督行程 (PID: {pid_to_kill}) 停止此專案的哨兵。")
+        return
+
     # 步驟 3: 執行「死亡註銷」流程。
     print(f"【守護進程】: 正在嘗試停止哨兵 (PID: {pid_to_kill})...")
     try:
@@ -1152,6 +1541,8 @@ def handle_stop_sentry(args: List[str], projects_file_path: Optional[str] = None
         import signal
         os.kill(pid_to_kill, signal.SIGTERM) # 發送一個優雅的終止信號
         print(f"【守護進程】: 哨兵 (PID: {pid_to_kill}) 已成功發送終止信號。")
+        if wait_seconds > 0 and not _wait_for_pid_exit(pid_to_kill, wait_seconds):
+            print(f"【守護進程警告】：哨兵 (PID: {pid_to_kill}) 在 {wait_seconds:g} 秒內未結束。", file=sys.stderr)
     except ProcessLookupError:
         # 如果進程已經不存在了（可能已經自己崩潰了），這不是一個錯誤。
         print(f"【守護進程】: 哨兵 (PID: {pid_to_kill}) 在嘗試停止前就已不存在。")
@@ -1212,7 +1603,7 @@ def handle_get_log(args: List[str], projects_file_path: Optional[str] = None) ->
     # 2. 重建 Log 路徑邏輯 (必須與 handle_start_sentry 保持一致)
     safe_name = "".join(c if c.isalnum() else "_" for c in project_name)
     log_filename = f"{safe_name}.log"
-    log_path = os.path.join(project_root, 'logs', log_filename)
+    log_path = os.path.join(LOGS_DIR, log_filename)
 
     # 3. 讀取檔案
     if not os.path.exists(log_path):
@@ -1227,6 +1618,24 @@ def handle_get_log(args: List[str], projects_file_path: Optional[str] = None) ->
     except Exception as e:
         return [f"讀取日誌時發生錯誤：{e}"]
 
+def handle_read_journal(args: List[str]) -> Dict[str, Any]:
+    """
+    【API】以游標增量讀取哨兵偵測到的變動（純讀取，成本只與新事件數成正比）。
+    - 參數: [uuid, cursor(選填, 空字串或省略 = 從頭), limit(選填, 預設 1000)]
+    - 回傳: {"cursor": 下次讀取用的游標, "events": [...], "reset": 游標是否已失效}
+    """
+    if not 1 <= len(args) <= 3:
+        raise ValueError("【讀取失敗】：需要 1 到 3 個參數 (uuid, cursor, limit)。")
+
+    uuid_target = args[0]
+    cursor = args[1] if len(args) > 1 else ""
+    try:
+        limit = int(args[2]) if len(args) > 2 else journal.DEFAULT_READ_LIMIT
+    except ValueError:
+        limit = journal.DEFAULT_READ_LIMIT
+    # 防禦性保護：limit 至少 1，避免游標永遠無法前進。
+    return journal.read_since(uuid_target, cursor, max(limit, 1))
+
 # --- 總調度中心 ---
 # 這個函式像一個電話總機，負責將來自命令行的指令，轉接到對應的處理函式。
 def main_dispatcher(argv: List[str], **kwargs):
@@ -1322,35 +1731,8 @@ def main_dispatcher(argv: List[str], **kwargs):
             update_ignore_patterns_for_project(uuid, new_patterns, projects_file_path=projects_file_path)
             print("OK")
 
-            # --- 【v-HOT-RELOAD 修復】解決 Stateless 架構下的失憶問題 ---
-            # 我們不能依賴 running_sentries (因為每次呼叫 daemon 都是新的進程，記憶體是空的)
-            # 我們必須去檢查硬碟上的「戶籍資料 (SENTRY_DIR)」來判斷哨兵是否活著。
-            
-            is_sentry_active = False
-            try:
-                if os.path.exists(SENTRY_DIR):
-                    for fname in os.listdir(SENTRY_DIR):
-                        if fname.endswith('.sentry'):
-                            # 讀取戶籍檔內容，看看是不是這個 UUID
-                            try:
-                                with open(os.path.join(SENTRY_DIR, fname), 'r', encoding='utf-8') as f:
-                                    if f.read().strip() == uuid:
-                                        is_sentry_active = True
-                                        break
-                            except:
-                                continue
-            except Exception as e:
-                print(f"【系統警告】檢查哨兵狀態時發生錯誤: {e}", file=sys.stderr)
-
-            # 如果發現它活著，就強制重啟
-            if is_sentry_active:
-                print(f"【系統自動調整】：偵測到忽略規則變更，且哨兵正在運行，正在執行熱重啟...", file=sys.stderr)
-                time.sleep(0.5)
-                try:
-                    handle_stop_sentry([uuid], projects_file_path=projects_file_path)
-                    handle_start_sentry([uuid], projects_file_path=projects_file_path)
-                except Exception as e:
-                    print(f"【熱重啟失敗】：{e}", file=sys.stderr)
+            # 【SENTRY-IGNORE】不再熱重啟哨兵：運行中的哨兵會偵測到 projects.json 變動，
+            # 就地套用新規則、重算設定指紋，並在目錄樹受影響時觸發更新。
 
         elif command == 'get_log':
             # 參數檢查：需要 UUID，選填行數
@@ -1362,6 +1744,14 @@ def main_dispatcher(argv: List[str], **kwargs):
             # 將結果轉為 JSON 格式輸出 (方便 Adapter 解析)
             print(json.dumps(result, ensure_ascii=False, indent=2))
 
+        elif command == 'read_journal':
+            # 參數檢查：需要 UUID，選填游標與筆數
+            if not args:
+                print("錯誤：缺少 UUID 參數。", file=sys.stderr)
+                return 1
+            result = handle_read_journal(args)
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+
         else:
             print(f"錯誤：未知命令 '{command}'。", file=sys.stderr)
             return 1
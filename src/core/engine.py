@@ -1,8 +1,10 @@
 # ==============================================================================
 # 模組職責：engine.py
 # - 負責生成「目錄樹」的純文字結構，並與註釋資訊進行合併。
-# - 提供給 daemon / worker 調用的核心 API：generate_annotated_tree()。
+# - 提供給 daemon / worker 調用的核心 API：generate_annotated_tree()；
+#   iter_annotated_tree() / write_annotated_tree() 逐行產生、分批寫出同樣的內容。
 # - 不直接做任何檔案 I/O，相同輸入必須產生相同輸出（pure function）。
+# - 增量重繪的狀態只存在呼叫端傳入的 TreeCache 中，模組本身不持有任何跨呼叫狀態。
 #
 # 已知歷史與風險：
 # - 早期版本曾因相對路徑計算錯誤，導致註釋靜默丟失（參考相關日誌）。
@@ -13,7 +15,17 @@
 import os       # 用於與「作業系統（os）」互動，例如遍歷目錄、檢查檔案型態。
 import sys      # 用於讀取命令列參數，並在 CLI 模式下輸出錯誤訊息或設定退出碼。
 import re       # 用於執行必要的「正規表達式（re）」匹配或文字處理。
-from typing import List, Dict, Tuple, Optional, Set  # 提供清晰的型別標註（type hints）。
+import time     # 增量重繪快取用來判斷是否該定期完整重繪。
+import threading  # 增量重繪快取的鎖。
+from typing import List, Dict, Tuple, Optional, Set, Iterable, Iterator, IO  # 提供清晰的型別標註（type hints）。
+from concurrent.futures import Executor, Future  # 頂層子樹並行產生時使用的執行器型別。
+
+# HACK: 直接執行 engine.py（CLI 模式）時補上專案根目錄，讓 src.core 可被導入。
+if __name__ == '__main__' and __package__ is None:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.core.scan_pool import open_pool  # 頂層子樹並行產生的執行器（worker 數為 1 時不開池）。
+from src.core.ignore_rules import IgnoreMatcher, build_matcher  # 編譯好的忽略規則（名稱、萬用字元、路徑、.gitignore）。
 
 # 每一行樹狀輸出，對應一個「視覺行內容」與一個「相對路徑 key」：
 # - line: 真正印在目錄樹上的那一行文字（例如 '├── src/core/engine.py'）。
@@ -21,6 +33,9 @@ from typing import List, Dict, Tuple, Optional, Set  # 提供清晰的型別標
 #         用來在結構變動時，穩定地綁定和追蹤註釋。
 TreeNode = Tuple[str, Optional[str]]
 
+# 一個資料夾排序後的直接子項目：(資料夾名稱列表, 檔案名稱列表)，已套用忽略規則。
+Listing = Tuple[List[str], List[str]]
+
 # 系統級預設忽略名單：
 # - 這些目錄／檔案名稱會在生成目錄樹時被自動排除。
 # - 即使使用者沒有在前端 UI 裡勾選，它們也不應出現在最終輸出中。
@@ -190,6 +205,189 @@ def _parse_comments_by_path(content_string: str, root_name: str) -> Tuple[Dict[s
 #  【v4.0 核心演算法】 - 結構生成器 (視覺穩定性優先)
 # ==============================================================================
 
+def _list_directory(directory: str, ignore: IgnoreMatcher, rel_path: str = "") -> Optional[Listing]:
+    """列出一個資料夾並排序；資料夾不存在時回傳 None。rel_path 為它的相對路徑 key（路徑規則用）。"""
+    # VSCode 風格排序：
+    # 1. 資料夾永遠在前
+    # 2. 資料夾按字母排序
+    # 3. 檔案永遠在後
+    # 4. 檔案按字母排序
+    dirs: List[str] = []
+    files: List[str] = []
+
+    # 用 os.scandir 一次取得名稱與類型：DirEntry.is_dir() 優先使用 readdir 帶回的 d_type，
+    # 不必再對每個項目各呼叫一次 os.path.isdir（DrvFs 上每次都是一趟跨系統的 metadata 查詢）。
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                # 先套用與類型無關的忽略規則（被忽略的項目連類型都不必判斷）
+                if ignore.matches(rel_path, entry.name):
+                    continue
+                # 與 os.path.isdir 相同：跟隨符號連結，查詢失敗一律視為檔案。
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                # 需要類型的規則（例如 'src/generated/'、.gitignore）：被忽略的資料夾不會被下探。
+                if ignore.matches_entry(rel_path, entry.name, is_dir):
+                    continue
+                if is_dir:
+                    dirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+    except FileNotFoundError:
+        return None
+
+    dirs.sort()
+    files.sort()
+    return dirs, files
+
+
+def _iter_directory(
+    directory: str,
+    prefix: str,
+    depth: int,
+    rel_path: str,
+    ignore: IgnoreMatcher,
+    max_depth: Optional[int],
+    folder_spacing: int,
+    pool: Optional[Executor] = None,
+    listings: Optional[Dict[str, Listing]] = None,
+    reuse: Optional[Dict[str, Listing]] = None,
+) -> Iterator[TreeNode]:
+    """
+    逐行產生 directory 底下的節點（不含 directory 自己那一行）。
+
+    以顯式堆疊取代遞迴：每層資料夾一個框架，深層目錄不會觸發 RecursionError；
+    呼叫端邊取邊用時，記憶體中只有目前路徑上各層的排序結果。
+
+    directory : 真實檔案系統路徑
+    prefix    : 樹狀圖的視覺前綴（由 '│   ' / '    ' 組成）
+    depth     : 當前深度（根為 0）
+    rel_path  : 目前相對於 root 的路徑字串（例如 'src/core/'）
+    pool      : 若提供，這一層的子資料夾會各自交給執行器產生，再依原順序接回
+    listings  : 若提供，記錄每個列出的資料夾的排序結果（增量重繪快取與第二趟排版使用）
+    reuse     : 若提供，其中有記錄的資料夾直接沿用，不再讀取檔案系統
+    """
+
+    def open_frame(frame_dir: str, frame_prefix: str, frame_depth: int, frame_rel: str):
+        # 深度限制檢查
+        if max_depth is not None and frame_depth > max_depth:
+            return None
+        listing = reuse.get(frame_rel) if reuse is not None else None
+        if listing is None:
+            if ignore.hides_contents(frame_rel):
+                # 內容全部被忽略（例如 'build/**'）：資料夾本身照常顯示，但不必列出。
+                listing = ([], [])
+            else:
+                # 列出時已消失的資料夾記為空，之後沿用記錄時輸出也一致。
+                listing = _list_directory(frame_dir, ignore, frame_rel) or ([], [])
+        if listings is not None:
+            listings[frame_rel] = listing
+        dirs, files = listing
+        # 最終順序：先資料夾，再檔案
+        entries = dirs + files
+        return frame_dir, frame_prefix, frame_depth, frame_rel, dirs, entries, enumerate(entries)
+
+    top = open_frame(directory, prefix, depth, rel_path)
+    if top is None:
+        return
+
+    # 並行模式：先把這一層的每個子資料夾提交給執行器，
+    # 下面的迴圈走到該資料夾時，再按順序取回結果接上，輸出與單執行緒完全一致。
+    futures: Dict[str, Future] = {}
+    if pool is not None:
+        top_dirs, top_entries = top[4], top[5]
+        for idx, entry_name in enumerate(top_dirs):
+            is_last = (idx == len(top_entries) - 1)
+            futures[entry_name] = pool.submit(
+                _render_subtree,
+                os.path.join(directory, entry_name),
+                prefix + ("    " if is_last else "│   "),
+                depth + 1,
+                rel_path + entry_name + "/",
+                ignore,
+                max_depth,
+                folder_spacing,
+                listings is not None,
+            )
+
+    stack = [top]
+    while stack:
+        frame_dir, frame_prefix, frame_depth, frame_rel, dirs, entries, cursor = stack[-1]
+        step = next(cursor, None)
+        if step is None:
+            stack.pop()
+            continue
+        idx, entry_name = step
+        is_last = (idx == len(entries) - 1)
+        # 排序後資料夾都排在前面，直接由位置得知類型，不再查詢檔案系統。
+        is_dir = idx < len(dirs)
+        display_name = entry_name + "/" if is_dir else entry_name
+
+        # 視覺樹狀行
+        branch = "└── " if is_last else "├── "
+        line = f"{frame_prefix}{branch}{display_name}"
+
+        # 計算這一行對應的「相對路徑 key」：frame_rel 代表目前所在的資料夾路徑，例如 "src/core/"；
+        # 統一用 "/" 作為分隔符，資料夾保留結尾 "/"
+        key = frame_rel + display_name
+
+        # 樹狀圖裡這一行是一個節點，有對應的 path key
+        yield line, key
+
+        # 如果是資料夾，把它的框架推進堆疊（並行模式下改為接回執行器的結果）
+        if is_dir:
+            if len(stack) == 1 and entry_name in futures:
+                sub_nodes, sub_listings = futures[entry_name].result()
+                if listings is not None:
+                    listings.update(sub_listings)
+                yield from sub_nodes
+            else:
+                child = open_frame(os.path.join(frame_dir, entry_name),
+                                   frame_prefix + ("    " if is_last else "│   "), frame_depth + 1, key)
+                if child is not None:
+                    stack.append(child)
+
+    # 根層之間的空行（如果有設定）
+    if folder_spacing > 0 and depth == 1:
+        for _ in range(folder_spacing):
+            yield "", None
+
+
+def _render_subtree(
+    directory: str,
+    prefix: str,
+    depth: int,
+    rel_path: str,
+    ignore: IgnoreMatcher,
+    max_depth: Optional[int],
+    folder_spacing: int,
+    record_listings: bool = False,
+) -> Tuple[List[TreeNode], Dict[str, Listing]]:
+    """產生一棵子樹的節點與（需要時）各資料夾的排序結果（模組層級函式，才能交給子行程池執行）。"""
+    listings: Dict[str, Listing] = {}
+    nodes = list(_iter_directory(directory, prefix, depth, rel_path, ignore, max_depth, folder_spacing,
+                                 listings=listings if record_listings else None))
+    return nodes, listings
+
+
+def _iter_tree(
+    root_path: str,
+    ignore: IgnoreMatcher,
+    folder_spacing: int = 0,
+    max_depth: Optional[int] = None,
+    pool: Optional[Executor] = None,
+    listings: Optional[Dict[str, Listing]] = None,
+    reuse: Optional[Dict[str, Listing]] = None,
+) -> Iterator[TreeNode]:
+    """逐行產生整棵目錄樹的節點：先是根節點，再是根底下的所有節點。"""
+    # 根節點顯示名稱，例如 "laplace_sentry_control_v2/"；根的相對路徑 key 我們定義為空字串 ""
+    yield os.path.basename(os.path.normpath(root_path)) + "/", ""
+    yield from _iter_directory(root_path, "", 1, "", ignore, max_depth, folder_spacing,
+                               pool, listings=listings, reuse=reuse)
+
+
 # 這裡，我們用「def」來 定義（define）一個函式，名稱是「_generate_tree」。
 # 它的任務是：根據你電腦裡的真實檔案結構，生成一個視覺上穩定、準確的樹狀圖。
 # 我們為函式簽名增加一個新的、可選的參數 ignore_patterns
@@ -198,125 +396,243 @@ def _generate_tree(
     folder_spacing: int = 0,
     max_depth: Optional[int] = None,
     ignore_patterns: Optional[Set[str]] = None,
+    pool: Optional[Executor] = None,
+    listings: Optional[Dict[str, Listing]] = None,
+    use_gitignore: bool = False,
 ) -> Tuple[List[str], List[TreeNode]]:
     """
-    產生目錄樹的純文字行列表，並同步產生每一行對應的相對路徑 key。
+    產生目錄樹的純文字行列表，並同步產生每一行對應的相對路徑 key（一次取完 _iter_tree 的結果）。
 
     - tree_lines: 舊版使用的純文字樹狀行（保持相容）
     - tree_nodes: 每一行搭配一個相對路徑 key（根或非節點則為 None）
+    - pool      : 若提供執行器，頂層的每個資料夾會並行產生，再按原順序合併
+    - listings  : 若提供，順便記錄每個資料夾的排序結果（增量重繪快取使用）
+    - use_gitignore : 另外套用 root_path 以下各層的 .gitignore
     """
-    lines: List[str] = []
-    nodes: List[TreeNode] = []
+    nodes = list(_iter_tree(root_path, _build_ignore_rules(ignore_patterns, root_path, use_gitignore),
+                            folder_spacing, max_depth,
+                            pool, listings=listings))
+    return [line for line, _ in nodes], nodes
 
-    # 根節點顯示名稱，例如 "laplace_sentry_control_v2/"
-    root_name = os.path.basename(os.path.normpath(root_path)) + "/"
 
-    # 根節點：對外仍然保留原本的顯示形式
-    root_line = root_name
-    lines.append(root_line)
-    # 根的相對路徑 key 我們定義為空字串 ""
-    nodes.append((root_line, ""))
+def _build_ignore_rules(ignore_patterns: Optional[Iterable[str]], root_path: str = "",
+                        use_gitignore: bool = False) -> IgnoreMatcher:
+    """
+    準備忽略規則：系統預設 + 使用者設定（聯集），同一組規則只編譯一次。
 
-    # 準備忽略名單：系統預設 + 使用者設定（聯集）
-    if ignore_patterns:
-        ignore_set: Set[str] = SYSTEM_DEFAULT_IGNORE | set(ignore_patterns)
-    else:
-        ignore_set = set(SYSTEM_DEFAULT_IGNORE)
-
-    def recursive_helper(
-        directory: str,
-        prefix: str,
-        depth: int,
-        rel_path: str,
-    ):
-        """
-        directory : 真實檔案系統路徑
-        prefix    : 樹狀圖的視覺前綴（由 '│   ' / '    ' 組成）
-        depth     : 當前深度（根為 0）
-        rel_path  : 目前相對於 root 的路徑字串（例如 'src/core/'）
-        """
-        # 深度限制檢查
-        if max_depth is not None and depth > max_depth:
-            return
+    use_gitignore 時再加上 root_path 以下各層的 .gitignore（每次產生都建立新的比對器，
+    才能讀到最新的 .gitignore；內容沒變的檔案沿用已編譯的規則）。
+    """
+    patterns = SYSTEM_DEFAULT_IGNORE.union(ignore_patterns) if ignore_patterns else SYSTEM_DEFAULT_IGNORE
+    return build_matcher(patterns, root_path if use_gitignore else None)
 
-        try:
-            all_entries = os.listdir(directory)
-        except FileNotFoundError:
-            return
-
-        # 先套用忽略規則
-        visible_entries = [
-            name for name in all_entries
-            if name not in ignore_set
-        ]
-
-        # VSCode 風格排序：
-        # 1. 資料夾永遠在前
-        # 2. 資料夾按字母排序
-        # 3. 檔案永遠在後
-        # 4. 檔案按字母排序
-        dirs: List[str] = []
-        files: List[str] = []
-
-        for name in visible_entries:
-            full = os.path.join(directory, name)
-            if os.path.isdir(full):
-                dirs.append(name)
-            else:
-                files.append(name)
 
-        dirs.sort()
-        files.sort()
 
-        # 最終順序：先資料夾，再檔案
-        entries = dirs + files
+# ==============================================================================
+#  增量重繪：保留上一次的節點與各資料夾排序結果，只重列有變動的資料夾
+# ==============================================================================
 
-        total = len(entries)
-        for idx, entry_name in enumerate(entries):
-            is_last = (idx == total - 1)
-            full_path = os.path.join(directory, entry_name)
-            is_dir = os.path.isdir(full_path)
-            display_name = entry_name + "/" if is_dir else entry_name
-
-            # 視覺樹狀行
-            branch = "└── " if is_last else "├── "
-            line = f"{prefix}{branch}{display_name}"
-            lines.append(line)
-
-            # 計算這一行對應的「相對路徑 key」
-            # rel_path 代表目前所在的資料夾路徑，例如 "src/core/"
-            if rel_path:
-                new_rel_path = rel_path + display_name
-            else:
-                new_rel_path = display_name
+class TreeCache:
+    """
+    跨呼叫保留上一次產生的目錄樹（由持有者決定生命週期，例如每個哨兵一份）。
+
+    - nodes    : 上一次輸出的完整節點列表（含根節點與結尾空行）
+    - listings : 每個已列出資料夾的排序結果（相對路徑 key → (資料夾, 檔案)）
+    - 產生選項（根路徑、間距、深度、忽略規則）改變、沒有提供變動目錄，
+      或距離上次完整重繪超過 max_age 秒時，一律完整重繪；
+      呼叫端看不到的變動（例如哨兵自身忽略的名稱）靠定期完整重繪補上。
+    - gitignore_stamps : 讀取 .gitignore 時，各資料夾 .gitignore 的 (mtime_ns, size)；
+      變動的資料夾裡的 .gitignore 改變（新增、修改、刪除）時，底下沿用的排序結果都不再可信，改為完整重繪。
+    """
 
-            # 統一用 "/" 作為分隔符，資料夾保留結尾 "/"
-            if is_dir:
-                key = new_rel_path  # 已經有 "/"
-            else:
-                key = new_rel_path.rstrip("/")
+    def __init__(self, max_age: Optional[float] = None):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.options: Optional[tuple] = None
+        self.nodes: List[TreeNode] = []
+        self.listings: Dict[str, Listing] = {}
+        self.gitignore_stamps: Dict[str, Optional[Tuple[int, int]]] = {}
+        self.rendered_at = 0.0
+
+    def clear(self) -> None:
+        """丟棄快取，下一次呼叫完整重繪。"""
+        with self.lock:
+            self.options = None
+            self.nodes = []
+            self.listings = {}
+            self.gitignore_stamps = {}
+
+
+def _parent_key(key: str) -> str:
+    """'src/core/' -> 'src/'；頂層資料夾的上一層是根 ''。"""
+    head, _, _ = key.rstrip("/").rpartition("/")
+    return head + "/" if head else ""
+
+
+def _dirty_keys(
+    root_path: str,
+    changed_dirs: Iterable[str],
+    listings: Dict[str, Listing],
+    ignore: IgnoreMatcher,
+    max_depth: Optional[int],
+) -> Set[str]:
+    """
+    把變動目錄（絕對路徑）換成要重列的資料夾 key。
 
-            # 樹狀圖裡這一行是一個節點，有對應的 path key
-            nodes.append((line, key))
+    - 根目錄以外的目錄直接略過。
+    - 被忽略的名稱與超過深度限制的目錄不出現在輸出中：只有它們可見的上層新出現或消失時，才改由更上一層重列；
+      上層的排序結果仍列著被忽略的資料夾時（規則改變），改由上層重列。
+    - 還沒列出過（新出現）或已經不是資料夾（被刪除 / 換成檔案）的目錄，改由最近的已列出上層重列。
+    """
+    keys: Set[str] = set()
+    if max_depth is not None and max_depth < 1:
+        return keys
+    for directory in changed_dirs:
+        rel = os.path.relpath(directory, root_path)
+        if rel == ".":
+            keys.add("")
+            continue
+        parts = rel.split(os.sep)
+        if parts[0] == "..":
+            continue
+        hidden = ignore.first_ignored(parts)
+        if hidden is not None:
+            name, parts = parts[hidden], parts[:hidden]
+            # 上層沿用的排序結果仍列著這個資料夾：它是規則改變後才被忽略的（例如 .gitignore 新增了它），上層要重列。
+            listing = listings.get("/".join(parts) + "/" if parts else "")
+            shown = listing is not None and name in listing[0]
+            if not shown and (not parts or ("/".join(parts) + "/" in listings
+                                             and os.path.isdir(os.path.join(root_path, *parts)))):
+                continue
+            if not parts:
+                keys.add("")
+                continue
+        # 資料夾 'a/b/' 在 _iter_directory 中以深度 len(parts) + 1 列出。
+        if max_depth is not None and len(parts) + 1 > max_depth:
+            parts = parts[:max_depth]
+            parent = "/".join(parts[:-1]) + "/" if len(parts) > 1 else ""
+            listing = listings.get(parent)
+            if (listing is not None and parts[-1] in listing[0]
+                    and os.path.isdir(os.path.join(root_path, *parts))):
+                continue
+            parts = parts[:-1]
+            if not parts:
+                keys.add("")
+                continue
+        key = "/".join(parts) + "/"
+        while key and (key not in listings or not os.path.isdir(os.path.join(root_path, *parts))):
+            key = _parent_key(key)
+            parts = parts[:-1]
+        keys.add(key)
+    return keys
+
+
+def _splice_subtrees(
+    cache: TreeCache,
+    root_path: str,
+    dirty: Set[str],
+    ignore: IgnoreMatcher,
+    max_depth: Optional[int],
+) -> None:
+    """
+    重列 dirty 中的資料夾，重繪它們各自的子樹並接回 cache.nodes。
 
-            # 如果是資料夾，遞迴進去
-            if is_dir:
-                child_prefix = prefix + ("    " if is_last else "│   ")
-                child_rel_path = key  # 對資料夾而言，key 已經是 "xxx/" 型式
-                recursive_helper(full_path, child_prefix, depth + 1, child_rel_path)
+    子樹內沒有變動的資料夾沿用快取中的排序結果，只重新排版，不讀取檔案系統。
+    """
+    # 只處理最上層的變動資料夾：它的子樹重繪時已涵蓋底下其他變動。
+    tops = set()
+    for key in dirty:
+        parent = key
+        while parent:
+            parent = _parent_key(parent)
+            if parent in dirty:
+                break
+        else:
+            tops.add(key)
+
+    nodes = cache.nodes
+    positions = {key: idx for idx, (_, key) in enumerate(nodes) if key in tops}
+    # 由後往前接回，前面子樹的索引不受影響。
+    for key in sorted(tops, key=positions.__getitem__, reverse=True):
+        idx = positions[key]
+        end = idx + 1
+        while end < len(nodes) and nodes[end][1] is not None and nodes[end][1].startswith(key):
+            end += 1
+
+        # 由資料夾自己的那一行還原子項目的前綴：每層 4 個字元，最後一段是分支符號。
+        level = key.count("/")
+        own_line = nodes[idx][0]
+        branch = own_line[4 * (level - 1):4 * level]
+        child_prefix = own_line[:4 * (level - 1)] + ("    " if branch == "└── " else "│   ")
+
+        reuse: Dict[str, Listing] = {}
+        for sub_key in [k for k in cache.listings if k.startswith(key)]:
+            listing = cache.listings.pop(sub_key)
+            if sub_key not in dirty:
+                reuse[sub_key] = listing
+
+        nodes[idx + 1:end] = _iter_directory(os.path.join(root_path, *key.rstrip("/").split("/")), child_prefix,
+                                             level + 1, key, ignore, max_depth, 0,
+                                             listings=cache.listings, reuse=reuse)
+
+
+def _gitignore_changed(cache: TreeCache, ignore: IgnoreMatcher, dirty: Set[str]) -> bool:
+    """
+    變動的資料夾中是否有 .gitignore 被新增、修改或刪除（順便更新快取中的戳記）。
 
-        # 根層之間的空行（如果有設定）
-        if folder_spacing > 0 and depth == 1:
-            for _ in range(folder_spacing):
-                spacer = ""
-                lines.append(spacer)
-                nodes.append((spacer, None))
+    沒有記錄的資料夾（例如由子行程列出）視為沒變，交給定期完整重繪補上。
+    """
+    changed = False
+    for key in dirty:
+        now = ignore.stamp(key)
+        if cache.gitignore_stamps.get(key, now) != now:
+            changed = True
+        cache.gitignore_stamps[key] = now
+    return changed
 
-    # 從 root 下層開始遞迴，根本身已經手動加入
-    recursive_helper(root_path, prefix="", depth=1, rel_path="")
 
-    return lines, nodes
+def _render_with_cache(
+    cache: TreeCache,
+    root_path: str,
+    changed_dirs: Optional[Iterable[str]],
+    folder_spacing: int,
+    max_depth: Optional[int],
+    ignore: IgnoreMatcher,
+    pool: Optional[Executor],
+) -> List[TreeNode]:
+    """
+    有快取可用且提供了變動目錄時增量重繪，否則完整重繪並重建快取；輸出與完整重繪一致。
 
+    回傳的就是快取中的節點列表（不另外複製），只在下一次以同一份快取呼叫之前有效。
+    """
+    options = (os.path.normpath(root_path), folder_spacing, max_depth, ignore)
+    with cache.lock:
+        stale = (
+            changed_dirs is None
+            or cache.options != options
+            or (cache.max_age is not None and time.monotonic() - cache.rendered_at >= cache.max_age)
+        )
+        if not stale:
+            dirty = _dirty_keys(root_path, changed_dirs, cache.listings, ignore, max_depth)
+            stale = ignore.reads_gitignore and _gitignore_changed(cache, ignore, dirty)
+        if stale:
+            listings: Dict[str, Listing] = {}
+            nodes = list(_iter_tree(root_path, ignore, folder_spacing, max_depth, pool, listings=listings))
+            cache.options, cache.nodes, cache.listings = options, nodes, listings
+            cache.gitignore_stamps = dict(ignore.stamps) if ignore.reads_gitignore else {}
+            cache.rendered_at = time.monotonic()
+            return nodes
+
+        if "" in dirty:
+            # 根目錄本身有變動：沿用其他資料夾的排序結果，重新排出整棵樹。
+            reuse = {k: v for k, v in cache.listings.items() if k not in dirty}
+            listings = {}
+            cache.nodes = list(_iter_tree(root_path, ignore, folder_spacing, max_depth,
+                                          listings=listings, reuse=reuse))
+            cache.listings = listings
+        elif dirty:
+            _splice_subtrees(cache, root_path, dirty, ignore, max_depth)
+        return cache.nodes
 
 # ==============================================================================
 # 【v4.0 核心演算法】 - 註解合併器 (回歸 v0 智慧)
@@ -325,33 +641,36 @@ def _generate_tree(
 # 這裡，我們用「def」來 定義（define）一個函式，名稱是「_merge_and_align_comments」。
 # 它的任務是：把新生成的樹狀圖和從舊內容中解析出的註解，合併在一起並對齊。
 
-def _merge_and_align_comments_by_path(
-    tree_nodes: List[TreeNode],
+def _content_width(tree_nodes: Iterable[TreeNode]) -> int:
+    """對齊的第一趟：計算內容行最長長度（只看有 '──' 的行），只保留長度，不保留行本身。"""
+    max_len = 0
+    for line, _ in tree_nodes:
+        if "──" in line:
+            max_len = max(max_len, len(line.rstrip()))
+    return max_len
+
+
+def _iter_merged_lines(
+    tree_nodes: Iterable[TreeNode],
     path_comments: Dict[str, str],
     basename_comments: Dict[str, str],
-) -> List[str]:
+    max_len: int,
+) -> Iterator[str]:
     """
+    對齊的第二趟：逐行合併註釋並輸出。
+
     使用「路徑為 key」合併註釋，
     若路徑對不上，且檔名在整棵樹中是唯一的，則回退使用「檔名為 key」。
     """
-    final_lines: List[str] = []
-
-    # 1. 計算內容行最長長度（只看有 '──' 的行）
-    max_len = 0
-    for line, _ in tree_nodes:
-        if "──" in line:
-            max_len = max(max_len, len(line.rstrip()))
-
     used_paths: Set[str] = set()
     used_basenames: Set[str] = set()
 
-    # 2. 逐行合併
     for line, path_key in tree_nodes:
         stripped_line = line.rstrip()
 
         # 空白行或非節點行：原樣輸出
         if path_key is None:
-            final_lines.append(line)
+            yield line
             continue
 
         is_root = (path_key == "")
@@ -370,16 +689,23 @@ def _merge_and_align_comments_by_path(
 
         if comment:
             padding = " " * (max_len - len(stripped_line) + 2)
-            final_lines.append(f"{stripped_line}{padding}# {comment}")
+            yield f"{stripped_line}{padding}# {comment}"
         else:
             # 沒註解的節點：依舊給 TODO（與舊版行為一致）
             if "──" in line or is_root:
                 padding = " " * (max_len - len(stripped_line) + 2)
-                final_lines.append(f"{stripped_line}{padding}# TODO: Add comment here")
+                yield f"{stripped_line}{padding}# TODO: Add comment here"
             else:
-                final_lines.append(line)
+                yield line
 
-    return final_lines
+
+def _merge_and_align_comments_by_path(
+    tree_nodes: List[TreeNode],
+    path_comments: Dict[str, str],
+    basename_comments: Dict[str, str],
+) -> List[str]:
+    """一次完成兩趟對齊並回傳所有行（節點已經全部在記憶體中時使用）。"""
+    return list(_iter_merged_lines(tree_nodes, path_comments, basename_comments, _content_width(tree_nodes)))
 
 
 
@@ -387,16 +713,33 @@ def _merge_and_align_comments_by_path(
 # 【v4.0 核心演算法】 - 總裝配線 (Public API)
 # ==============================================================================
 
-# 這裡，我們用「def」來 定義（define）一個公開的、可以從外部調用的主函式。
-# 它的任務是：按順序調用所有內部函式，完成一次完整的生成流程。
-# 我們同樣為這個公開的函式，增加一個可選的 ignore_patterns 參數
-def generate_annotated_tree(
+# 串流輸出時，每累積這麼多行寫出一次。
+OUTPUT_CHUNK_LINES = 1024
+
+# 這裡，我們用「def」來 定義（define）一個公開的、可以從外部調用的產生器。
+# 它的任務是：按順序調用所有內部函式，逐行產生最終的目錄樹。
+def iter_annotated_tree(
     root_path,
     old_content_string: str | None = "None",
     folder_spacing=0,
     max_depth=None,
     ignore_patterns=None,
-):
+    scan_workers: int = 1,
+    scan_pool: str = "thread",
+    tree_cache: Optional[TreeCache] = None,
+    changed_dirs: Optional[Iterable[str]] = None,
+    use_gitignore: bool = False,
+) -> Iterator[str]:
+    """
+    逐行產生帶註釋的目錄樹（不含換行符號）。
+
+    沒有快取時分兩趟：第一趟走訪檔案系統，只記下各資料夾的排序結果與最長行長；
+    第二趟沿用排序結果重新排版（不再讀取檔案系統），邊合併註釋邊產生，整棵樹的行不會同時留在記憶體中。
+
+    tree_cache   : 若提供，保留本次結果供下一次增量重繪
+    changed_dirs : 自上一次呼叫以來有變動的資料夾（絕對路徑）；None 表示未知，完整重繪
+    use_gitignore: 另外套用 root_path 以下各層的 .gitignore（含否定規則），被忽略的資料夾不下探
+    """
     root_name = os.path.basename(os.path.normpath(root_path)) + "/"
 
     # 1. 解析舊內容中的註釋：路徑 + 檔名 fallback
@@ -405,22 +748,75 @@ def generate_annotated_tree(
         root_name,
     )
 
-    # 2. 產生最新的樹狀結構
-    tree_lines, tree_nodes = _generate_tree(
+    # 2. 產生最新的樹狀結構並計算對齊寬度
+    #    （scan_workers > 1 時，頂層資料夾並行產生；有快取時只重繪變動的子樹）
+    ignore = _build_ignore_rules(ignore_patterns, root_path, use_gitignore)
+    listings: Dict[str, Listing] = {}
+    pool = open_pool(scan_workers, scan_pool)
+    try:
+        if tree_cache is not None:
+            tree_nodes: Iterable[TreeNode] = _render_with_cache(tree_cache, root_path, changed_dirs, folder_spacing,
+                                                                max_depth, ignore, pool)
+            max_len = _content_width(tree_nodes)
+        else:
+            max_len = _content_width(_iter_tree(root_path, ignore, folder_spacing, max_depth, pool,
+                                                listings=listings))
+            tree_nodes = _iter_tree(root_path, ignore, folder_spacing, max_depth, reuse=listings)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    # 3. 基於 path + basename 合併註釋
+    yield from _iter_merged_lines(tree_nodes, path_comments, basename_comments, max_len)
+
+
+# 這裡，我們用「def」來 定義（define）一個公開的、可以從外部調用的主函式。
+# 它的任務是：完成一次完整的生成流程，並把結果接成一個字串。
+# 我們同樣為這個公開的函式，增加一個可選的 ignore_patterns 參數
+def generate_annotated_tree(
+    root_path,
+    old_content_string: str | None = "None",
+    folder_spacing=0,
+    max_depth=None,
+    ignore_patterns=None,
+    scan_workers: int = 1,
+    scan_pool: str = "thread",
+    tree_cache: Optional[TreeCache] = None,
+    changed_dirs: Optional[Iterable[str]] = None,
+    use_gitignore: bool = False,
+):
+    """參數同 iter_annotated_tree；需要整段文字（例如要嵌入 Markdown）時使用。"""
+    return "\n".join(iter_annotated_tree(
         root_path,
+        old_content_string,
         folder_spacing=folder_spacing,
         max_depth=max_depth,
         ignore_patterns=ignore_patterns,
-    )
+        scan_workers=scan_workers,
+        scan_pool=scan_pool,
+        tree_cache=tree_cache,
+        changed_dirs=changed_dirs,
+        use_gitignore=use_gitignore,
+    ))
 
-    # 3. 基於 path + basename 合併註釋
-    final_tree_lines = _merge_and_align_comments_by_path(
-        tree_nodes,
-        path_comments,
-        basename_comments,
-    )
 
-    return "\n".join(final_tree_lines)
+def write_annotated_tree(out: IO[str], root_path, old_content_string: str | None = None,
+                         chunk_lines: int = OUTPUT_CHUNK_LINES, **options) -> None:
+    """
+    把帶註釋的目錄樹分批寫入 out（內容與 generate_annotated_tree 相同，結尾不加換行）。
+
+    每 chunk_lines 行寫出一次，不必先把整棵樹接成一個大字串；其餘參數同 iter_annotated_tree。
+    """
+    separator = ""
+    chunk: List[str] = []
+    for line in iter_annotated_tree(root_path, old_content_string, **options):
+        chunk.append(line)
+        if len(chunk) >= chunk_lines:
+            out.write(separator + "\n".join(chunk))
+            separator = "\n"
+            chunk = []
+    if chunk:
+        out.write(separator + "\n".join(chunk))
 
 
 
@@ -458,16 +854,15 @@ def main():
         # 如果既不是 `-` 也不是有效檔案，就直接把參數本身當作內容。
         old_content = old_content_source
 
-    # 調用我們的「總裝配線」函式來生成最終的目錄樹。
-    final_tree = generate_annotated_tree(
+    # 調用我們的「總裝配線」函式，把最終的目錄樹分批寫到標準輸出（結尾補上換行，與 print 相同）。
+    write_annotated_tree(
+        sys.stdout,
         project_path,
         old_content,
         folder_spacing=folder_spacing,
         max_depth=max_depth
     )
-
-    # 將結果打印到標準輸出。
-    print(final_tree)
+    sys.stdout.write("\n")
 
 # 這是一個 Python 的標準寫法。
 # 它確保只有當這個文件被直接執行時，main() 函式才會被調用。
@@ -12,6 +12,21 @@
 import sys       # 用於讀取從標準輸入傳來的資料。
 import argparse  # 專業的「指令翻譯官」，負責解析命令列參數。
 
+# 我們用「def」來 定義（define）一個純函式「apply_strategy」。
+# 它只接收字串、回傳字串，不碰 stdin / stdout / argv，
+# 因此 worker 可以在任何執行緒裡直接呼叫它，不必再替換全域的系統 I/O。
+def apply_strategy(raw_content: str, strategy: str = 'raw') -> str:
+    # FUTURE:
+    # 這裡的「if...else...」結構是一個可擴展的設計。未來如果我們想支持
+    # 新的筆記軟體（如 Typora 或 Notion），只需要在這裡增加新的「elif」判斷分支即可。
+    # 我們用「if」來判斷，如果（if）指定的策略是「obsidian」...
+    if strategy == 'obsidian':
+        # ...我們就在「原材料」的頭尾，分別加上三個反引號，把它包裹成一個 Markdown 代碼塊。
+        return f"```\n{raw_content.strip()}\n```"
+    # 否則（else），如果不是「obsidian」策略，我們就直接把「原材料」當作「成品」。
+    return raw_content
+
+
 # 這裡，我們用「def」來 定義（define）一個我們這個腳本最主要的函式，名叫「main」。
 def main():
     
@@ -34,17 +49,8 @@ def main():
     # 我們用「sys」工具，從「標準輸入（stdin）」中，讀取（read）所有傳來的「原材料」內容。
     raw_content = sys.stdin.read()
 
-    # FUTURE:
-    # 這裡的「if...else...」結構是一個可擴展的設計。未來如果我們想支持
-    # 新的筆記軟體（如 Typora 或 Notion），只需要在這裡增加新的「elif」判斷分支即可。
-    # 我們用「if」來判斷，如果（if）指令中指定的策略（args.strategy）是「obsidian」...
-    if args.strategy == 'obsidian':
-        # ...我們就在「原材料」的頭尾，分別加上三個反引號，把它包裹成一個 Markdown 代碼塊。
-        formatted_content = f"```\n{raw_content.strip()}\n```"
-    # 否則（else），如果不是「obsidian」策略...
-    else:
-        # ...我們就什麼都不做，直接把「原材料」當作「成品」。
-        formatted_content = raw_content
+    # 我們把「原材料」交給純函式「apply_strategy」，由它決定要怎麼包裝。
+    formatted_content = apply_strategy(raw_content, args.strategy)
     
     # 最後，我們把「包裝」好的成品，打印（print）到標準輸出，讓下一個流程可以使用。
     print(formatted_content)
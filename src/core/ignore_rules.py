@@ -0,0 +1,430 @@
+# ==============================================================================
+# 模組職責：ignore_rules.py
+# - engine（目錄樹）、sentry_worker（快照掃描）、inotify_backend（監看）與 daemon 共用的忽略規則比對器。
+# - 規則在建立 IgnoreMatcher 時一次編譯完成：純名稱走集合查詢，萬用字元與路徑規則各自合併成
+#   一條正規表達式，每個項目最多比對常數次，不隨規則數量線性成長。
+# - 走訪端在列出資料夾時就套用，被忽略的資料夾整棵不下探。
+# - GitignoreMatcher 另外讀取專案內各層的 .gitignore（含否定規則 "!"）：每個檔案編譯一次，
+#   以 mtime / size 判斷是否需要重新讀取；每個資料夾適用的規則鏈也只組合一次。
+#
+# 規則語法（.gitignore 的子集，路徑一律以 "/" 分隔、相對於專案根目錄）：
+#   node_modules     -> 不含 "/"：比對任何一層的名稱（原本的名稱完全相符行為）
+#   *.log            -> 萬用字元：* 與 ? 不跨越 "/"，另支援 [abc] / [!abc]
+#   src/generated/   -> 結尾 "/"：只比對資料夾
+#   src/generated    -> 含 "/"（或以 "/" 開頭）：錨定在專案根目錄，比對相對路徑
+#   build/**         -> "**" 跨越任意層；"a/**/b" 中間可為零層；"**/x" 等同任何一層的 x
+# ==============================================================================
+
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Pattern, Sequence, Tuple, Union
+
+_GLOB_CHARS = frozenset("*?[\\")
+
+GITIGNORE_FILENAME = ".gitignore"
+
+
+def _translate(pattern: str) -> str:
+    """把一條 glob 規則轉成正規表達式（不含錨點）；* 與 ? 不跨越 "/"，** 可跨越。"""
+    out: List[str] = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**/", i):
+                out.append("(?:.*/)?")
+                i += 3
+                continue
+            if pattern.startswith("**", i):
+                out.append(".*")
+                i += 2
+                continue
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = i + 1
+            if j < n and pattern[j] in "!^":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            j = pattern.find("]", j)
+            if j < 0:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j]
+                if body[:1] == "!":
+                    body = "^" + body[1:]
+                out.append("(?!/)[" + body.replace("\\", "\\\\") + "]")
+                i = j + 1
+                continue
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def _combine(parts: Sequence[str]) -> Optional[Pattern[str]]:
+    """把多條規則合併成一條完整比對的正規表達式；沒有規則時回傳 None。"""
+    if not parts:
+        return None
+    return re.compile("(?s:" + "|".join(parts) + r")\Z")
+
+
+class IgnoreMatcher:
+    """
+    編譯好的忽略規則（不可變，可跨執行緒共用、可傳給子行程池）。
+
+    走訪端的典型用法（parent 為所在資料夾的相對路徑，根為 ""，其餘為 "src/core/" 形式）：
+        if matcher.hides_contents(parent): 整個資料夾的內容都被忽略，不必列出
+        if matcher.matches(parent, name): 略過（不必知道類型）
+        if matcher.matches_entry(parent, name, is_dir): 略過（需要類型的規則）
+
+    沒有路徑規則時（has_path_rules 為 False）parent 不會被使用，呼叫端可直接傳 ""。
+    兩個比對器的規則相同即視為相等，可作為快取 key 的一部分。
+    """
+
+    # 不讀取 .gitignore（見 GitignoreMatcher）。
+    reads_gitignore = False
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.patterns = tuple(sorted({p for p in patterns if p}))
+        names, dir_names, paths, dir_paths = set(), set(), set(), set()
+        name_globs: List[str] = []
+        dir_name_globs: List[str] = []
+        path_globs: List[str] = []
+        dir_path_globs: List[str] = []
+        contents = set()
+
+        for raw in self.patterns:
+            rule = raw
+            dir_only = rule.endswith("/")
+            rule = rule.rstrip("/")
+            anchored = rule.startswith("/")
+            rule = rule.lstrip("/")
+            if not anchored:
+                # "**/x" 與 "x" 相同（任何一層）；去掉後仍含 "/" 的規則比對任何一層開始的路徑。
+                while rule.startswith("**/"):
+                    rule = rule[3:]
+                    anchored = None
+            if not rule:
+                continue
+            is_glob = any(c in _GLOB_CHARS for c in rule)
+
+            if "/" not in rule and not anchored:
+                if is_glob:
+                    (dir_name_globs if dir_only else name_globs).append(_translate(rule))
+                else:
+                    (dir_names if dir_only else names).add(rule)
+                continue
+
+            if anchored is None:
+                (dir_path_globs if dir_only else path_globs).append("(?:.*/)?" + _translate(rule))
+            elif is_glob:
+                (dir_path_globs if dir_only else path_globs).append(_translate(rule))
+                head = rule[:-3]
+                if not dir_only and rule.endswith("/**") and not any(c in _GLOB_CHARS for c in head):
+                    contents.add(head + "/")
+            else:
+                (dir_paths if dir_only else paths).add(rule)
+
+        self.names: FrozenSet[str] = frozenset(names)
+        self.dir_names: FrozenSet[str] = frozenset(dir_names)
+        self.paths: FrozenSet[str] = frozenset(paths)
+        self.dir_paths: FrozenSet[str] = frozenset(dir_paths)
+        self.content_dirs: FrozenSet[str] = frozenset(contents)
+        self._name_re = _combine(name_globs)
+        self._dir_name_re = _combine(dir_name_globs)
+        self._path_re = _combine(path_globs)
+        self._dir_path_re = _combine(dir_path_globs)
+        self.has_path_rules = bool(paths or dir_paths or path_globs or dir_path_globs or contents)
+        self.has_dir_rules = bool(dir_names or dir_paths or dir_name_globs or dir_path_globs)
+
+    def matches(self, parent: str, name: str) -> bool:
+        """不論類型都適用的規則：parent 底下的 name 是否被忽略。"""
+        if name in self.names:
+            return True
+        if self._name_re is not None and self._name_re.match(name):
+            return True
+        if not self.has_path_rules:
+            return False
+        rel = parent + name
+        if rel in self.paths:
+            return True
+        return self._path_re is not None and self._path_re.match(rel) is not None
+
+    def matches_dir(self, parent: str, name: str) -> bool:
+        """只比對資料夾的規則（結尾 "/"）：呼叫端已知 name 是資料夾時才需要檢查。"""
+        if not self.has_dir_rules:
+            return False
+        if name in self.dir_names:
+            return True
+        if self._dir_name_re is not None and self._dir_name_re.match(name):
+            return True
+        rel = parent + name
+        if rel in self.dir_paths:
+            return True
+        return self._dir_path_re is not None and self._dir_path_re.match(rel) is not None
+
+    def matches_entry(self, parent: str, name: str, is_dir: bool) -> bool:
+        """需要類型的規則：走訪端已用 matches() 篩過、判斷出類型之後呼叫。"""
+        return is_dir and self.matches_dir(parent, name)
+
+    def ignores(self, parent: str, name: str, is_dir: bool) -> bool:
+        """類型已知時的完整判斷。"""
+        return self.matches(parent, name) or self.matches_entry(parent, name, is_dir)
+
+    def hides_contents(self, parent: str) -> bool:
+        """parent 資料夾的所有內容都被忽略（例如 'build/**'），走訪端不必列出它。"""
+        return parent in self.content_dirs
+
+    def first_ignored(self, parts: Sequence[str], is_dir: bool = True) -> Optional[int]:
+        """
+        parts 為一條相對路徑的各層名稱；回傳第一個被忽略的層的索引，都沒有被忽略時回傳 None。
+
+        除了最後一層外都是資料夾；最後一層的類型由 is_dir 決定。
+        """
+        parent = ""
+        last = len(parts) - 1
+        for idx, name in enumerate(parts):
+            if self.ignores(parent, name, is_dir or idx < last):
+                return idx
+            parent += name + "/"
+            if idx < last and parent in self.content_dirs:
+                return idx + 1
+        return None
+
+    def ignores_path(self, rel_path: str, is_dir: bool = False) -> bool:
+        """相對路徑（以 "/" 分隔）本身或它的任何一層上層被忽略。"""
+        return self.first_ignored(rel_path.split("/"), is_dir) is not None
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, IgnoreMatcher) and self.patterns == other.patterns
+
+    def __hash__(self) -> int:
+        return hash(self.patterns)
+
+    def __repr__(self) -> str:
+        return f"IgnoreMatcher({list(self.patterns)!r})"
+
+    def __reduce__(self):
+        # 傳給子行程時只帶規則本身，由對方重新編譯（同一組規則在每個行程只編譯一次）。
+        return compile_ignore, (self.patterns,)
+
+
+@lru_cache(maxsize=64)
+def _compile_cached(patterns: FrozenSet[str]) -> IgnoreMatcher:
+    return IgnoreMatcher(patterns)
+
+
+def compile_ignore(patterns: Union[IgnoreMatcher, Iterable[str]]) -> IgnoreMatcher:
+    """取得一組規則的比對器；同一組規則重複呼叫時沿用已編譯的結果。"""
+    if isinstance(patterns, IgnoreMatcher):
+        return patterns
+    return _compile_cached(frozenset(patterns))
+
+
+def relative_dir(root: str, directory: str) -> str:
+    """把 root 底下的資料夾路徑換成比對用的 parent 形式：根為 ""，其餘為 'src/core/'。"""
+    root = root.rstrip(os.sep)
+    if directory == root or not directory.startswith(root + os.sep):
+        return ""
+    rel = directory[len(root) + 1:].rstrip(os.sep)
+    if os.sep != "/":
+        rel = rel.replace(os.sep, "/")
+    return rel + "/" if rel else ""
+
+
+# ==============================================================================
+#  .gitignore：階層式規則（較深的檔案優先，同一檔案中後面的規則優先，"!" 重新納入）
+# ==============================================================================
+
+def parse_gitignore(text: str) -> List[Tuple[str, bool]]:
+    """把 .gitignore 內容拆成 (規則, 是否為否定規則) 列表；略過空行與註解。"""
+    rules: List[Tuple[str, bool]] = []
+    for line in text.splitlines():
+        # 結尾空白除非以反斜線跳脫，否則不算規則的一部分。
+        stripped = line.rstrip(" \t")
+        if stripped.endswith("\\") and len(stripped) < len(line):
+            stripped += " "
+        if not stripped or stripped.startswith("#"):
+            continue
+        negated = stripped.startswith("!")
+        if negated:
+            stripped = stripped[1:]
+        elif stripped.startswith(("\\#", "\\!")):
+            stripped = stripped[1:]
+        if stripped:
+            rules.append((stripped, negated))
+    return rules
+
+
+class GitignoreFile:
+    """
+    一個 .gitignore 編譯後的規則：連續同號（忽略 / 否定）的規則合併成一個 IgnoreMatcher 區塊。
+
+    判斷時由最後一個區塊往前找第一個比對成功的區塊，結果等同「最後一條符合的規則生效」。
+    路徑以 .gitignore 所在資料夾為基準。
+    """
+
+    def __init__(self, rules: Sequence[Tuple[str, bool]]):
+        blocks: List[Tuple[bool, IgnoreMatcher]] = []
+        run: List[str] = []
+        for idx, (pattern, negated) in enumerate(rules):
+            run.append(pattern)
+            if idx == len(rules) - 1 or rules[idx + 1][1] != negated:
+                blocks.append((negated, IgnoreMatcher(run)))
+                run = []
+        self.blocks = tuple(blocks)
+
+    def verdict(self, parent: str, name: str, is_dir: bool) -> Optional[bool]:
+        """True：忽略；False：被否定規則重新納入；None：沒有規則符合。"""
+        for negated, block in reversed(self.blocks):
+            if block.ignores(parent, name, is_dir):
+                return not negated
+        return None
+
+
+# 已編譯的 .gitignore：絕對路徑 -> ((mtime_ns, size), 規則)；跨呼叫共用，內容變了才重新編譯。
+_compiled_gitignores: Dict[str, Tuple[Tuple[int, int], GitignoreFile]] = {}
+_compiled_lock = threading.Lock()
+
+
+def load_gitignore(path: str) -> Tuple[Optional[Tuple[int, int]], Optional[GitignoreFile]]:
+    """讀取一個 .gitignore，回傳 (戳記, 規則)；不存在或讀不到時回傳 (None, None)。"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        with _compiled_lock:
+            _compiled_gitignores.pop(path, None)
+        return None, None
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _compiled_lock:
+        cached = _compiled_gitignores.get(path)
+    if cached is not None and cached[0] == stamp:
+        return stamp, cached[1]
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            compiled = GitignoreFile(parse_gitignore(f.read()))
+    except OSError:
+        return None, None
+    with _compiled_lock:
+        _compiled_gitignores[path] = (stamp, compiled)
+    return stamp, compiled
+
+
+def _parent_dir(parent: str) -> str:
+    """'src/core/' -> 'src/'；頂層資料夾的上一層是根 ""。"""
+    head = parent.rstrip("/").rpartition("/")[0]
+    return head + "/" if head else ""
+
+
+class GitignoreMatcher:
+    """
+    固定的忽略規則（base）加上專案內各層 .gitignore 的比對器，介面與 IgnoreMatcher 相同。
+
+    - 固定規則先判斷，.gitignore 的否定規則不能重新納入被固定規則忽略的項目。
+    - 一個資料夾適用的規則鏈（根到該資料夾路上的每個 .gitignore）第一次用到時組合並保留；
+      .gitignore 的內容變動不會反映在同一個實例上，呼叫端每次完整走訪前建立新的實例（由 load_gitignore 沿用編譯結果）。
+    - 被忽略的資料夾不會被下探，因此和 git 一樣，無法以否定規則重新納入其中的項目。
+    - stamps 記錄本實例讀過的每個資料夾的 .gitignore 戳記（沒有檔案記為 None），供增量重繪判斷規則是否改變。
+    """
+
+    reads_gitignore = True
+    has_path_rules = True
+    has_dir_rules = True
+
+    def __init__(self, base: IgnoreMatcher, root: str):
+        self.base = base
+        self.root = root
+        self.patterns = base.patterns
+        self.stamps: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._chains: Dict[str, Tuple[Tuple[str, GitignoreFile], ...]] = {}
+
+    def _chain(self, parent: str) -> Tuple[Tuple[str, GitignoreFile], ...]:
+        """parent 資料夾適用的 (.gitignore 所在資料夾, 規則) 列表，由淺到深。"""
+        chain = self._chains.get(parent)
+        if chain is not None:
+            return chain
+        # 往上找到最近一個已組合的上層（都沒有時從根開始），再逐層往下補齊。
+        missing: List[str] = []
+        key: Optional[str] = parent
+        while key is not None and key not in self._chains:
+            missing.append(key)
+            key = _parent_dir(key) if key else None
+        chain = self._chains[key] if key is not None else ()
+        for key in reversed(missing):
+            stamp, rules = load_gitignore(os.path.join(self.root, *key.split("/"), GITIGNORE_FILENAME))
+            self.stamps[key] = stamp
+            if rules is not None and rules.blocks:
+                chain = chain + ((key, rules),)
+            self._chains[key] = chain
+        return chain
+
+    def stamp(self, parent: str) -> Optional[Tuple[int, int]]:
+        """parent 資料夾目前的 .gitignore 戳記（重新 stat，不使用快取）。"""
+        try:
+            st = os.stat(os.path.join(self.root, *parent.split("/"), GITIGNORE_FILENAME))
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def matches(self, parent: str, name: str) -> bool:
+        return self.base.matches(parent, name)
+
+    def matches_entry(self, parent: str, name: str, is_dir: bool) -> bool:
+        if self.base.matches_entry(parent, name, is_dir):
+            return True
+        for base_dir, rules in reversed(self._chain(parent)):
+            verdict = rules.verdict(parent[len(base_dir):], name, is_dir)
+            if verdict is not None:
+                return verdict
+        return False
+
+    def ignores(self, parent: str, name: str, is_dir: bool) -> bool:
+        return self.matches(parent, name) or self.matches_entry(parent, name, is_dir)
+
+    def hides_contents(self, parent: str) -> bool:
+        # .gitignore 的 'x/**' 可能被之後的否定規則部分納入，只採用固定規則的判斷。
+        return self.base.hides_contents(parent)
+
+    def first_ignored(self, parts: Sequence[str], is_dir: bool = True) -> Optional[int]:
+        parent = ""
+        last = len(parts) - 1
+        for idx, name in enumerate(parts):
+            if self.ignores(parent, name, is_dir or idx < last):
+                return idx
+            parent += name + "/"
+            if idx < last and self.base.hides_contents(parent):
+                return idx + 1
+        return None
+
+    def ignores_path(self, rel_path: str, is_dir: bool = False) -> bool:
+        return self.first_ignored(rel_path.split("/"), is_dir) is not None
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, GitignoreMatcher) and (self.base, self.root) == (other.base, other.root)
+
+    def __hash__(self) -> int:
+        return hash((self.base, self.root))
+
+    def __repr__(self) -> str:
+        return f"GitignoreMatcher({self.base!r}, {self.root!r})"
+
+    def __reduce__(self):
+        # 傳給子行程時只帶設定；對方讀取 .gitignore 時沿用它自己的編譯快取。
+        return GitignoreMatcher, (self.base, self.root)
+
+
+def build_matcher(patterns: Iterable[str], gitignore_root: Optional[str] = None):
+    """固定規則的比對器；提供 gitignore_root 時再加上該目錄以下各層的 .gitignore。"""
+    base = compile_ignore(patterns)
+    if gitignore_root is None:
+        return base
+    return GitignoreMatcher(base, os.path.normpath(gitignore_root))
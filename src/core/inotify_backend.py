@@ -0,0 +1,293 @@
+# ==============================================================================
+# 模組職責：inotify_backend.py
+# - 透過 ctypes 直接呼叫 Linux inotify，為 sentry_worker 提供「事件驅動」的變動偵測。
+# - 不依賴任何第三方套件或外部服務（不需要 watchdog / inotify-tools）。
+# - 只負責把核心事件翻譯成 (event_type, path, is_dir)；節流與快照仍由 sentry_worker 處理。
+#
+# 已知限制：
+# - max_user_watches 用盡時 inotify_add_watch 會回報 ENOSPC，
+#   我們拋出 WatchLimitReached，由呼叫端退回輪詢模式。
+# - 事件佇列溢出（IN_Q_OVERFLOW）時無法得知遺漏了哪些事件，
+#   我們只標記 overflowed，由呼叫端安排一次全量對帳掃描。
+# - WSL 的 /mnt/<drive>（DrvFs / 9p）收不到 Windows 端的寫入事件，
+#   supports_path() 會對這類掛載點回傳 False。
+# ==============================================================================
+
+import os
+import sys
+import errno
+import struct
+import ctypes
+import ctypes.util
+from typing import Dict, List, Tuple, Optional, Iterable, Union
+
+from src.core.ignore_rules import IgnoreMatcher, compile_ignore, relative_dir
+
+# inotify 事件旗標（取自 <sys/inotify.h>）
+IN_MODIFY      = 0x00000002
+IN_ATTRIB      = 0x00000004
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF   = 0x00000800
+IN_Q_OVERFLOW  = 0x00004000
+IN_IGNORED     = 0x00008000
+IN_ONLYDIR     = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR       = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC  = getattr(os, "O_CLOEXEC", 0o2000000)
+
+# 哨兵關心的事件集合：內容變動 + 結構變動 + 監看目錄自身消失。
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK
+)
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+_EVENT_HEADER = struct.Struct("iIII")
+
+# 這些檔案系統上 inotify 不可靠（遠端寫入不會產生事件），一律交給輪詢。
+UNRELIABLE_FSTYPES = {"9p", "drvfs", "cifs", "smb3", "nfs", "nfs4", "fuse.sshfs", "virtiofs"}
+
+# 單次讀取的緩衝大小，足以容納數百個事件。
+_READ_BUFFER_SIZE = 64 * 1024
+
+
+class WatchLimitReached(Exception):
+    """inotify 監看數量達到 max_user_watches 上限（ENOSPC），呼叫端應退回輪詢。"""
+    pass
+
+
+def _load_libc():
+    """載入 libc 並確認 inotify 相關符號存在；不支援時回傳 None。"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        # 存取屬性本身就能確認符號存在
+        libc.inotify_init1
+        libc.inotify_add_watch
+        libc.inotify_rm_watch
+    except (OSError, AttributeError):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_add_watch.restype = ctypes.c_int
+    libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    libc.inotify_rm_watch.restype = ctypes.c_int
+    return libc
+
+
+_libc = _load_libc()
+
+
+def is_available() -> bool:
+    """當前平台是否能使用 inotify。"""
+    return _libc is not None
+
+
+def _mount_fstype(path: str) -> Optional[str]:
+    """從 /proc/mounts 找出 path 所在掛載點的檔案系統類型（取最長前綴）。"""
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as f:
+            mounts = [line.split() for line in f]
+    except OSError:
+        return None
+
+    real = os.path.realpath(path)
+    best_len = -1
+    best_type = None
+    for fields in mounts:
+        if len(fields) < 3:
+            continue
+        # /proc/mounts 會把空白轉義成 \040
+        mount_point = fields[1].replace("\\040", " ")
+        if real == mount_point or real.startswith(mount_point.rstrip("/") + "/"):
+            if len(mount_point) > best_len:
+                best_len = len(mount_point)
+                best_type = fields[2]
+    return best_type
+
+
+def supports_path(path: str) -> bool:
+    """inotify 是否可用且對該路徑所在的檔案系統可靠。"""
+    if not is_available():
+        return False
+    return _mount_fstype(path) not in UNRELIABLE_FSTYPES
+
+
+class InotifyWatcher:
+    """
+    以遞迴方式監看整棵目錄樹的 inotify 包裝器。
+
+    - add_tree(path) 為 path 以下所有（未被忽略的）目錄建立監看。
+    - read_events() 以非阻塞方式讀空核心佇列，回傳 (event_type, path, is_dir) 列表，
+      event_type 與 FileSnapshot 的差異事件同名：'created' / 'modified' / 'deleted'。
+    - 新建立的目錄會自動補上監看；呼叫端仍需自行掃描該子樹，
+      以補上「監看建立前就已寫入」的檔案。
+    - ignore 為忽略規則（IgnoreMatcher 或名稱列表），路徑規則以 root 為基準；
+      未指定 root 時以第一次 add_tree 的目錄為準。
+    """
+
+    def __init__(self, ignore: Union[IgnoreMatcher, Iterable[str]] = (), root: Optional[str] = None):
+        if _libc is None:
+            raise OSError(errno.ENOSYS, "當前平台不支援 inotify")
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.fd = fd
+        self.ignore = compile_ignore(ignore)
+        self.root = root
+        self.wd_to_path: Dict[int, str] = {}
+        self.path_to_wd: Dict[str, int] = {}
+        # 佇列溢出旗標：由呼叫端讀取後自行清除。
+        self.overflowed = False
+
+    # --- 監看管理 ---
+
+    def _add_watch(self, path: str) -> None:
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise WatchLimitReached(f"max_user_watches 已用盡（監看數: {len(self.wd_to_path)}）")
+            # 目錄在建立監看前就消失，或不是目錄：直接略過。
+            if err in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return
+            raise OSError(err, os.strerror(err), path)
+        self.wd_to_path[wd] = path
+        self.path_to_wd[path] = wd
+
+    def add_tree(self, root: str) -> int:
+        """為 root 及其所有子目錄建立監看，回傳新增的監看數量。"""
+        if self.root is None:
+            self.root = root
+        added = 0
+        for current, dirs, _ in os.walk(root):
+            parent = self._rel_dir(current)
+            if self.ignore.hides_contents(parent):
+                dirs[:] = []
+            else:
+                dirs[:] = [d for d in dirs if not self.ignore.ignores(parent, d, True)]
+            if current in self.path_to_wd:
+                continue
+            self._add_watch(current)
+            added += 1
+        return added
+
+    def _forget_tree(self, root: str) -> None:
+        """移除 root 以下所有監看記錄（核心端的監看會隨目錄刪除自動失效）。"""
+        prefix = root.rstrip(os.sep) + os.sep
+        for path in [p for p in self.path_to_wd if p == root or p.startswith(prefix)]:
+            wd = self.path_to_wd.pop(path)
+            self.wd_to_path.pop(wd, None)
+            _libc.inotify_rm_watch(self.fd, wd)
+
+    def _rel_dir(self, path: str) -> str:
+        """監看目錄相對於 root 的路徑（比對路徑規則用）；沒有路徑規則時不必計算。"""
+        if not self.ignore.has_path_rules or self.root is None:
+            return ""
+        return relative_dir(self.root, path)
+
+    @property
+    def watch_count(self) -> int:
+        return len(self.wd_to_path)
+
+    # --- 事件讀取 ---
+
+    def _read_raw(self) -> bytes:
+        chunks = []
+        while True:
+            try:
+                data = os.read(self.fd, _READ_BUFFER_SIZE)
+            except BlockingIOError:
+                break
+            except InterruptedError:
+                continue
+            if not data:
+                break
+            chunks.append(data)
+        return b"".join(chunks)
+
+    def read_events(self) -> List[Tuple[str, str, bool]]:
+        """
+        非阻塞讀取目前累積的所有事件。
+
+        回傳：[(event_type, full_path, is_dir), ...]
+        若遇到新建目錄，會立即為其補上監看（可能拋出 WatchLimitReached）。
+        """
+        raw = self._read_raw()
+        results: List[Tuple[str, str, bool]] = []
+        new_dirs: List[str] = []
+        offset = 0
+        size = len(raw)
+
+        while offset + _EVENT_HEADER.size <= size:
+            wd, mask, _cookie, name_len = _EVENT_HEADER.unpack_from(raw, offset)
+            offset += _EVENT_HEADER.size
+            name = raw[offset:offset + name_len].rstrip(b"\0")
+            offset += name_len
+
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+
+            base = self.wd_to_path.get(wd)
+            if base is None:
+                continue
+
+            if mask & IN_IGNORED:
+                # 核心已自動移除這個監看（目錄被刪除或卸載）
+                self.wd_to_path.pop(wd, None)
+                if self.path_to_wd.get(base) == wd:
+                    self.path_to_wd.pop(base, None)
+                continue
+
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                # 目錄本身的消失由父目錄的 DELETE / MOVED_FROM 回報，這裡只清理記錄。
+                self._forget_tree(base)
+                continue
+
+            if not name:
+                continue
+
+            fname = os.fsdecode(name)
+            is_dir = bool(mask & IN_ISDIR)
+            parent = self._rel_dir(base)
+            if self.ignore.ignores(parent, fname, is_dir) or self.ignore.hides_contents(parent):
+                continue
+
+            full_path = os.path.join(base, fname)
+
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                results.append(("created", full_path, is_dir))
+                if is_dir:
+                    new_dirs.append(full_path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                results.append(("deleted", full_path, is_dir))
+                if is_dir:
+                    self._forget_tree(full_path)
+            elif mask & (IN_MODIFY | IN_ATTRIB):
+                if not is_dir:
+                    results.append(("modified", full_path, False))
+
+        for new_dir in new_dirs:
+            if os.path.isdir(new_dir):
+                self.add_tree(new_dir)
+
+        return results
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.fd = -1
+            self.wd_to_path.clear()
+            self.path_to_wd.clear()
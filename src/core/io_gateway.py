@@ -29,8 +29,8 @@ def safe_read_modify_write(
     # --- 1. 決定 temp 三大族譜中的實際落點 ---
     project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 
-    # temp 根目錄（之後還會放 sentry、projects 等）
-    temp_root = os.path.join(project_root, 'temp')
+    # temp 根目錄（之後還會放 sentry、projects 等）；測試時以 TEST_TEMP_DIR 改到沙盒，與 daemon.TEMP_DIR 一致
+    temp_root = os.environ.get('TEST_TEMP_DIR') or os.path.join(project_root, 'temp')
     os.makedirs(temp_root, exist_ok=True)
 
     # lists/：給全局名單 / 設定用（例如 projects.json）
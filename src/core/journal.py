@@ -0,0 +1,300 @@
+# ==============================================================================
+# 模組職責：journal.py
+# - 哨兵的變動日誌（append-only、二進位），讓下游以游標增量讀取偵測到的變動，
+#   不必再解析文字日誌。
+# - 位置：temp/projects/<uuid>/（與 snapshot_store 的 checkpoint 同目錄）。
+# - 唯一寫入者是該專案的哨兵；daemon 只讀。讀取端忽略尾端寫到一半的紀錄。
+#
+# 檔案格式（little-endian）：
+#   sentry_journal.bin   magic(4) = b"LJNL" | version(u16) | journal_id(8)
+#                        | 紀錄 * N，每筆 = body_len(u16) | wall_time(f64) | type(u8) | path_id(u32) | dest_id(u32)
+#   sentry_journal.idx   u64 * ⌈N / INDEX_STRIDE⌉：第 k 筆為第 k * INDEX_STRIDE 筆紀錄的位移
+#   sentry_paths.bin     路徑字典：body_len(u32) | UTF-8 路徑，path_id 即出現順序
+#   sentry_paths.idx     u64 * 路徑數：每條路徑的位移
+#
+# 游標為 "<journal_id>:<序號>"；日誌被刪除重建後 journal_id 改變，舊游標自動從頭讀起。
+# 從游標讀取只需一次索引查詢 + 最多 INDEX_STRIDE - 1 筆略過，成本為 O(新事件)。
+# ==============================================================================
+
+import os
+import struct
+from typing import Dict, IO, List, Optional, Tuple
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+# 測試時以 TEST_TEMP_DIR 改到沙盒（與 snapshot_store 相同）。
+TEMP_PROJECTS_DIR = os.path.join(os.environ.get('TEST_TEMP_DIR') or os.path.join(project_root, 'temp'), 'projects')
+
+JOURNAL_FILENAME = "sentry_journal.bin"
+JOURNAL_INDEX_FILENAME = "sentry_journal.idx"
+PATHS_FILENAME = "sentry_paths.bin"
+PATHS_INDEX_FILENAME = "sentry_paths.idx"
+MAGIC = b"LJNL"
+FORMAT_VERSION = 1
+# 每隔幾筆紀錄寫一次位移索引。
+INDEX_STRIDE = 256
+# 單次讀取最多回傳的事件數。
+DEFAULT_READ_LIMIT = 1000
+
+EVENT_TYPES = ('created', 'modified', 'deleted', 'moved')
+_TYPE_CODES = {name: code for code, name in enumerate(EVENT_TYPES, start=1)}
+_NO_PATH = 0xFFFFFFFF
+
+_HEADER = struct.Struct("<4sH8s")
+_BODY = struct.Struct("<dBII")
+_RECORD_LEN = struct.Struct("<H")
+_PATH_LEN = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+
+
+def journal_dir(project_uuid: str) -> str:
+    return os.path.join(TEMP_PROJECTS_DIR, project_uuid)
+
+
+def _read_u64(f: IO[bytes], index: int) -> Optional[int]:
+    f.seek(index * _U64.size)
+    raw = f.read(_U64.size)
+    return _U64.unpack(raw)[0] if len(raw) == _U64.size else None
+
+
+def _load_offsets(path: str) -> List[int]:
+    """讀取整個位移索引；尾端不完整的項目捨棄。"""
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except OSError:
+        return []
+    usable = len(raw) - len(raw) % _U64.size
+    return [value for (value,) in _U64.iter_unpack(raw[:usable])]
+
+
+def _rewrite_offsets(path: str, offsets: List[int]) -> None:
+    with open(path, "wb") as f:
+        f.write(b"".join(_U64.pack(value) for value in offsets))
+
+
+class ChangeJournal:
+    """
+    一個專案的變動日誌寫入端（由哨兵持有）。
+
+    開啟時會修復上次中斷留下的半筆紀錄與多出來的索引項目，並把路徑字典載入記憶體，
+    之後每筆事件只追加固定 19 bytes（新路徑另外追加一次字串）。
+    """
+
+    def __init__(self, project_uuid: str, directory: Optional[str] = None):
+        self.directory = directory or journal_dir(project_uuid)
+        os.makedirs(self.directory, exist_ok=True)
+        self.path_ids: Dict[str, int] = {}
+        self._paths, self._paths_index = self._open_paths()
+        self._journal, self._index, self.journal_id, self.count = self._open_journal()
+
+    def _open_paths(self) -> Tuple[IO[bytes], IO[bytes]]:
+        """載入路徑字典，截掉沒有對應索引（或寫到一半）的尾端。"""
+        paths_file = os.path.join(self.directory, PATHS_FILENAME)
+        index_file = os.path.join(self.directory, PATHS_INDEX_FILENAME)
+        offsets = _load_offsets(index_file)
+        try:
+            with open(paths_file, "rb") as f:
+                raw = f.read()
+        except OSError:
+            raw = b""
+        valid_end = 0
+        for path_id, offset in enumerate(offsets):
+            if offset != valid_end or offset + _PATH_LEN.size > len(raw):
+                del offsets[path_id:]
+                break
+            (length,) = _PATH_LEN.unpack_from(raw, offset)
+            end = offset + _PATH_LEN.size + length
+            if end > len(raw):
+                del offsets[path_id:]
+                break
+            self.path_ids[raw[offset + _PATH_LEN.size:end].decode("utf-8", "surrogateescape")] = path_id
+            valid_end = end
+        _rewrite_offsets(index_file, offsets)
+        paths = open(paths_file, "ab")
+        paths.truncate(valid_end)
+        paths.seek(0, os.SEEK_END)
+        return paths, open(index_file, "ab")
+
+    def _open_journal(self) -> Tuple[IO[bytes], IO[bytes], bytes, int]:
+        """開啟（或建立）日誌；從最後一個索引點往後數出紀錄數（順便補齊缺少的索引），截掉寫到一半的紀錄。"""
+        journal_file = os.path.join(self.directory, JOURNAL_FILENAME)
+        index_file = os.path.join(self.directory, JOURNAL_INDEX_FILENAME)
+        header = None
+        try:
+            with open(journal_file, "rb") as f:
+                header = f.read(_HEADER.size)
+        except OSError:
+            pass
+        if header is None or len(header) != _HEADER.size or _HEADER.unpack(header)[:2] != (MAGIC, FORMAT_VERSION):
+            # 不存在、損壞或格式不符：建立新日誌（新的 journal_id 讓舊游標從頭讀起）。
+            journal_id = os.urandom(8)
+            with open(journal_file, "wb") as f:
+                f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, journal_id))
+            _rewrite_offsets(index_file, [])
+            return open(journal_file, "ab"), open(index_file, "ab"), journal_id, 0
+
+        journal_id = _HEADER.unpack(header)[2]
+        size = os.path.getsize(journal_file)
+        offsets = _load_offsets(index_file)
+        # 索引先於紀錄寫入：指向檔尾（或之外）的項目代表那筆紀錄沒寫成。
+        while offsets and offsets[-1] >= size:
+            offsets.pop()
+        start = offsets[-1] if offsets else _HEADER.size
+        count = (len(offsets) - 1) * INDEX_STRIDE if offsets else 0
+        with open(journal_file, "rb") as f:
+            f.seek(start)
+            tail = f.read()
+        position = 0
+        while position + _RECORD_LEN.size <= len(tail):
+            (length,) = _RECORD_LEN.unpack_from(tail, position)
+            if position + _RECORD_LEN.size + length > len(tail):
+                break
+            if count % INDEX_STRIDE == 0 and count // INDEX_STRIDE == len(offsets):
+                offsets.append(start + position)
+            position += _RECORD_LEN.size + length
+            count += 1
+        _rewrite_offsets(index_file, offsets)
+        journal = open(journal_file, "ab")
+        journal.truncate(start + position)
+        journal.seek(0, os.SEEK_END)
+        return journal, open(index_file, "ab"), journal_id, count
+
+    @property
+    def cursor(self) -> str:
+        """指向目前日誌結尾的游標。"""
+        return f"{self.journal_id.hex()}:{self.count}"
+
+    def _path_id(self, path: str) -> int:
+        path_id = self.path_ids.get(path)
+        if path_id is None:
+            path_id = self.path_ids[path] = len(self.path_ids)
+            raw = path.encode("utf-8", "surrogateescape")
+            self._paths_index.write(_U64.pack(self._paths.tell()))
+            self._paths.write(_PATH_LEN.pack(len(raw)) + raw)
+        return path_id
+
+    def append(self, events, wall_time: float) -> int:
+        """追加一批事件（需有 src_path / event_type，moved 另有 dest_path）；回傳寫入筆數。"""
+        records: List[bytes] = []
+        for event in events:
+            code = _TYPE_CODES.get(event.event_type)
+            if code is None:
+                continue
+            dest = getattr(event, 'dest_path', None)
+            body = _BODY.pack(wall_time, code, self._path_id(event.src_path),
+                              _NO_PATH if dest is None else self._path_id(dest))
+            records.append(_RECORD_LEN.pack(len(body)) + body)
+        if not records:
+            return 0
+        # 路徑字典先落盤，讀取端看到紀錄時一定查得到路徑。
+        self._paths.flush()
+        self._paths_index.flush()
+        offset = self._journal.tell()
+        index_entries: List[bytes] = []
+        for record in records:
+            if self.count % INDEX_STRIDE == 0:
+                index_entries.append(_U64.pack(offset))
+            offset += len(record)
+            self.count += 1
+        # 索引先於紀錄寫入：中斷時只會留下指向檔尾的索引，開啟時會被修掉。
+        if index_entries:
+            self._index.write(b"".join(index_entries))
+            self._index.flush()
+        self._journal.write(b"".join(records))
+        self._journal.flush()
+        return len(records)
+
+    def close(self) -> None:
+        for f in (self._paths, self._paths_index, self._index, self._journal):
+            f.close()
+
+
+def parse_cursor(cursor: Optional[str]) -> Tuple[Optional[bytes], int]:
+    """把游標拆成 (journal_id, 序號)；空字串或格式不對時從頭讀起。"""
+    if not cursor:
+        return None, 0
+    journal_hex, _, seq = cursor.partition(":")
+    try:
+        return bytes.fromhex(journal_hex), max(int(seq), 0)
+    except ValueError:
+        return None, 0
+
+
+def read_since(project_uuid: str, cursor: Optional[str] = None, limit: int = DEFAULT_READ_LIMIT,
+               directory: Optional[str] = None) -> Dict:
+    """
+    讀取游標之後的事件。
+
+    回傳 {"cursor": 下一次讀取用的游標, "events": [...], "reset": 游標是否已失效（從頭讀起）}。
+    每個事件為 {"seq", "time", "type", "path"}，moved 另有 "dest_path"。日誌不存在時回傳空結果。
+    """
+    directory = directory or journal_dir(project_uuid)
+    journal_id, seq = parse_cursor(cursor)
+    try:
+        journal = open(os.path.join(directory, JOURNAL_FILENAME), "rb")
+    except OSError:
+        return {"cursor": cursor or "", "events": [], "reset": False}
+    with journal:
+        header = journal.read(_HEADER.size)
+        if len(header) != _HEADER.size or _HEADER.unpack(header)[:2] != (MAGIC, FORMAT_VERSION):
+            return {"cursor": cursor or "", "events": [], "reset": False}
+        current_id = _HEADER.unpack(header)[2]
+        reset = journal_id is not None and journal_id != current_id
+        if journal_id != current_id:
+            seq = 0
+
+        # 由索引跳到游標所在的區段，再略過區段內已讀過的紀錄。
+        if seq >= INDEX_STRIDE:
+            try:
+                with open(os.path.join(directory, JOURNAL_INDEX_FILENAME), "rb") as index:
+                    start = _read_u64(index, seq // INDEX_STRIDE)
+            except OSError:
+                start = None
+            if start is None:
+                # 游標之後還沒有新區段：沒有新事件（或游標超出日誌，視為已讀到結尾）。
+                return {"cursor": f"{current_id.hex()}:{seq}", "events": [], "reset": reset}
+            journal.seek(start)
+            position = seq - seq % INDEX_STRIDE
+        else:
+            position = 0
+        while position < seq:
+            raw = journal.read(_RECORD_LEN.size)
+            if len(raw) != _RECORD_LEN.size:
+                return {"cursor": f"{current_id.hex()}:{seq}", "events": [], "reset": reset}
+            journal.seek(_RECORD_LEN.unpack(raw)[0], os.SEEK_CUR)
+            position += 1
+
+        events: List[Dict] = []
+        paths: Dict[int, str] = {}
+        try:
+            path_file = open(os.path.join(directory, PATHS_FILENAME), "rb")
+            path_index = open(os.path.join(directory, PATHS_INDEX_FILENAME), "rb")
+        except OSError:
+            return {"cursor": f"{current_id.hex()}:{position}", "events": [], "reset": reset}
+        with path_file, path_index:
+
+            def resolve(path_id: int) -> str:
+                path = paths.get(path_id)
+                if path is None:
+                    offset = _read_u64(path_index, path_id)
+                    path_file.seek(offset)
+                    (length,) = _PATH_LEN.unpack(path_file.read(_PATH_LEN.size))
+                    path = paths[path_id] = path_file.read(length).decode("utf-8", "surrogateescape")
+                return path
+
+            while len(events) < limit:
+                raw = journal.read(_RECORD_LEN.size)
+                if len(raw) != _RECORD_LEN.size:
+                    break
+                (length,) = _RECORD_LEN.unpack(raw)
+                body = journal.read(length)
+                # 寫入端正在追加的半筆紀錄：留到下一次讀取。
+                if len(body) != length:
+                    break
+                wall_time, code, path_id, dest_id = _BODY.unpack_from(body)
+                event = {"seq": position, "time": wall_time, "type": EVENT_TYPES[code - 1], "path": resolve(path_id)}
+                if dest_id != _NO_PATH:
+                    event["dest_path"] = resolve(dest_id)
+                events.append(event)
+                position += 1
+    return {"cursor": f"{current_id.hex()}:{position}", "events": events, "reset": reset}
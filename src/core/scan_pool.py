@@ -0,0 +1,52 @@
+# ==============================================================================
+# 模組職責：scan_pool.py
+# - 為 sentry_worker（FileSnapshot）與 engine（目錄樹生成）提供「頂層子樹並行掃描」的執行器。
+# - 只負責解析設定、決定要不要開池、開哪一種池；
+#   合併順序由呼叫端負責：一律按子樹名稱順序提交、依提交順序收回，輸出與單執行緒完全一致。
+#
+# projects.json 設定（皆為選填）：
+#   "scan_workers": 1        -> 1（預設）代表不開池，維持單執行緒掃描
+#   "scan_pool": "thread"    -> "thread"（預設，適合 I/O 延遲為主的慢速掛載點）
+#                               或 "process"（適合 CPU 為主的超大型專案）
+# ==============================================================================
+
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_SCAN_WORKERS = 1
+MAX_SCAN_WORKERS = 32
+SCAN_POOL_KINDS = ("thread", "process")
+DEFAULT_SCAN_POOL = "thread"
+
+
+def normalize_scan_settings(workers: Any, kind: Any = None) -> Tuple[int, str]:
+    """把任意來源（JSON / 命令列字串）的設定收斂成 (worker 數, 池類型)；無效值一律退回預設。"""
+    try:
+        count = int(workers)
+    except (TypeError, ValueError):
+        count = DEFAULT_SCAN_WORKERS
+    count = max(1, min(count, MAX_SCAN_WORKERS))
+    pool_kind = kind if kind in SCAN_POOL_KINDS else DEFAULT_SCAN_POOL
+    return count, pool_kind
+
+
+def scan_settings_from_project(project_config: Dict[str, Any]) -> Tuple[int, str]:
+    """從 projects.json 中的單一專案設定讀取掃描並行度。"""
+    return normalize_scan_settings(
+        project_config.get("scan_workers", DEFAULT_SCAN_WORKERS),
+        project_config.get("scan_pool", DEFAULT_SCAN_POOL),
+    )
+
+
+def open_pool(workers: int, kind: str = DEFAULT_SCAN_POOL) -> Optional[Executor]:
+    """workers <= 1 時回傳 None（呼叫端走單執行緒路徑），否則建立對應的執行器。"""
+    if workers <= 1:
+        return None
+    if kind == "process":
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+
+
+def is_process_pool(pool: Optional[Executor]) -> bool:
+    """子行程池的任務參數需要序列化，呼叫端據此決定要不要只傳子樹所需的最小資料。"""
+    return isinstance(pool, ProcessPoolExecutor)
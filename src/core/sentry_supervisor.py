@@ -0,0 +1,241 @@
+# ==============================================================================
+# 模組職責：sentry_supervisor.py
+# - 「單一監督行程」模式：一個 Python 行程、每個專案一條執行緒，
+#   取代「每個專案一個 sentry_worker.py 行程」。
+# - 每條執行緒執行 sentry_worker.run_sentry()，各自持有自己的節流器、快照、監看器與背景更新器；
+#   監督行程只負責「誰該跑、誰該停」。
+# - 與 daemon 的契約維持不變（list_projects / stop_sentry / get_log 照常運作）：
+#     temp/sentry/<監督行程 PID>.<uuid>.sentry   戶籍文件，內容為 uuid
+#     temp/sentry/<監督行程 PID>.<uuid>.args     哨兵參數：{"args": [...], "log_file": 路徑}
+#     /tmp/<uuid>.sentry_status                    由各專案執行緒照常寫入
+#     logs/<專案名>.log                            依執行緒名稱把輸出導向各專案日誌
+# - 每秒對帳一次戶籍目錄：新登記 → 啟動；戶籍被刪除（stop_sentry）→ 停止；參數變了 → 重啟。
+#   專案執行緒自行崩潰時註銷它的戶籍，行為與獨立哨兵行程死亡一致。
+# - 沒有任何專案超過 IDLE_EXIT_SECONDS 秒就自行退出，下次 start_sentry 時由 daemon 重新拉起。
+#
+# 啟用方式：環境變數 LAPLACE_SENTRY_MODE=supervisor（由 daemon.handle_start_sentry 判斷）。
+# ==============================================================================
+
+import os
+import sys
+import json
+import time
+import signal
+import threading
+from typing import IO, Dict, List, Optional, Tuple
+
+# HACK: 監督行程以腳本方式啟動，需手動把專案根目錄加入搜尋路徑才能導入 src.core。
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.core import daemon
+from src.core import sentry_worker
+
+# 戶籍目錄對帳間隔（秒）：stop_sentry 之後最多這麼久，專案就會停止。
+RESCAN_INTERVAL_SECONDS = 1.0
+# 沒有任何專案多久之後自行退出（秒）。
+IDLE_EXIT_SECONDS = 30.0
+# 停止專案時等待執行緒收尾的最長時間（秒）：包含等待進行中的背景更新。
+STOP_JOIN_TIMEOUT_SECONDS = sentry_worker.UPDATE_SHUTDOWN_TIMEOUT_SECONDS + 5.0
+
+# 執行緒名稱 -> 該專案的日誌檔；未登記的執行緒寫入監督行程自己的輸出。
+_log_routes: Dict[str, IO[str]] = {}
+
+
+class ThreadRoutedStream:
+    """依目前執行緒名稱把寫入導向對應的日誌檔，讓 run_sentry 內既有的 print 不必改動。"""
+
+    def __init__(self, fallback: IO[str]):
+        self.fallback = fallback
+
+    def _target(self) -> IO[str]:
+        return _log_routes.get(threading.current_thread().name, self.fallback)
+
+    def write(self, text: str) -> int:
+        try:
+            return self._target().write(text)
+        except ValueError:
+            # 專案日誌已關閉（逾時仍未結束的背景更新還在輸出），改寫到監督行程日誌。
+            return self.fallback.write(text)
+
+    def flush(self) -> None:
+        try:
+            self._target().flush()
+        except ValueError:
+            self.fallback.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.fallback, name)
+
+
+class ProjectRunner:
+    """一個專案的監控執行緒（sentry_worker.run_sentry）與它的日誌檔。"""
+
+    def __init__(self, sentry_uuid: str, args: List[str], log_path: Optional[str]):
+        self.uuid = sentry_uuid
+        self.args = args
+        self.log_path = log_path
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=sentry_worker.run_sentry, args=(args, self.stop),
+                                       name=f"sentry-{sentry_uuid}", daemon=True)
+        # 專案執行緒與它的背景更新執行緒（BackgroundUpdater）都導向同一個日誌檔。
+        self.thread_names = (self.thread.name, f"sentry-update-{sentry_uuid}")
+        self.log_file = open(log_path, 'a', encoding='utf-8') if log_path else None
+        if self.log_file is not None:
+            for name in self.thread_names:
+                _log_routes[name] = self.log_file
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def close(self) -> None:
+        """執行緒結束後解除日誌導向並關閉日誌檔。"""
+        if self.log_file is None:
+            return
+        for name in self.thread_names:
+            if _log_routes.get(name) is self.log_file:
+                del _log_routes[name]
+        self.log_file.close()
+        self.log_file = None
+
+
+class SentrySupervisor:
+    """以戶籍目錄為唯一事實來源，維持「已登記專案 = 正在執行的專案執行緒」。"""
+
+    def __init__(self, pid: Optional[int] = None):
+        self.pid = pid if pid is not None else os.getpid()
+        self.runners: Dict[str, ProjectRunner] = {}
+        self.stopping: List[ProjectRunner] = []
+
+    def registered(self) -> Dict[str, Tuple[List[str], Optional[str]]]:
+        """讀取登記在本行程 PID 名下的專案：uuid -> (哨兵參數, 日誌路徑)。"""
+        result: Dict[str, Tuple[List[str], Optional[str]]] = {}
+        prefix = f"{self.pid}."
+        try:
+            filenames = os.listdir(daemon.SENTRY_DIR)
+        except OSError:
+            return result
+        for filename in filenames:
+            if not (filename.startswith(prefix) and filename.endswith('.sentry')):
+                continue
+            sentry_uuid = filename[len(prefix):-len('.sentry')]
+            try:
+                with open(daemon.get_supervised_args_file_path(self.pid, sentry_uuid), 'r', encoding='utf-8') as f:
+                    payload = json.load(f)
+            except (OSError, ValueError):
+                # 參數檔不存在或損壞：視為尚未登記完成，下一輪再看。
+                continue
+            args = payload.get('args') if isinstance(payload, dict) else None
+            if not isinstance(args, list) or len(args) < 2:
+                continue
+            result[sentry_uuid] = ([str(a) for a in args], payload.get('log_file'))
+        return result
+
+    def reconcile(self) -> None:
+        """對帳一次：收掉已結束的執行緒、停止被註銷的專案、啟動新登記的專案。"""
+        desired = self.registered()
+        ts = time.strftime('%Y-%m-%d %H:%M:%S')
+
+        # 收掉已經停下來的執行緒。
+        still_stopping = []
+        for runner in self.stopping:
+            if runner.thread.is_alive():
+                still_stopping.append(runner)
+            else:
+                runner.close()
+        self.stopping = still_stopping
+
+        for sentry_uuid, runner in list(self.runners.items()):
+            wanted = desired.get(sentry_uuid)
+            # 執行緒自行結束（崩潰）：比照獨立哨兵死亡，註銷戶籍，list_projects 會顯示為停止。
+            if not runner.thread.is_alive():
+                del self.runners[sentry_uuid]
+                runner.close()
+                if wanted is not None and wanted[0] == runner.args:
+                    print(f"[{ts}] [Supervisor] 專案 {sentry_uuid} 的哨兵已結束，註銷戶籍", flush=True)
+                    daemon._remove_supervised_registration(
+                        daemon.get_supervised_pid_file_path(self.pid, sentry_uuid))
+                    desired.pop(sentry_uuid)
+                continue
+            # 戶籍被刪除或參數改變：通知停止，等它收尾後再決定是否重啟。
+            if wanted != (runner.args, runner.log_path):
+                reason = "戶籍已註銷" if wanted is None else "參數已變更，將重新啟動"
+                print(f"[{ts}] [Supervisor] 停止專案 {sentry_uuid}（{reason}）", flush=True)
+                runner.stop.set()
+                del self.runners[sentry_uuid]
+                self.stopping.append(runner)
+
+        # 啟動新登記的專案（同一專案的舊執行緒還在收尾時，下一輪再啟動，避免兩者同時寫 checkpoint）。
+        draining = {runner.uuid for runner in self.stopping}
+        for sentry_uuid, (args, log_path) in desired.items():
+            if sentry_uuid in self.runners or sentry_uuid in draining:
+                continue
+            try:
+                runner = ProjectRunner(sentry_uuid, args, log_path)
+            except OSError as e:
+                print(f"[{ts}] [Supervisor] 無法開啟專案 {sentry_uuid} 的日誌 ({e})，略過", flush=True)
+                continue
+            print(f"[{ts}] [Supervisor] 啟動專案 {sentry_uuid}（{args[1]}）", flush=True)
+            runner.start()
+            self.runners[sentry_uuid] = runner
+
+    def run(self, stop: threading.Event) -> None:
+        """主迴圈：定期對帳，閒置太久就退出。"""
+        idle_since: Optional[float] = None
+        while True:
+            self.reconcile()
+            if self.runners or self.stopping:
+                idle_since = None
+            else:
+                if idle_since is None:
+                    idle_since = time.monotonic()
+                if time.monotonic() - idle_since >= IDLE_EXIT_SECONDS and self._release():
+                    return
+            if stop.wait(RESCAN_INTERVAL_SECONDS):
+                return
+
+    def _release(self) -> bool:
+        """
+        註銷自己的監督行程登記後再確認一次沒有新專案。
+        daemon 可能剛好在「判定閒置」與「註銷」之間登記了專案，那就重新登記並繼續服務。
+        """
+        daemon.release_supervisor_pid(self.pid)
+        if not self.registered():
+            return True
+        daemon.write_supervisor_pid(self.pid)
+        return False
+
+    def shutdown(self) -> None:
+        """同時通知所有專案停止，再逐一等待收尾（各自寫入 checkpoint）。"""
+        runners = list(self.runners.values()) + self.stopping
+        for runner in runners:
+            runner.stop.set()
+        for runner in runners:
+            runner.thread.join(STOP_JOIN_TIMEOUT_SECONDS)
+            runner.close()
+        self.runners.clear()
+        self.stopping = []
+
+
+def main():
+    # 設定（signal）SIGTERM 轉為 SystemExit，讓所有專案都有機會寫入 checkpoint。
+    signal.signal(signal.SIGTERM, sentry_worker._raise_system_exit)
+    # 把各專案執行緒的輸出導向各自的日誌檔。
+    sys.stdout = ThreadRoutedStream(sys.stdout)
+    sys.stderr = ThreadRoutedStream(sys.stderr)
+
+    supervisor = SentrySupervisor()
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 哨兵監督行程啟動。PID: {supervisor.pid}", flush=True)
+    try:
+        supervisor.run(threading.Event())
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        supervisor.shutdown()
+        daemon.release_supervisor_pid(supervisor.pid)
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 哨兵監督行程結束。", flush=True)
+
+
+if __name__ == "__main__":
+    main()
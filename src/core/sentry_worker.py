@@ -5,16 +5,34 @@ import sys
 import time
 # 導入（import）os 模組。
 import os
+# 導入（import）stat 模組。
+import stat
 # 導入（import）signal 模組。
 import signal
 # 導入（import）json 模組。
 import json
-# 導入（import）subprocess 模組。
-import subprocess
+# 導入（import）threading 模組（背景更新執行緒）。
+import threading
+# 導入（import）struct 模組。
+import struct
+# 從 array 導入（import）緊湊的數值欄位型別。
+from array import array
+# 從 concurrent.futures 導入（import）執行器型別（子樹並行掃描）。
+from concurrent.futures import Executor
 # 從 typing 導入（import）型別提示工具。
-from typing import Set, Dict, List, Tuple
+from typing import Deque, Set, Dict, List, Tuple, Optional
 # 從 datetime 導入（import）時間處理工具。
-from datetime import datetime, timedelta
+from datetime import datetime
+# 從 collections 導入（import）固定長度的環形緩衝（節流器的滑動窗口）。
+from collections import deque
+# 導入（import）heapq 模組（靜默到期時間的最小堆）。
+import heapq
+
+# 嘗試（try）導入 NumPy：有的話用它做整欄向量化比對，沒有就退回 array 模組的區塊比對。
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # --------------------------------------------------------------------------
 # 1. 基礎配置
@@ -36,7 +54,8 @@ if sys.platform == 'win32':
 # 設定（signal）忽略 SIGINT 信號。
 signal.signal(signal.SIGINT, signal.SIG_IGN)
 
-# 定義（define）內部忽略名單。
+# 定義（define）內部忽略名單：這些項目的變動不觸發更新（事件階段剔除）。
+# 掃描本身不剪掉它們：目錄樹仍會顯示這些項目，快取的子樹必須跟得上它們的新增 / 刪除 / 改名。
 SENTRY_INTERNAL_IGNORE = (
     '.sentry_status', 'temp', 'README.md', 'logs', 'data',
     '.git', '__pycache__', '.venv', '.vscode', 'crash_report.txt', 'fault.log'
@@ -47,88 +66,623 @@ SENTRY_INTERNAL_IGNORE = (
 current_dir = os.path.dirname(os.path.abspath(__file__))
 # 獲取（dirname）上一層目錄，定位到專案根目錄。
 project_root = os.path.dirname(os.path.dirname(current_dir))
+# HACK: 哨兵以腳本方式啟動，需手動把專案根目錄加入搜尋路徑才能導入 src.core。
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
 
-def trigger_update_cli(uuid):
-    main_script = os.path.join(project_root, "main.py")
-    cmd = [sys.executable, main_script, "manual_update", uuid]
-    try:
-        # 捕捉 stdout 和 stderr
-        result = subprocess.run(cmd, cwd=project_root, check=True, capture_output=True, text=True, encoding='utf-8')
-        print(f">>> 成功觸發更新指令", flush=True)
-    except subprocess.CalledProcessError as e:
-        # 【關鍵】印出 stderr，讓我們知道 main.py 為什麼死掉
-        print(f"!!! 更新指令執行失敗: {e}", flush=True)
-        print(f"!!! 錯誤詳情 (STDERR): {e.stderr}", flush=True)  
-        print(f"!!! 錯誤詳情 (STDOUT): {e.stdout}", flush=True)  
-    except Exception as e:
-        print(f"!!! 呼叫 CLI 時發生錯誤: {e}", flush=True)
+# 從 src.core 導入（import）inotify 事件後端。
+from src.core import inotify_backend
+# 從 src.core 導入（import）快照 checkpoint 存取工具。
+from src.core import snapshot_store
+# 從 src.core 導入（import）子樹並行掃描的執行器工具。
+from src.core import scan_pool
+# 從 src.core 導入（import）daemon：更新直接在本行程內呼叫 handle_manual_update，不再另起直譯器。
+from src.core import daemon
+# 從 src.core 導入（import）engine：哨兵與目錄樹共用同一份系統預設忽略名單。
+from src.core import engine
+# 從 src.core 導入（import）變動日誌。
+from src.core import journal
+# 從 src.core 導入（import）與 engine / daemon 共用的忽略規則比對器。
+from src.core import ignore_rules
+
+# 編譯（compile）內部忽略名單，作為各掃描函式未指定規則時的預設值。
+SENTRY_INTERNAL_RULES = ignore_rules.compile_ignore(SENTRY_INTERNAL_IGNORE)
+
+# 定義（define）自適應節拍：有變動時回到最快間隔，連續閒置時指數退避到上限（秒）。
+POLL_INTERVAL_MIN_SECONDS = 0.5
+POLL_INTERVAL_MAX_SECONDS = 10.0
+POLL_BACKOFF_FACTOR = 2.0
+# 上限設定允許的最大值（秒），避免設定錯誤讓哨兵幾乎停擺。
+POLL_INTERVAL_CEILING_LIMIT = 300.0
+# 定義（define）更新去抖動：最後一次變動後靜默多久才觸發更新，以及第一次變動後最多等多久（秒）。
+DEBOUNCE_QUIET_SECONDS = 1.5
+DEBOUNCE_MAX_LATENCY_SECONDS = 10.0
+# 定義（define）全量對帳間隔（秒）：事件模式用來補抓 inotify 遺漏的事件，
+# 輪詢模式用來補抓增量掃描看不到的原地修改。
+RECONCILE_INTERVAL_SECONDS = 60
+# 結構模式預設開啟：目錄樹只取決於名稱與目錄結構，內容修改不會反映在輸出上。
+STRUCTURE_ONLY_DEFAULT = True
+# 路徑駐留表允許累積的失效 id 餘裕，超過「2 倍存活檔案數 + 此值」時重建。
+TABLE_COMPACT_SLACK = 4096
+
+# 定義（define）變動風暴：單一節拍的變動數達到門檻即進入風暴模式，之後連續安靜多久（秒）才算平息。
+STORM_EVENT_THRESHOLD = 500
+STORM_CALM_SECONDS = 3.0
+
+# 停機時等待進行中的更新完成的最長時間（秒）；超時則作廢 checkpoint，下次啟動補更新。
+UPDATE_SHUTDOWN_TIMEOUT_SECONDS = 5.0
+
+# 我們定義（def）在本行程內執行一次更新的函式（取代舊版的 main.py manual_update 子行程）。
+# tree_cache / changed_dirs 原樣轉交 daemon：只重繪上次更新後有變動的子樹。
+def run_manual_update(uuid: str, tree_cache: Optional[engine.TreeCache] = None,
+                      changed_dirs: Optional[Set[str]] = None) -> bool:
+    # 遍歷（loop）最多兩次：設定檔剛從備份恢復時自動重試一次（同 main.py 對退出碼 10 的處理）。
+    for attempt in (1, 2):
+        # 嘗試（try）執行更新。
+        try:
+            daemon.handle_manual_update([uuid], tree_cache=tree_cache, changed_dirs=changed_dirs)
+            print(f">>> 成功觸發更新", flush=True)
+            return True
+        # 如果（except）收到數據恢復信號，且還沒重試過...
+        except daemon.DataRestoredFromBackupWarning as e:
+            if attempt == 1:
+                print(f"[Update] 數據已從備份恢復 ({e})，自動重試...", flush=True)
+                continue
+            print(f"!!! 更新執行失敗: {e}", flush=True)
+        # 如果（except）其他錯誤，只記錄，不影響監控。
+        except Exception as e:
+            print(f"!!! 更新執行失敗: {type(e).__name__}: {e}", flush=True)
+            return False
+    # 返回（return）失敗。
+    return False
+
+# 我們定義（class）背景更新器類別。
+class BackgroundUpdater:
+    """
+    在哨兵行程內以一條背景執行緒執行更新，主迴圈送出請求後立刻回到掃描。
+
+    - 同一時間只跑一次更新；更新進行中收到的請求合併成「結束後再跑一次」，
+      因為每次更新都會重新讀取磁碟，補跑一次就涵蓋期間所有變動。
+    - close() 後不再開始新的更新，只等待進行中的那一次。
+    - mark_dirty() 累積自上次更新以來有變動的目錄，更新開始時一次取出交給 engine 增量重繪；
+      更新失敗時丟棄目錄樹快取，下一次改為完整重繪。
+    """
+
+    # 我們定義（def）初始化函式；run 預設為以目錄樹快取執行 run_manual_update，測試可替換。
+    def __init__(self, project_uuid: str, run=None, tree_cache: Optional[engine.TreeCache] = None):
+        # 設定（set）專案 UUID、目錄樹快取與更新函式。
+        self.project_uuid = project_uuid
+        self.tree_cache = tree_cache
+        self._run = run if run is not None else self._run_incremental
+        # 初始化（init）條件變數與狀態旗標。
+        self._cond = threading.Condition()
+        self._requested = False
+        self._running = False
+        self._closed = False
+        # 初始化（init）累積中的變動目錄，以及本次更新取出的變動目錄。
+        self._dirty: Set[str] = set()
+        self._taken: Set[str] = set()
+        # 初始化（init）已完成的更新次數。
+        self.completed = 0
+        # 啟動（start）背景執行緒（daemon：主執行緒結束時不會被它卡住）。
+        self._thread = threading.Thread(target=self._loop, name=f"sentry-update-{project_uuid}", daemon=True)
+        self._thread.start()
+
+    # 我們定義（property）判斷是否還有未完成更新的屬性（排隊中或執行中）。
+    @property
+    def busy(self) -> bool:
+        with self._cond:
+            return self._requested or self._running
+
+    # 我們定義（def）送出更新請求的函式；不會阻塞。
+    def request(self):
+        with self._cond:
+            self._requested = True
+            self._cond.notify_all()
+
+    # 我們定義（def）記錄變動目錄的函式；不觸發更新（被節流器擋下的變動也要記錄，下次更新時一併重繪）。
+    def mark_dirty(self, dirs: Set[str]):
+        if dirs:
+            with self._cond:
+                self._dirty.update(dirs)
+
+    # 我們定義（def）預設的更新函式：帶著本次取出的變動目錄增量重繪。
+    def _run_incremental(self, project_uuid: str):
+        # 如果（if）更新失敗，快取可能漏掉這批變動：丟棄快取，下一次完整重繪。
+        if not run_manual_update(project_uuid, self.tree_cache, self._taken) and self.tree_cache is not None:
+            self.tree_cache.clear()
+
+    # 我們定義（def）背景執行緒的主迴圈。
+    def _loop(self):
+        # 無窮迴圈（while True）。
+        while True:
+            # 等待（wait）新的請求或關閉。
+            with self._cond:
+                while not self._requested and not self._closed:
+                    self._cond.wait()
+                # 如果（if）已關閉，不再開始新的更新。
+                if self._closed:
+                    return
+                # 取出（take）請求與變動目錄：之後再來的請求會合併成下一次更新。
+                self._requested = False
+                self._running = True
+                self._taken, self._dirty = self._dirty, set()
+            # 嘗試（try）執行更新（鎖外執行，主迴圈可以繼續送出請求）。
+            try:
+                self._run(self.project_uuid)
+            # 如果（except）更新函式本身拋錯，只記錄，執行緒繼續服務（快取同樣作廢）。
+            except Exception as e:
+                print(f"!!! 背景更新發生錯誤: {type(e).__name__}: {e}", flush=True)
+                if self.tree_cache is not None:
+                    self.tree_cache.clear()
+            # 最終（finally）清除執行中旗標並通知等待者。
+            finally:
+                with self._cond:
+                    self._running = False
+                    self.completed += 1
+                    self._cond.notify_all()
+
+    # 我們定義（def）等待背景執行緒閒置的函式；返回是否已閒置。
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._requested and not self._running, timeout)
+
+    # 我們定義（def）關閉函式：等待進行中的更新，返回是否沒有遺留未完成的更新。
+    def close(self, timeout: float = UPDATE_SHUTDOWN_TIMEOUT_SECONDS) -> bool:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: not self._running, timeout)
+            return not self._requested and not self._running
+
+# 我們定義（class）靜默路徑字首樹類別。
+class PathPrefixTrie:
+    """
+    以路徑元件為節點的字首樹，存放靜默路徑。
+
+    - `path in trie` 是精確比對（與原本的 set 相同），迭代與 len() 也回傳登記的路徑本身。
+    - covers(path) 判斷 path 是否等於或位於任一登記路徑之下，成本為 O(路徑深度)，
+      與登記數量無關；靜默的爆量目錄底下任意深度的檔案都會被擋下。
+    - 只由 dict 組成，可以直接序列化交給子行程池。
+    """
+
+    # 節點中標記「此處是一條登記路徑」的鍵：NUL 不可能出現在路徑元件中。
+    _TERMINAL = "\0"
+
+    # 我們定義（def）初始化函式。
+    def __init__(self, paths=()):
+        self._root: Dict[str, dict] = {}
+        self._paths: Set[str] = set()
+        for path in paths:
+            self.add(path)
+
+    # 我們定義（def）登記路徑的函式。
+    def add(self, path: str):
+        # 如果（if）已登記，不重複處理。
+        if path in self._paths:
+            return
+        # 沿（loop）路徑元件建立節點，並在最後一個節點打上標記。
+        node = self._root
+        for part in path.split(os.sep):
+            node = node.setdefault(part, {})
+        node[self._TERMINAL] = True
+        self._paths.add(path)
+
+    # 我們定義（def）移除路徑的函式：順便剪掉不再通往任何登記路徑的空節點。
+    def discard(self, path: str):
+        # 如果（if）沒有登記，不處理。
+        if path not in self._paths:
+            return
+        # 記錄（trail）沿途節點，供回溯剪枝。
+        trail = []
+        node = self._root
+        for part in path.split(os.sep):
+            trail.append((node, part))
+            node = node[part]
+        del node[self._TERMINAL]
+        self._paths.discard(path)
+        # 由深到淺（reversed）刪除空節點。
+        for parent, part in reversed(trail):
+            if parent[part]:
+                break
+            del parent[part]
+
+    # 我們定義（def）判斷路徑是否落在任一登記路徑（含自身）之下的函式。
+    def covers(self, path: str) -> bool:
+        # 如果（if）沒有任何登記，直接返回。
+        if not self._paths:
+            return False
+        # 沿（loop）路徑元件往下走，途中遇到標記就代表被覆蓋。
+        node = self._root
+        terminal = self._TERMINAL
+        for part in path.split(os.sep):
+            node = node.get(part)
+            if node is None:
+                return False
+            if terminal in node:
+                return True
+        return False
+
+    # 我們定義（def）精確比對、迭代與計數的函式（與 set 的行為一致）。
+    def __contains__(self, path) -> bool:
+        return path in self._paths
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+# 我們定義（class）分桶滑動窗口累加器類別。
+class SlidingBucketSums:
+    """
+    把窗口切成固定數量的時間桶，各桶記錄 (桶序號, 位元組, 檔案數)，並維持整個窗口的累計值。
+
+    - add() 只更新當前桶與累計值；跨越的舊桶在前進時扣除，最多 BUCKETS 個，每次更新為 O(1)。
+    - 窗口邊緣以桶寬為精度（預設 1/12 窗口），換來不需保存每筆事件。
+    """
+
+    # 每個窗口的桶數。
+    BUCKETS = 12
+    __slots__ = ('width', 'stamps', 'sizes', 'counts', 'total_bytes', 'total_count', 'last')
+
+    # 我們定義（def）初始化函式。
+    def __init__(self, period: float):
+        self.width = period / self.BUCKETS
+        self.stamps = [-1] * self.BUCKETS
+        self.sizes = [0] * self.BUCKETS
+        self.counts = [0] * self.BUCKETS
+        self.total_bytes = 0
+        self.total_count = 0
+        # 記錄（init）最新一個桶的序號。
+        self.last = -1
+
+    # 我們定義（def）前進到指定時間的函式：扣除已滑出窗口的桶。
+    def advance(self, now: float) -> int:
+        # 計算（calc）當前桶序號。
+        index = int(now // self.width)
+        # 如果（if）還在同一個桶（或時鐘倒退），不處理。
+        if index <= self.last:
+            return self.last
+        # 遍歷（loop）從上次到現在跨越的桶（最多 BUCKETS 個），扣除舊值後歸零。
+        for i in range(max(self.last + 1, index - self.BUCKETS + 1), index + 1):
+            slot = i % self.BUCKETS
+            self.total_bytes -= self.sizes[slot]
+            self.total_count -= self.counts[slot]
+            self.stamps[slot], self.sizes[slot], self.counts[slot] = i, 0, 0
+        self.last = index
+        # 返回（return）當前桶序號。
+        return index
+
+    # 我們定義（def）累加一筆成長的函式。
+    def add(self, now: float, size: int, count: int):
+        slot = self.advance(now) % self.BUCKETS
+        self.sizes[slot] += size
+        self.counts[slot] += count
+        self.total_bytes += size
+        self.total_count += count
+
+    # 我們定義（def）判斷整個窗口是否已經沒有任何成長的函式。
+    def idle(self, now: float) -> bool:
+        self.advance(now)
+        return not (self.total_count or self.total_bytes)
+
+    # 我們定義（def）匯出 / 匯入窗口內各桶的函式（時間為桶的起點）。
+    def buckets(self) -> List[Tuple[float, int, int]]:
+        return [(stamp * self.width, self.sizes[i], self.counts[i])
+                for i, stamp in enumerate(self.stamps)
+                if stamp > self.last - self.BUCKETS and (self.sizes[i] or self.counts[i])]
 
 # 3. 智能大腦 (SmartThrottler - 完整版回歸)
 # 我們定義（class）智能節流器類別。
 class SmartThrottler:
+    """
+    R1（單檔過熱）/ R3（爆量創建）/ R4（體積異常）/ R5（目錄膨脹）四條規則的滑動窗口節流器。
+
+    - 每個路徑一個固定長度的環形緩衝（deque(maxlen)），時間戳一律是 time.monotonic() 秒數：
+      R1 / R3 只需要「窗口內第 N 筆」，緩衝長度就是閾值，判斷只看最舊一筆是否仍在窗口內，每筆事件 O(1)。
+    - R4 要比對窗口內最早的大小，過期紀錄從左端彈出（攤銷 O(1)），長度上限為 SIZE_HISTORY_LIMIT。
+    - R5 以目錄為單位，用 SlidingBucketSums 累計窗口內新增的檔案數與位元組（每筆事件 O(1)），
+      抓出 R3 / R4 都看不到的「緩慢塞滿大量小檔」的目錄。
+    - 每 EVICT_INTERVAL_SECONDS 秒清掉一次最新紀錄已超出窗口的路徑，長時間運行的哨兵記憶體不會無限成長。
+
+    靜默會自動解除（指數冷卻）：
+    - 第一次靜默 mute_ttl 秒；到期解除後，若同一路徑在「下一段靜默時長」內又被靜默，
+      這次的時長加倍（MUTE_BACKOFF_FACTOR），最多到 mute_ttl_max 秒。
+    - 解除後安靜超過下一段靜默時長，冷卻等級歸零（時間衰減）。
+    - 到期時間放在最小堆中，每次判斷只看堆頂，沒有到期時成本為 O(1)。
+
+    所有閾值都可由 configure() 以 projects.json 的欄位（daemon.SENTRY_THROTTLE_FIELDS）熱更新。
+    to_state() / restore_state() 以牆上時鐘保存與還原狀態，讓靜默與冷卻等級跨越哨兵重啟。
+    """
+
+    # R4 每個檔案最多保留的大小紀錄數（事件來自快照比對，同一路徑每個節拍至多一筆）。
+    SIZE_HISTORY_LIMIT = 256
+    # 閒置路徑的清理間隔（秒）。
+    EVICT_INTERVAL_SECONDS = 30.0
+    # 反覆靜默時，每一級冷卻的時長倍數。
+    MUTE_BACKOFF_FACTOR = 2.0
+    # 狀態檔（to_state / restore_state）的格式版本。
+    STATE_VERSION = 1
+    # projects.json 欄位 -> 節流器屬性（R4 閾值另外換算成 Bytes）。
+    SETTING_ATTRS = {
+        'throttle_hot_threshold': 'hot_threshold',
+        'throttle_hot_period_seconds': 'hot_period',
+        'throttle_burst_threshold': 'burst_threshold',
+        'throttle_burst_period_seconds': 'burst_period',
+        'throttle_size_growth_mb': 'size_threshold_bytes',
+        'throttle_size_period_seconds': 'size_period',
+        'throttle_dir_growth_mb': 'dir_growth_bytes',
+        'throttle_dir_growth_files': 'dir_growth_files',
+        'throttle_dir_period_seconds': 'dir_period',
+        'mute_ttl_seconds': 'mute_ttl',
+        'mute_ttl_max_seconds': 'mute_ttl_max',
+    }
+
     # 我們定義（def）初始化函式。
     def __init__(self,
                 burst_creation_threshold: int = 20,
                 burst_creation_period_seconds: float = 10.0,
                 size_growth_threshold_mb: int = 100,
-                size_growth_period_seconds: float = 60.0):
+                size_growth_period_seconds: float = 60.0,
+                dir_growth_threshold_mb: int = 200,
+                dir_growth_file_threshold: int = 500,
+                dir_growth_period_seconds: float = 300.0,
+                mute_ttl_seconds: float = 60.0,
+                mute_ttl_max_seconds: float = 3600.0):
         
         # 設定（set）R1 單檔過熱閾值。
         self.hot_threshold = 5
-        # 設定（set）R1 時間區間。
-        self.hot_period = timedelta(seconds=5.0)
-        # 初始化（init）熱點事件字典。
-        self.hot_events: Dict[str, List[datetime]] = {}
+        # 設定（set）R1 時間區間（秒）。
+        self.hot_period = 5.0
+        # 初始化（init）熱點事件字典：路徑 -> 最近 hot_threshold 次修改的時間。
+        self.hot_events: Dict[str, Deque[float]] = {}
         
         # 設定（set）R3 爆量閾值。
         self.burst_threshold = burst_creation_threshold
-        # 設定（set）R3 時間區間。
-        self.burst_period = timedelta(seconds=burst_creation_period_seconds)
-        # 初始化（init）目錄事件字典。
-        self.dir_events: Dict[str, List[datetime]] = {}
+        # 設定（set）R3 時間區間（秒）。
+        self.burst_period = float(burst_creation_period_seconds)
+        # 初始化（init）目錄事件字典：目錄 -> 最近 burst_threshold + 1 次創建的時間。
+        self.dir_events: Dict[str, Deque[float]] = {}
 
         # 設定（set）R4 體積閾值（Bytes）。
         self.size_threshold_bytes = size_growth_threshold_mb * 1024 * 1024
-        # 設定（set）R4 時間區間。
-        self.size_period = timedelta(seconds=size_growth_period_seconds)
-        # 初始化（init）檔案大小歷史字典。
-        self.file_sizes: Dict[str, List[Tuple[datetime, int]]] = {}
+        # 設定（set）R4 時間區間（秒）。
+        self.size_period = float(size_growth_period_seconds)
+        # 初始化（init）檔案大小歷史字典：路徑 -> 窗口內的 (時間, 大小)。
+        self.file_sizes: Dict[str, Deque[Tuple[float, int]]] = {}
+
+        # 設定（set）R5 目錄膨脹閾值（Bytes / 檔案數）與時間區間（秒）。
+        self.dir_growth_bytes = dir_growth_threshold_mb * 1024 * 1024
+        self.dir_growth_files = dir_growth_file_threshold
+        self.dir_period = float(dir_growth_period_seconds)
+        # 初始化（init）目錄成長字典：目錄 -> 窗口內的分桶累計。
+        self.dir_growth: Dict[str, SlidingBucketSums] = {}
+
+        # 初始化（init）靜默路徑字首樹：靜默目錄底下任意深度的路徑都一併擋下。
+        self.muted_paths = PathPrefixTrie()
+        # 設定（set）靜默時長與上限（秒）。
+        self.mute_ttl = float(mute_ttl_seconds)
+        self.mute_ttl_max = float(mute_ttl_max_seconds)
+        # 初始化（init）靜默中的路徑：路徑 -> (到期時間, 冷卻等級)，以及到期時間的最小堆。
+        self.mute_until: Dict[str, Tuple[float, int]] = {}
+        self._mute_heap: List[Tuple[float, str]] = []
+        # 初始化（init）已解除路徑的冷卻記憶：路徑 -> (冷卻等級, 遺忘時間)。
+        self.mute_levels: Dict[str, Tuple[int, float]] = {}
+        # 記錄（monotonic）上一次清理閒置路徑的時間。
+        self.last_evict = time.monotonic()
+
+    # 我們定義（def）套用 projects.json 設定的函式：返回是否有任何值改變。
+    def configure(self, settings: Dict[str, float]) -> bool:
+        # 初始化（init）變動旗標。
+        changed = False
+        # 遍歷（loop）已知欄位。
+        for field, attr in self.SETTING_ATTRS.items():
+            # 如果（if）沒有提供，跳過（continue）。
+            if field not in settings:
+                continue
+            # 換算（convert）R4 / R5 閾值為 Bytes。
+            value = settings[field] * 1024 * 1024 if attr in ('size_threshold_bytes', 'dir_growth_bytes') else settings[field]
+            # 如果（if）沒變，跳過（continue）。
+            if getattr(self, attr) == value:
+                continue
+            setattr(self, attr, value)
+            changed = True
+            # 閾值改變時，舊緩衝的長度不再適用，清掉該規則的歷史重新累積。
+            if attr == 'hot_threshold':
+                self.hot_events.clear()
+            elif attr == 'burst_threshold':
+                self.dir_events.clear()
+            elif attr == 'dir_period':
+                self.dir_growth.clear()
+        # 返回（return）結果。
+        return changed
+
+    # 我們定義（def）靜默路徑的函式：依冷卻等級決定這次的靜默時長。
+    def _mute(self, path: str, now: float, reason: str):
+        # 獲取（get）冷卻記憶：還沒被遺忘就升一級，否則從第 0 級開始。
+        level, forget_at = self.mute_levels.pop(path, (-1, now))
+        level = level + 1 if now < forget_at else 0
+        # 計算（calc）靜默時長。
+        ttl = min(self.mute_ttl * self.MUTE_BACKOFF_FACTOR ** level, self.mute_ttl_max)
+        # 輸出（print）靜默警告。
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 🔥 [智能靜默] {reason}，靜默 {ttl:g}s", flush=True)
+        # 加入（add）靜默名單並登記到期時間。
+        self.muted_paths.add(path)
+        self.mute_until[path] = (now + ttl, level)
+        heapq.heappush(self._mute_heap, (now + ttl, path))
+
+    # 我們定義（def）解除到期靜默的函式：返回本次解除的路徑。
+    def release_expired(self, now: Optional[float] = None) -> List[str]:
+        # 獲取（monotonic）當前時間。
+        now = time.monotonic() if now is None else now
+        # 初始化（init）結果。
+        released: List[str] = []
+        heap = self._mute_heap
+        # 當（while）堆頂已到期...
+        while heap and heap[0][0] <= now:
+            expires, path = heapq.heappop(heap)
+            # 如果（if）這筆已被更新的到期時間取代（同路徑重新靜默），跳過（continue）。
+            entry = self.mute_until.get(path)
+            if entry is None or entry[0] != expires:
+                continue
+            # 解除（discard）靜默，並記住冷卻等級：下一段靜默時長內再被靜默就升級。
+            del self.mute_until[path]
+            self.muted_paths.discard(path)
+            level = entry[1]
+            next_ttl = min(self.mute_ttl * self.MUTE_BACKOFF_FACTOR ** (level + 1), self.mute_ttl_max)
+            self.mute_levels[path] = (level, now + next_ttl)
+            released.append(path)
+            # 輸出（print）解除訊息。
+            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 🧊 [智能靜默] 解除靜默: {os.path.basename(path)}", flush=True)
+        # 返回（return）結果。
+        return released
+
+    # 我們定義（def）判斷是否應該處理單一事件的函式。
+    def should_process(self, event, now: Optional[float] = None) -> bool:
+        # 獲取（monotonic）當前時間。
+        now = time.monotonic() if now is None else now
+        # 解除（release）已到期的靜默。
+        if self._mute_heap and self._mute_heap[0][0] <= now:
+            self.release_expired(now)
+        # 如果（if）到了清理時間，清掉閒置路徑。
+        if now - self.last_evict >= self.EVICT_INTERVAL_SECONDS:
+            self.evict_idle(now)
+        # 返回（return）判斷結果。
+        return self._check(event, now)
+
+    # 我們定義（def）一次判斷整個節拍事件的函式：共用同一個時間點，清理檢查也只做一次。
+    def should_process_batch(self, events: List["MockEvent"], now: Optional[float] = None) -> List[bool]:
+        # 獲取（monotonic）當前時間。
+        now = time.monotonic() if now is None else now
+        # 解除（release）已到期的靜默。
+        if self._mute_heap and self._mute_heap[0][0] <= now:
+            self.release_expired(now)
+        # 如果（if）到了清理時間，清掉閒置路徑。
+        if now - self.last_evict >= self.EVICT_INTERVAL_SECONDS:
+            self.evict_idle(now)
+        # 返回（return）與 events 逐一對應的判斷結果。
+        check = self._check
+        return [check(event, now) for event in events]
+
+    # 我們定義（def）匯出可跨行程保存的狀態的函式：monotonic 時間換算成牆上時鐘（time.time()）。
+    def to_state(self, now: Optional[float] = None, wall_now: Optional[float] = None) -> Dict:
+        # 獲取（get）兩種時鐘的當前值，算出換算位移。
+        now = time.monotonic() if now is None else now
+        offset = (time.time() if wall_now is None else wall_now) - now
+        # 返回（return）JSON 可序列化的字典。
+        return {
+            "version": self.STATE_VERSION,
+            "mutes": {path: [expires + offset, level] for path, (expires, level) in self.mute_until.items()},
+            "levels": {path: [level, forget_at + offset] for path, (level, forget_at) in self.mute_levels.items()},
+            "hot_events": {path: [t + offset for t in times] for path, times in self.hot_events.items()},
+            "dir_events": {path: [t + offset for t in times] for path, times in self.dir_events.items()},
+            "file_sizes": {path: [[t + offset, size] for t, size in history] for path, history in self.file_sizes.items()},
+            "dir_growth": {path: [[t + offset, size, count] for t, size, count in sums.buckets()]
+                           for path, sums in self.dir_growth.items()},
+        }
 
-        # 初始化（init）靜默路徑集合。
-        self.muted_paths: Set[str] = set()
+    # 我們定義（def）還原狀態的函式：已到期的靜默、已遺忘的冷卻等級與窗口外的紀錄一律丟棄；返回還原的靜默數。
+    def restore_state(self, state: Dict, now: Optional[float] = None, wall_now: Optional[float] = None) -> int:
+        # 如果（if）版本不符，不還原。
+        if not isinstance(state, dict) or state.get("version") != self.STATE_VERSION:
+            return 0
+        # 獲取（get）兩種時鐘的當前值，算出換算位移。
+        now = time.monotonic() if now is None else now
+        offset = (time.time() if wall_now is None else wall_now) - now
+        # 還原（restore）仍在靜默中的路徑。
+        for path, (expires, level) in state.get("mutes", {}).items():
+            expires -= offset
+            if expires > now:
+                self.muted_paths.add(path)
+                self.mute_until[path] = (expires, int(level))
+                heapq.heappush(self._mute_heap, (expires, path))
+        # 還原（restore）尚未遺忘的冷卻等級。
+        for path, (level, forget_at) in state.get("levels", {}).items():
+            if forget_at - offset > now and path not in self.mute_until:
+                self.mute_levels[path] = (int(level), forget_at - offset)
+        # 還原（restore）R1 / R3 窗口內的紀錄：緩衝長度以目前的閾值為準。
+        for key, table, period, maxlen in (("hot_events", self.hot_events, self.hot_period, self.hot_threshold),
+                                           ("dir_events", self.dir_events, self.burst_period, self.burst_threshold + 1)):
+            for path, times in state.get(key, {}).items():
+                kept = [t - offset for t in times if now - (t - offset) < period]
+                if kept:
+                    table[path] = deque(kept, maxlen=maxlen)
+        # 還原（restore）R4 窗口內的大小紀錄。
+        for path, history in state.get("file_sizes", {}).items():
+            kept = [(t - offset, int(size)) for t, size in history if now - (t - offset) < self.size_period]
+            if kept:
+                self.file_sizes[path] = deque(kept, maxlen=self.SIZE_HISTORY_LIMIT)
+        # 還原（restore）R5 窗口內的分桶累計（舊版狀態檔沒有這個欄位）。
+        for path, buckets in state.get("dir_growth", {}).items():
+            kept = sorted((t - offset, int(size), int(count)) for t, size, count in buckets if now - (t - offset) < self.dir_period)
+            if kept:
+                sums = self.dir_growth[path] = SlidingBucketSums(self.dir_period)
+                for t, size, count in kept:
+                    sums.add(t, size, count)
+        # 返回（return）還原的靜默數。
+        return len(self.mute_until)
+
+    # 我們定義（def）清理閒置路徑的函式：最新一筆紀錄已超出窗口的路徑，對判斷不再有任何影響。
+    def evict_idle(self, now: float) -> int:
+        # 初始化（init）清理計數。
+        evicted = 0
+        # 遍歷（loop）R1 / R3：最新一筆在最右端。
+        for table, period in ((self.hot_events, self.hot_period), (self.dir_events, self.burst_period)):
+            stale = [key for key, times in table.items() if now - times[-1] >= period]
+            for key in stale:
+                del table[key]
+            evicted += len(stale)
+        # 遍歷（loop）R4：最新一筆同樣在最右端。
+        stale = [key for key, history in self.file_sizes.items() if now - history[-1][0] >= self.size_period]
+        for key in stale:
+            del self.file_sizes[key]
+        evicted += len(stale)
+        # 遍歷（loop）R5：所有桶都已滑出窗口的目錄。
+        stale = [key for key, sums in self.dir_growth.items() if sums.idle(now)]
+        for key in stale:
+            del self.dir_growth[key]
+        evicted += len(stale)
+        # 遍歷（loop）冷卻記憶：已過遺忘時間的路徑不再影響下一次靜默時長。
+        stale = [key for key, (_, forget_at) in self.mute_levels.items() if now >= forget_at]
+        for key in stale:
+            del self.mute_levels[key]
+        evicted += len(stale)
+        # 更新（update）清理時間。
+        self.last_evict = now
+        # 返回（return）清理數量。
+        return evicted
 
-    # 我們定義（def）判斷是否應該處理事件的函式。
-    def should_process(self, event) -> bool:
-        # 獲取（get）事件路徑。
+    # 我們定義（def）以固定時間點套用各條規則的函式。
+    def _check(self, event, now: float) -> bool:
+        # 獲取（get）事件類型、路徑與父目錄。
+        kind = event.event_type
         path = event.src_path
-        # 如果（if）路徑或其父目錄在靜默名單中...
-        if path in self.muted_paths or os.path.dirname(path) in self.muted_paths:
+        # 如果（if）是搬移事件，舊位置在靜默子樹中就拒絕；之後視為在新位置創建一個項目（一次結構變動）。
+        if kind == 'moved':
+            if self.muted_paths.covers(path):
+                return False
+            kind, path = 'created', event.dest_path
+        parent_dir = os.path.dirname(path)
+        # 如果（if）路徑本身或任一上層目錄在靜默名單中...
+        if self.muted_paths.covers(path):
             # 返回（return）False，拒絕處理。
             return False
 
-        # 獲取（get）當前時間。
-        now = datetime.now()
-        
         # --- R3: 爆量創建檢查 ---
         # 如果（if）是創建事件...
-        if event.event_type == 'created':
-            # 獲取（dirname）父目錄。
-            parent_dir = os.path.dirname(path)
-            # 獲取（get）該目錄的歷史事件。
-            events = self.dir_events.get(parent_dir, [])
-            # 過濾（filter）出時間區間內的有效事件。
-            valid = [t for t in events if now - t < self.burst_period]
-            # 加入（append）當前時間。
-            valid.append(now)
-            # 更新（update）字典。
-            self.dir_events[parent_dir] = valid
+        if kind == 'created':
+            # 獲取（get）該目錄的環形緩衝，沒有就建立。
+            times = self.dir_events.get(parent_dir)
+            if times is None:
+                times = self.dir_events[parent_dir] = deque(maxlen=self.burst_threshold + 1)
+            # 加入（append）當前時間：緩衝滿時自動擠掉最舊一筆。
+            times.append(now)
             
-            # 如果（if）超過閾值...
-            if len(valid) > self.burst_threshold:
-                # 輸出（print）靜默警告。
-                print(f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] 🔥 [智能靜默] 爆量創建 (R3): {os.path.basename(parent_dir)}", flush=True)
-                # 加入（add）靜默名單。
-                self.muted_paths.add(parent_dir)
+            # 如果（if）緩衝已滿且最舊一筆仍在窗口內（窗口內超過閾值）...
+            if len(times) == times.maxlen and now - times[0] < self.burst_period:
+                # 靜默（mute）該目錄。
+                self._mute(parent_dir, now, f"爆量創建 (R3): {os.path.basename(parent_dir)}")
                 # 清除（pop）事件記錄。
                 self.dir_events.pop(parent_dir, None)
                 # 返回（return）False。
@@ -136,122 +690,1240 @@ class SmartThrottler:
 
         # --- R1: 單檔過熱檢查 ---
         # 如果（if）是修改事件...
-        if event.event_type == 'modified':
-            # 獲取（get）該檔案的歷史事件。
-            timestamps = self.hot_events.get(path, [])
-            # 過濾（filter）有效事件。
-            valid = [t for t in timestamps if now - t < self.hot_period]
+        if kind == 'modified':
+            # 獲取（get）該檔案的環形緩衝，沒有就建立。
+            times = self.hot_events.get(path)
+            if times is None:
+                times = self.hot_events[path] = deque(maxlen=self.hot_threshold)
             # 加入（append）當前時間。
-            valid.append(now)
-            # 更新（update）字典。
-            self.hot_events[path] = valid
+            times.append(now)
             
-            # 如果（if）超過閾值...
-            if len(valid) >= self.hot_threshold:
-                # 輸出（print）靜默警告。
-                print(f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] 🔥 [智能靜默] 文件過熱 (R1): {os.path.basename(path)}", flush=True)
-                self.muted_paths.add(path)
+            # 如果（if）緩衝已滿且最舊一筆仍在窗口內（窗口內達到閾值）...
+            if len(times) == times.maxlen and now - times[0] < self.hot_period:
+                # 靜默（mute）該檔案。
+                self._mute(path, now, f"文件過熱 (R1): {os.path.basename(path)}")
                 # 清除（pop）事件記錄。
                 self.hot_events.pop(path, None)
                 # 返回（return）False。
                 return False
 
+        # --- R5: 目錄膨脹檢查 ---
+        # 計算（calc）這個事件讓父目錄新增的檔案數與位元組：創建算一個檔案加上它的大小，
+        # 修改只算相對上一次已知大小（R4 歷史）的成長。
+        added_files, added_bytes = 0, 0
+        if kind == 'created':
+            added_files, added_bytes = 1, getattr(event, 'file_size', 0)
+        elif kind == 'modified' and hasattr(event, 'file_size'):
+            history = self.file_sizes.get(path)
+            if history:
+                added_bytes = max(event.file_size - history[-1][1], 0)
+        # 如果（if）有成長...
+        if added_files or added_bytes:
+            # 獲取（get）該目錄的分桶累計，沒有就建立，並累加（add）。
+            sums = self.dir_growth.get(parent_dir)
+            if sums is None:
+                sums = self.dir_growth[parent_dir] = SlidingBucketSums(self.dir_period)
+            sums.add(now, added_bytes, added_files)
+            # 如果（if）窗口內的累計檔案數或位元組超過閾值...
+            if sums.total_count > self.dir_growth_files or sums.total_bytes > self.dir_growth_bytes:
+                # 靜默（mute）該目錄。
+                self._mute(parent_dir, now, f"目錄膨脹 (R5): {os.path.basename(parent_dir)} "
+                                            f"(+{sums.total_count} 檔, +{sums.total_bytes/1024/1024:.2f}MB)")
+                # 清除（pop）累計。
+                self.dir_growth.pop(parent_dir, None)
+                # 返回（return）False。
+                return False
+
         # --- R4: 體積異常檢查 ---
         # 如果（if）是修改事件且帶有大小資訊...
-        if event.event_type == 'modified' and hasattr(event, 'file_size'):
+        if kind == 'modified' and hasattr(event, 'file_size'):
             # 獲取（get）當前大小。
             current_size = event.file_size
-            # 獲取（get）歷史記錄。
-            history = self.file_sizes.get(path, [])
-            # 過濾（filter）有效歷史。
-            valid_history = [(t, s) for t, s in history if now - t < self.size_period]
+            # 獲取（get）歷史記錄，沒有就建立。
+            history = self.file_sizes.get(path)
+            if history is None:
+                history = self.file_sizes[path] = deque(maxlen=self.SIZE_HISTORY_LIMIT)
+            # 彈出（popleft）超出窗口的紀錄。
+            while history and now - history[0][0] >= self.size_period:
+                history.popleft()
             
             # 如果（if）有歷史記錄...
-            if valid_history:
-                # 取出（get）最早的大小。
-                _, old_size = valid_history[0]
+            if history:
+                # 取出（get）窗口內最早的大小。
+                _, old_size = history[0]
                 # 計算（calc）增長量。
                 growth = current_size - old_size
                 # 如果（if）增長超過閾值...
                 if growth > self.size_threshold_bytes:
-                    # 輸出（print）靜默警告。
-                    print(f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] 🔥 [智能靜默] 體積異常 (R4): {os.path.basename(path)} (+{growth/1024/1024:.2f}MB)", flush=True)
-                    # 加入（add）靜默名單。
-                    self.muted_paths.add(path)
+                    # 靜默（mute）該檔案。
+                    self._mute(path, now, f"體積異常 (R4): {os.path.basename(path)} (+{growth/1024/1024:.2f}MB)")
                     # 清除（pop）記錄。
                     self.file_sizes.pop(path, None)
                     # 返回（return）False。
                     return False
             
             # 加入（append）當前記錄。
-            valid_history.append((now, current_size))
-            # 更新（update）字典。
-            self.file_sizes[path] = valid_history
+            history.append((now, current_size))
 
         # 返回（return）True，允許處理。
         return True
 
 # 我們定義（class）模擬事件類別。
 class MockEvent:
-    # 我們定義（def）初始化函式。
-    def __init__(self, src_path, event_type='modified', file_size=0):
+    # 我們定義（def）初始化函式：'moved' 事件的 dest_path 為新位置，整棵目錄搬移時 is_directory 為 True。
+    def __init__(self, src_path, event_type='modified', file_size=0, dest_path=None, is_directory=False):
         self.src_path = src_path
         self.event_type = event_type
-        self.is_directory = False
+        self.is_directory = is_directory
         self.file_size = file_size
+        self.dest_path = dest_path
+
+# 4. 鐵肺核心 (FileSnapshot v3 - 欄式儲存 + 路徑駐留)
+# checkpoint payload 使用的二進位結構（little-endian）。
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+_DIR_INFO = struct.Struct("<qIIQQ")
+
+# 欄位比對時的區塊大小（列數）：沒有 NumPy 時，先整塊比對位元組，再細分成小區塊，只在不同的小區塊內逐列檢查。
+_DIFF_BLOCK_ROWS = 4096
+_DIFF_SUBBLOCK_ROWS = 64
+
+# 我們定義（def）把名稱編碼成「長度前綴 + UTF-8」的函式。
+def _pack_name(name: str) -> bytes:
+    # 編碼（encode）名稱，保留無法解碼的位元組。
+    raw = name.encode('utf-8', 'surrogateescape')
+    # 返回（return）長度前綴 + 內容。
+    return _U32.pack(len(raw)) + raw
+
+# 我們定義（def）解碼「長度前綴 + UTF-8」名稱的函式。
+def _unpack_name(payload: bytes, offset: int) -> Tuple[str, int]:
+    # 讀取（unpack）長度。
+    (length,) = _U32.unpack_from(payload, offset)
+    offset += _U32.size
+    # 返回（return）名稱與新位移。
+    return payload[offset:offset + length].decode('utf-8', 'surrogateescape'), offset + length
+
+# 我們定義（def）把欄位轉成 little-endian 位元組的函式。
+def _column_to_bytes(column: array) -> bytes:
+    # 如果（if）本機是 big-endian，先複製再轉換位元組序。
+    if sys.byteorder == 'big':
+        column = array(column.typecode, column)
+        column.byteswap()
+    # 返回（return）位元組。
+    return column.tobytes()
+
+# 我們定義（def）從 little-endian 位元組還原欄位的函式。
+def _column_from_bytes(typecode: str, raw: bytes) -> array:
+    # 建立（array）空欄位並載入位元組。
+    column = array(typecode)
+    column.frombytes(raw)
+    # 如果（if）本機是 big-endian，轉換位元組序。
+    if sys.byteorder == 'big':
+        column.byteswap()
+    # 返回（return）欄位。
+    return column
+
+# 我們定義（def）取得 DirEntry 名稱的函式（排序用的 key）。
+def _entry_name(entry: os.DirEntry) -> str:
+    return entry.name
+
+# 我們定義（def）判斷路徑是否落在忽略規則中的函式（is_dir 為路徑最後一層的類型）。
+def _is_internal_ignored(root_path: str, path: str, ignore=SENTRY_INTERNAL_RULES, is_dir: bool = False) -> bool:
+    # 計算（relpath）相對於專案根目錄的路徑。
+    rel = os.path.relpath(path, root_path)
+    # 如果（if）路徑不在專案內，不套用規則。
+    if rel == '.' or rel == '..' or rel.startswith('..' + os.sep):
+        return False
+    # 只要（first_ignored）任何一層被忽略，就視為忽略。
+    return ignore.first_ignored(rel.split(os.sep), is_dir) is not None
+
+# 我們定義（class）路徑駐留表類別。
+class PathTable:
+    """
+    路徑駐留表：把「目錄 id + 檔名」對應到一個全域檔案 id。
+
+    - 同一個哨兵的所有快照共用同一張表，相同路徑在不同快照中 id 相同，
+      比對時只需比較整數欄位，不必比較路徑字串。
+    - 檔名經 sys.intern 駐留，大量重複的名稱（__init__.py、index.js）只存一份。
+    - 表只增不減；失效 id 過多時，由呼叫端以 FileSnapshot.compacted() 換一張新表。
+    """
+
+    # 我們定義（def）初始化函式。
+    def __init__(self):
+        # 初始化（init）目錄路徑列表與反查字典。
+        self.dir_paths: List[str] = []
+        self.dir_index: Dict[str, int] = {}
+        # 初始化（init）每個目錄的子檔案字典：檔名 -> 檔案 id。
+        self.children: List[Dict[str, int]] = []
+        # 初始化（init）檔案 id -> 目錄 id 欄位，以及檔案 id -> 檔名列表。
+        self.file_dir = array('q')
+        self.file_name: List[str] = []
+
+    # 我們定義（def）返回已登記檔案數量的函式。
+    def __len__(self) -> int:
+        return len(self.file_name)
+
+    # 我們定義（def）取得（或登記）目錄 id 的函式。
+    def dir_id(self, path: str) -> int:
+        # 查詢（get）既有 id。
+        did = self.dir_index.get(path)
+        # 如果（if）尚未登記...
+        if did is None:
+            # 登記（append）新目錄。
+            did = len(self.dir_paths)
+            self.dir_paths.append(path)
+            self.dir_index[path] = did
+            self.children.append({})
+        # 返回（return）目錄 id。
+        return did
+
+    # 我們定義（def）取得（或登記）檔案 id 的函式。
+    def file_id(self, did: int, name: str) -> int:
+        # 獲取（get）該目錄的子檔案字典。
+        kids = self.children[did]
+        # 查詢（get）既有 id。
+        fid = kids.get(name)
+        # 如果（if）尚未登記...
+        if fid is None:
+            # 駐留（intern）檔名並登記新檔案。
+            fid = len(self.file_name)
+            name = sys.intern(name)
+            kids[name] = fid
+            self.file_dir.append(did)
+            self.file_name.append(name)
+        # 返回（return）檔案 id。
+        return fid
+
+    # 我們定義（def）由檔案 id 組回完整路徑的函式。
+    def path_of(self, fid: int) -> str:
+        return os.path.join(self.dir_paths[self.file_dir[fid]], self.file_name[fid])
+
+    # 我們定義（def）由完整路徑查詢檔案 id 的函式（不登記）。
+    def lookup(self, path: str) -> Optional[int]:
+        # 查詢（get）目錄 id。
+        did = self.dir_index.get(os.path.dirname(path))
+        # 返回（return）檔案 id 或 None。
+        return None if did is None else self.children[did].get(os.path.basename(path))
 
-# 4. 鐵肺核心 (FileSnapshot v2 - 支援大小)
 # 我們定義（class）檔案快照類別。
 class FileSnapshot:
+    """
+    專案目錄的檔案快照（欄式儲存）。
+
+    - ids / mtimes / sizes / inodes 是四條等長的 array 欄位，一列代表一個檔案；
+      路徑字串只存在共用的 PathTable 裡，每份快照每個檔案只多 32 bytes。
+    - 同一目錄的檔案在欄位中連續存放，dirs 記錄每個目錄的
+      (目錄 mtime_ns, 起始列, 結束列, 子目錄名稱)，增量掃描時整段複製。
+    - inodes 取自 DirEntry.inode()（POSIX 上由 readdir 直接提供，不需額外 syscall），
+      dir_keys 記錄每個目錄的 (st_dev, st_ino)；diff_snapshots 以此把改名 / 搬移辨識為 moved。
+
+    增量模式（傳入 previous）：
+    - 每個目錄只先 stat 目錄本身；目錄 mtime 沒變，代表其下的「名單」沒變
+      （新增 / 刪除 / 改名都會更新父目錄 mtime），直接沿用上一份快照的記錄，
+      不再 listdir，也不再 stat 其中的檔案。
+    - 只有 mtime 變了的目錄才重新列出並 stat 其中的檔案。
+    - 代價：原地寫入（不改名）的內容修改不會改變目錄 mtime，
+      需要由呼叫端定期做一次全量掃描來補抓 modified 事件。
+
+    事件模式（另外傳入 dirty_dirs / dirty_trees）：
+    - 只有被 inotify 點名的目錄（及被點名子樹）才重新列出，其餘目錄連 stat 都省略。
+
+    結構模式（structure_only=True）：
+    - 目錄樹只取決於名稱與目錄結構，因此檔案一律不 stat，mtime / size 欄位固定為 0，
+      比對時只會產生 created / deleted；只有符號連結仍需 stat 判斷是否指向目錄。
+
+    靜默子樹（muted，PathPrefixTrie）：
+    - 落在靜默路徑下、且上一份快照有記錄的目錄，一律整段沿用（不 stat、不列出），
+      節流器擋下的爆量目錄不再拖慢掃描；靜默期間的變動不進入快照，解除靜默後的下一次掃描才補上。
+    - full=True 時 previous 只用來沿用靜默子樹，其餘目錄一律重新列出（全量對帳）。
+
+    忽略規則（ignore，ignore_rules.IgnoreMatcher）：
+    - 被忽略的檔案與目錄在 stat 之前就剔除，被忽略的目錄整棵不下探（與 engine 共用同一個比對器）。
+    - 未指定時只套用 SENTRY_INTERNAL_RULES；哨兵會傳入 build_ignore_rules() 的結果。
+    """
+
+    # 目錄 mtime 與上次掃描時間過近時，時間戳粒度不足以保證「沒變」，一律重新列出。
+    RACY_WINDOW_NS = 2_000_000_000
+
     # 我們定義（def）初始化函式。
-    def __init__(self, path: str):
-        # 初始化（init）檔案字典：路徑 -> (mtime, size)。
-        self.files: Dict[str, Tuple[float, int]] = {}
-        # 執行（scan）掃描。
-        self.scan(path)
+    def __init__(self, path: str, previous: Optional["FileSnapshot"] = None,
+                 dirty_dirs: Optional[Set[str]] = None, dirty_trees: Optional[Set[str]] = None,
+                 table: Optional[PathTable] = None, pool: Optional[Executor] = None,
+                 structure_only: bool = False, ignore: Optional[ignore_rules.IgnoreMatcher] = None,
+                 muted: Optional[PathPrefixTrie] = None, full: bool = False):
+        # 決定（choose）路徑駐留表：優先沿用上一份快照的表，讓兩份快照的 id 可以直接比較。
+        self.table = table if table is not None else (previous.table if previous is not None else PathTable())
+        # 初始化（init）四條欄位。
+        self.ids = array('q')
+        self.mtimes = array('d')
+        self.sizes = array('q')
+        self.inodes = array('Q')
+        # 初始化（init）目錄記錄：目錄 -> (目錄 mtime_ns, 起始列, 結束列, 子目錄名稱)。
+        self.dirs: Dict[str, Tuple[int, int, int, Tuple[str, ...]]] = {}
+        # 初始化（init）目錄身分：目錄 -> (st_dev, st_ino)；檔案的裝置即所在目錄的裝置。
+        self.dir_keys: Dict[str, Tuple[int, int]] = {}
+        # 記錄（time_ns）掃描開始時間，供下一次增量掃描判斷時間戳是否可信。
+        self.scan_started_ns = time.time_ns()
+        # 執行（scan）掃描：有執行器時，頂層子樹並行掃描。
+        self.scan(path, previous, dirty_dirs, dirty_trees, pool, structure_only, ignore, muted, full)
+
+    # 我們定義（def）返回檔案數量的函式。
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # 我們定義（def）以字典形式匯出（路徑 -> (mtime, size)）的函式，供除錯與測試使用。
+    def as_dict(self) -> Dict[str, Tuple[float, int]]:
+        path_of = self.table.path_of
+        return {path_of(fid): (m, s) for fid, m, s in zip(self.ids, self.mtimes, self.sizes)}
+
+    # 我們定義（def）寫入一個重新列出的目錄的函式。
+    def _add_dir(self, directory: str, dir_mtime_ns: int, entries: List[Tuple[str, float, int, int]],
+                 subdirs: Tuple[str, ...], dir_key: Tuple[int, int]):
+        # 取得（dir_id）目錄 id 與起始列。
+        did = self.table.dir_id(directory)
+        start = len(self.ids)
+        # 遍歷（loop）檔案並追加到欄位。
+        for name, mtime, size, inode in entries:
+            self.ids.append(self.table.file_id(did, name))
+            self.mtimes.append(mtime)
+            self.sizes.append(size)
+            self.inodes.append(inode)
+        # 儲存（save）目錄記錄與目錄身分。
+        self.dirs[directory] = (dir_mtime_ns, start, len(self.ids), subdirs)
+        self.dir_keys[directory] = dir_key
+
+    # 我們定義（def）從上一份快照整段複製一個目錄的函式。
+    def _copy_dir(self, previous: "FileSnapshot", directory: str, record: Tuple[int, int, int, Tuple[str, ...]]):
+        # 解構（unpack）記錄。
+        dir_mtime_ns, s, e, subdirs = record
+        # 取得（len）起始列。
+        start = len(self.ids)
+        # 整段複製（extend）四條欄位。
+        self.ids.extend(previous.ids[s:e])
+        self.mtimes.extend(previous.mtimes[s:e])
+        self.sizes.extend(previous.sizes[s:e])
+        self.inodes.extend(previous.inodes[s:e])
+        # 儲存（save）目錄記錄與目錄身分。
+        self.dirs[directory] = (dir_mtime_ns, start, start + (e - s), subdirs)
+        self.dir_keys[directory] = previous.dir_keys.get(directory, (0, 0))
 
     # 我們定義（def）掃描函式。
-    def scan(self, root_path: str):
-        # 使用（walk）遍歷目錄。
-        for root, dirs, files in os.walk(root_path):
-            # 過濾（filter）忽略的目錄。
-            dirs[:] = [d for d in dirs if d not in SENTRY_INTERNAL_IGNORE]
-            # 遍歷（loop）檔案。
-            for file in files:
-                # 如果（if）檔案在忽略名單中...
-                if file in SENTRY_INTERNAL_IGNORE: continue
-                # 組合（join）完整路徑。
-                full_path = os.path.join(root, file)
-                # 嘗試（try）獲取檔案狀態。
-                try:
-                    # 呼叫（stat）獲取狀態。
-                    stat = os.stat(full_path)
-                    # 儲存（save）修改時間和大小。
-                    self.files[full_path] = (stat.st_mtime, stat.st_size)
-                # 忽略（except）錯誤。
-                except OSError: pass
+    def scan(self, root_path: str, previous: Optional["FileSnapshot"] = None,
+             dirty_dirs: Optional[Set[str]] = None, dirty_trees: Optional[Set[str]] = None,
+             pool: Optional[Executor] = None, structure_only: bool = False,
+             ignore: Optional[ignore_rules.IgnoreMatcher] = None, muted: Optional[PathPrefixTrie] = None,
+             full: bool = False):
+        # 判斷（check）是否為事件模式。
+        event_driven = previous is not None and (dirty_dirs is not None or dirty_trees is not None)
+        # 整理（pack）子樹掃描需要的共用參數。
+        prev_dirs = previous.dirs if previous is not None else {}
+        # 全量對帳時截止時間為 0：任何目錄都不會因為 mtime 沒變而被沿用。
+        cutoff_ns = previous.scan_started_ns - self.RACY_WINDOW_NS if previous is not None and not full else 0
+        options = (cutoff_ns, event_driven, dirty_dirs or set(), dirty_trees or set(), structure_only,
+                   ignore if ignore is not None else SENTRY_INTERNAL_RULES, muted if muted else None, root_path)
+
+        # 如果（if）沒有執行器，單執行緒掃描整棵樹。
+        if pool is None:
+            self._apply_ops(previous, _scan_subtree(root_path, False, prev_dirs, *options))
+            return
+
+        # 先在本執行緒處理根目錄本身（不下探），取得頂層子目錄名單。
+        root_ops = _scan_subtree(root_path, False, prev_dirs, *options, descend=False)
+        self._apply_ops(previous, root_ops)
+        # 如果（if）根目錄已消失，結束。
+        if not root_ops:
+            return
+        # 解構（unpack）根目錄記錄：沿用的記錄不帶 stale，重新列出的記錄沿用根目錄的 stale。
+        _, dir_mtime_ns, _, top_dirs, _ = root_ops[0]
+        stale = dir_mtime_ns is not None and root_path in options[3]
+
+        # 如果（if）是子行程池，只傳每棵子樹自己的舊記錄（參數需要序列化）。
+        if scan_pool.is_process_pool(pool):
+            buckets: Dict[str, Dict[str, Tuple[int, int, int, Tuple[str, ...]]]] = {name: {} for name in top_dirs}
+            offset = len(root_path.rstrip(os.sep)) + 1
+            for directory, record in prev_dirs.items():
+                bucket = buckets.get(directory[offset:].split(os.sep, 1)[0])
+                if bucket is not None and directory != root_path:
+                    bucket[directory] = record
+        # 否則（else）執行緒共用同一份字典（唯讀）。
+        else:
+            buckets = {name: prev_dirs for name in top_dirs}
+
+        # 按名稱順序提交（submit）各頂層子樹，依提交順序收回，列順序與單執行緒掃描完全一致。
+        futures = [pool.submit(_scan_subtree, os.path.join(root_path, name), stale, buckets[name], *options)
+                   for name in top_dirs]
+        # 依序（loop）合併結果：駐留表只在本執行緒寫入。
+        for future in futures:
+            self._apply_ops(previous, future.result())
+
+    # 我們定義（def）把子樹掃描結果寫入欄位的函式。
+    def _apply_ops(self, previous: Optional["FileSnapshot"], ops: List[tuple]):
+        # 遍歷（loop）每個目錄的結果。
+        for directory, dir_mtime_ns, entries, subdirs, dir_key in ops:
+            # 如果（if）是沿用記錄，從上一份快照整段複製。
+            if dir_mtime_ns is None:
+                self._copy_dir(previous, directory, previous.dirs[directory])
+            # 否則（else）寫入重新列出的內容。
+            else:
+                self._add_dir(directory, dir_mtime_ns, entries, subdirs, dir_key)
+
+    # 我們定義（def）把快照換到另一張路徑駐留表上的函式（只重對應 id 欄位）。
+    def rebased(self, table: PathTable) -> "FileSnapshot":
+        # 建立（new）空白實例，略過掃描。
+        snap = FileSnapshot.__new__(FileSnapshot)
+        snap.table = table
+        snap.scan_started_ns = self.scan_started_ns
+        snap.dirs = dict(self.dirs)
+        snap.dir_keys = dict(self.dir_keys)
+        # 複製（copy）時間、大小與 inode 欄位：列順序不變。
+        snap.mtimes = array('d', self.mtimes)
+        snap.sizes = array('q', self.sizes)
+        snap.inodes = array('Q', self.inodes)
+        # 重新（remap）對應 id 欄位。
+        snap.ids = array('q')
+        old_table = self.table
+        for directory, (_, s, e, _) in self.dirs.items():
+            did = table.dir_id(directory)
+            for fid in self.ids[s:e]:
+                snap.ids.append(table.file_id(did, old_table.file_name[fid]))
+        # 返回（return）新快照。
+        return snap
+
+    # 我們定義（def）以全新駐留表重建快照的函式，用來回收已刪除檔案留下的 id。
+    def compacted(self) -> "FileSnapshot":
+        return self.rebased(PathTable())
+
+    # 我們定義（def）把快照編碼成 checkpoint payload 的函式（路徑一律存成相對於根目錄）。
+    def to_bytes(self, root_path: str) -> bytes:
+        # 初始化（init）輸出緩衝。
+        out: List[bytes] = [_U64.pack(self.scan_started_ns), _U32.pack(len(self.dirs))]
+        file_name = self.table.file_name
+        # 遍歷（loop）目錄記錄（插入順序即列順序）。
+        for directory, (mtime_ns, s, e, subdirs) in self.dirs.items():
+            # 寫入（pack）相對路徑、mtime_ns、列數、子目錄數與目錄身分。
+            out.append(_pack_name(os.path.relpath(directory, root_path)))
+            out.append(_DIR_INFO.pack(mtime_ns, e - s, len(subdirs), *self.dir_keys.get(directory, (0, 0))))
+            # 寫入（pack）子目錄名稱與檔名。
+            out.extend(_pack_name(name) for name in subdirs)
+            out.extend(_pack_name(file_name[fid]) for fid in self.ids[s:e])
+        # 寫入（pack）整條時間、大小與 inode 欄位。
+        out.append(_U64.pack(len(self.ids)))
+        out.append(_column_to_bytes(self.mtimes))
+        out.append(_column_to_bytes(self.sizes))
+        out.append(_column_to_bytes(self.inodes))
+        # 返回（return）合併後的位元組。
+        return b"".join(out)
+
+    # 我們定義（classmethod）從 checkpoint payload 還原快照的函式（不觸碰磁碟）。
+    @classmethod
+    def from_bytes(cls, root_path: str, payload: bytes, table: Optional[PathTable] = None) -> "FileSnapshot":
+        # 建立（new）空白實例，略過掃描。
+        snap = cls.__new__(cls)
+        snap.table = table if table is not None else PathTable()
+        snap.ids = array('q')
+        snap.dirs = {}
+        snap.dir_keys = {}
+        # 讀取（unpack）掃描時間與目錄數量。
+        (snap.scan_started_ns,) = _U64.unpack_from(payload, 0)
+        (count,) = _U32.unpack_from(payload, _U64.size)
+        offset = _U64.size + _U32.size
+        # 遍歷（loop）目錄記錄。
+        for _ in range(count):
+            rel, offset = _unpack_name(payload, offset)
+            mtime_ns, n_rows, n_subdirs, dev, ino = _DIR_INFO.unpack_from(payload, offset)
+            offset += _DIR_INFO.size
+            directory = root_path if rel == "." else os.path.join(root_path, rel)
+            did = snap.table.dir_id(directory)
+            subdirs = []
+            for _ in range(n_subdirs):
+                name, offset = _unpack_name(payload, offset)
+                subdirs.append(name)
+            start = len(snap.ids)
+            for _ in range(n_rows):
+                name, offset = _unpack_name(payload, offset)
+                snap.ids.append(snap.table.file_id(did, name))
+            snap.dirs[directory] = (mtime_ns, start, len(snap.ids), tuple(subdirs))
+            snap.dir_keys[directory] = (dev, ino)
+        # 讀取（unpack）整條時間、大小與 inode 欄位。
+        (rows,) = _U64.unpack_from(payload, offset)
+        offset += _U64.size
+        snap.mtimes = _column_from_bytes('d', payload[offset:offset + rows * 8])
+        offset += rows * 8
+        snap.sizes = _column_from_bytes('q', payload[offset:offset + rows * 8])
+        offset += rows * 8
+        snap.inodes = _column_from_bytes('Q', payload[offset:offset + rows * 8])
+        # 檢查（check）欄位長度一致。
+        if not (len(snap.ids) == len(snap.mtimes) == len(snap.sizes) == len(snap.inodes) == rows):
+            raise ValueError("快照 checkpoint 欄位長度不一致")
+        # 返回（return）還原的快照。
+        return snap
+
+# 我們定義（def）掃描一棵子樹的函式（模組層級，才能交給子行程池執行）。
+def _scan_subtree(top: str, stale: bool, prev_dirs: Dict[str, tuple], cutoff_ns: int, event_driven: bool,
+                  dirty_dirs: Set[str], dirty_trees: Set[str], structure_only: bool = False,
+                  ignore=SENTRY_INTERNAL_RULES, muted: Optional[PathPrefixTrie] = None,
+                  root: Optional[str] = None, descend: bool = True) -> List[tuple]:
+    """
+    以顯式堆疊（前序、子目錄按名稱排序）掃描 top 以下的目錄，不觸碰任何共用狀態。
+
+    回傳每個目錄一筆 (目錄, 目錄 mtime_ns, 檔案列表, 子目錄名稱, 目錄 (st_dev, st_ino))：
+    - mtime_ns 為 None 代表沿用 prev_dirs 中的舊記錄（呼叫端整段複製，目錄身分也沿用）。
+    - 檔案列表的每一筆為 (名稱, mtime, size, inode)。
+    - 順序即欄位中的列順序；呼叫端依序套用即可。
+    - structure_only 時檔案只記名稱（mtime / size 為 0），不做任何 stat。
+    - ignore 比對到的項目在 stat 之前剔除，被忽略的目錄不會出現在子目錄名稱中，也就不會下探；
+      路徑規則以 root（預設為 top）為基準計算相對路徑，內容全被忽略的目錄（例如 'build/**'）不列出。
+    - muted 覆蓋的目錄只要 prev_dirs 有記錄就直接沿用，不論是否被點名。
+    """
+    # 初始化（init）結果與待處理目錄堆疊：(目錄, 是否位於被點名的子樹中)。
+    ops: List[tuple] = []
+    # 決定（choose）路徑規則的基準目錄；沒有路徑規則時不必計算相對路徑。
+    root = root if root is not None else top
+    path_rules = ignore.has_path_rules
+    gitignore = ignore.reads_gitignore
+    stack = [(top, stale)]
+    # 當（while）堆疊不為空...
+    while stack:
+        # 取出（pop）一個目錄。
+        directory, stale = stack.pop()
+        stale = stale or directory in dirty_trees
+        # 如果（if）目錄落在靜默子樹中且有舊記錄，整段沿用，連目錄本身都不 stat。
+        if muted is not None and directory in prev_dirs and muted.covers(directory):
+            record = prev_dirs[directory]
+            ops.append((directory, None, None, record[3], None))
+            if descend:
+                stack.extend((os.path.join(directory, d), False) for d in reversed(record[3]))
+            continue
+        # 獲取（get）上一份快照中的目錄記錄（被點名的子樹一律不沿用）。
+        record = None if stale else prev_dirs.get(directory)
+
+        # 如果（if）是事件模式且此目錄沒有被點名，連目錄本身都不 stat；
+        # 或（or）輪詢模式下目錄 mtime 沒變、且不在時間戳不可信的窗口內，都沿用舊記錄。
+        reuse = event_driven and record is not None and directory not in dirty_dirs
+        if not reuse:
+            # 嘗試（try）獲取目錄狀態。
+            try:
+                dir_stat = os.stat(directory)
+            # 忽略（except）已消失的目錄。
+            except OSError:
+                continue
+            dir_mtime_ns = dir_stat.st_mtime_ns
+            reuse = (not event_driven and record is not None
+                     and record[0] == dir_mtime_ns and dir_mtime_ns < cutoff_ns)
+        if reuse:
+            # 沿用（reuse）記錄。
+            ops.append((directory, None, None, record[3], None))
+            if descend:
+                stack.extend((os.path.join(directory, d), False) for d in reversed(record[3]))
+            continue
+
+        # 初始化（init）檔案與子目錄名單。
+        entries: List[Tuple[str, float, int, int]] = []
+        subdir_names: List[str] = []
+        # 計算（relative_dir）此目錄的相對路徑（路徑規則用）。
+        parent = ignore_rules.relative_dir(root, directory) if path_rules else ''
+        # 如果（if）整個目錄的內容都被忽略，不列出。
+        if path_rules and ignore.hides_contents(parent):
+            dir_entries = []
+        else:
+            # 嘗試（try）以 scandir 重新列出目錄：DirEntry 自帶類型資訊，判斷目錄不需額外 syscall。
+            try:
+                # 排序（sorted）後，兩次掃描的列順序才會一致，比對可以走快速路徑。
+                with os.scandir(directory) as it:
+                    dir_entries = sorted((e for e in it if not ignore.matches(parent, e.name)), key=_entry_name)
+            # 忽略（except）錯誤。
+            except OSError:
+                continue
+        # 遍歷（loop）目錄內容（與類型無關的規則已在 stat 之前剔除）。
+        for entry in dir_entries:
+            # 嘗試（try）判斷類型並獲取狀態，每個檔案只 stat 一次。
+            try:
+                # 判斷（is_dir）是否為真實目錄（不跟隨符號連結，與 os.walk 預設一致）。
+                is_dir = entry.is_dir(follow_symlinks=False)
+                # 如果（if）被需要類型的規則（只比對資料夾的規則、.gitignore）忽略，跳過（被忽略的目錄不下探）。
+                if ignore.matches_entry(parent, entry.name, is_dir): continue
+                # 如果（if）是目錄，記錄為子目錄。
+                if is_dir:
+                    subdir_names.append(entry.name)
+                    continue
+                # 如果（if）是結構模式，名稱就是全部所需資訊；只有符號連結要 stat，排除指向目錄的連結。
+                # 例外：讀取 .gitignore 時仍 stat .gitignore 本身，內容修改才會以 modified 回報、觸發規則重新套用。
+                if structure_only and not (gitignore and entry.name == ignore_rules.GITIGNORE_FILENAME):
+                    if entry.is_symlink() and stat.S_ISDIR(entry.stat().st_mode): continue
+                    entries.append((entry.name, 0.0, 0, entry.inode()))
+                    continue
+                # 獲取（stat）狀態：符號連結會跟隨到目標。
+                st = entry.stat()
+                # 指向目錄的連結不展開（與 os.walk 預設一致）。
+                if stat.S_ISDIR(st.st_mode): continue
+            # 忽略（except）錯誤（例如斷掉的符號連結）。
+            except OSError:
+                continue
+            # 記錄（append）檔案的修改時間、大小和 inode（連結本身的 inode，改名時不變）。
+            entries.append((entry.name, st.st_mtime, st.st_size, entry.inode()))
+
+        # 記錄（append）目錄結果。
+        ops.append((directory, dir_mtime_ns, entries, tuple(subdir_names), (dir_stat.st_dev, dir_stat.st_ino)))
+        # 推入（extend）子目錄（反序推入，讓彈出順序維持字母序）。
+        if descend:
+            stack.extend((os.path.join(directory, d), stale) for d in reversed(subdir_names))
+    # 返回（return）結果。
+    return ops
+
+# 我們定義（def）把 inotify 事件翻譯成「需要重新列出的目錄」的函式。
+def collect_dirty_dirs(root_path: str, raw_events: List[Tuple[str, str, bool]],
+                       ignore=SENTRY_INTERNAL_RULES) -> Tuple[Set[str], Set[str]]:
+    """
+    inotify 事件只被當成「該去看哪裡」的提示：真正的差異一律由增量掃描 + 快照比對產生，
+    因此重複、亂序或合併過的事件都不會產生錯誤的結果。
+
+    回傳 (dirty_dirs, dirty_trees)：
+    - dirty_dirs : 名單或檔案內容可能變了的目錄（事件路徑的父目錄）。
+    - dirty_trees: 整棵子樹都不能沿用的目錄（被建立 / 移入 / 刪除 / 移出的目錄）。
+    """
+    # 初始化（init）結果集合。
+    dirty_dirs: Set[str] = set()
+    dirty_trees: Set[str] = set()
+    # 遍歷（loop）原始事件。
+    for _event_type, path, is_dir in raw_events:
+        # 如果（if）落在忽略名單中（監看器可能還掛在剛被忽略的目錄上），跳過（continue）。
+        if _is_internal_ignored(root_path, path, ignore, is_dir): continue
+        # 父目錄的名單或檔案已變。
+        dirty_dirs.add(os.path.dirname(path))
+        # 如果（if）是目錄事件，整棵子樹都要重新列出。
+        if is_dir:
+            dirty_trees.add(path)
+    # 返回（return）結果。
+    return dirty_dirs, dirty_trees
+
+# 我們定義（def）找出兩段欄位中有差異的列（相對位移）的函式。
+def _changed_rows(old: FileSnapshot, o_start: int, new: FileSnapshot, n_start: int, length: int) -> List[int]:
+    # 如果（if）長度為 0，直接返回。
+    if length <= 0:
+        return []
+    # 建立（memoryview）零複製的欄位視圖。
+    om, nm = memoryview(old.mtimes), memoryview(new.mtimes)
+    osz, nsz = memoryview(old.sizes), memoryview(new.sizes)
+    # 快速路徑：整段位元組相同，代表沒有任何變動。
+    if (om[o_start:o_start + length].tobytes() == nm[n_start:n_start + length].tobytes()
+            and osz[o_start:o_start + length].tobytes() == nsz[n_start:n_start + length].tobytes()):
+        return []
+    # 如果（if）有 NumPy，整欄向量化比較。
+    if np is not None:
+        o_m = np.frombuffer(old.mtimes, dtype=np.float64, count=length, offset=o_start * 8)
+        n_m = np.frombuffer(new.mtimes, dtype=np.float64, count=length, offset=n_start * 8)
+        o_s = np.frombuffer(old.sizes, dtype=np.int64, count=length, offset=o_start * 8)
+        n_s = np.frombuffer(new.sizes, dtype=np.int64, count=length, offset=n_start * 8)
+        return np.flatnonzero((n_m > o_m) | (n_s != o_s)).tolist()
+    # 否則（else）以大區塊 -> 小區塊逐層比對位元組，只在不同的小區塊內逐列檢查。
+    rows: List[int] = []
+    # 我們定義（def）判斷一段列是否完全相同的函式。
+    def same(b: int, e: int) -> bool:
+        return (om[o_start + b:o_start + e].tobytes() == nm[n_start + b:n_start + e].tobytes()
+                and osz[o_start + b:o_start + e].tobytes() == nsz[n_start + b:n_start + e].tobytes())
+    # 遍歷（loop）大區塊。
+    for b in range(0, length, _DIFF_BLOCK_ROWS):
+        if same(b, min(b + _DIFF_BLOCK_ROWS, length)): continue
+        # 遍歷（loop）不同的大區塊中的小區塊。
+        for sb in range(b, min(b + _DIFF_BLOCK_ROWS, length), _DIFF_SUBBLOCK_ROWS):
+            se = min(sb + _DIFF_SUBBLOCK_ROWS, length)
+            if same(sb, se): continue
+            # 逐列（loop）檢查：時間變新或大小改變才算修改。
+            for i in range(sb, se):
+                if new.mtimes[n_start + i] > old.mtimes[o_start + i] or new.sizes[n_start + i] != old.sizes[o_start + i]:
+                    rows.append(i)
+    # 返回（return）差異列。
+    return rows
+
+# 我們定義（def）比較兩份快照、產生差異事件的函式。
+def diff_snapshots(old: FileSnapshot, new: FileSnapshot) -> List[MockEvent]:
+    """
+    產生 created / modified / deleted / moved 事件。
+
+    - 新出現的目錄若與消失的目錄身分 (st_dev, st_ino) 相同，就是整棵搬移：只產生一個
+      is_directory 的 moved 事件，其下的檔案以檔名對齊舊位置，只回報搬移之外的差異。
+    - 消失的檔案若與新出現的檔案身分相同（且 mtime 相同，改名不會改變 mtime），
+      合併為一個 moved 事件。結構模式的 mtime 固定為 0，剛釋放的 inode 被新檔重用時
+      可能把「刪除 + 建立」報成 moved；兩者對目錄樹的淨效果相同。
+    """
+    # 如果（if）兩份快照使用不同的駐留表，先把新快照換到舊表上，id 才能直接比較。
+    if new.table is not old.table:
+        new = new.rebased(old.table)
+    # 獲取（get）路徑還原函式與檔名表。
+    path_of = new.table.path_of
+    file_name = new.table.file_name
+    # 初始化（init）結果事件列表。
+    results: List[MockEvent] = []
+
+    # 快速路徑：id 欄位完全相同（沒有新增 / 刪除），只需整欄比較時間與大小。
+    if memoryview(old.ids).tobytes() == memoryview(new.ids).tobytes():
+        for i in _changed_rows(old, 0, new, 0, len(new.ids)):
+            results.append(MockEvent(path_of(new.ids[i]), 'modified', new.sizes[i]))
+        return results
+
+    # 目錄搬移：新目錄 -> 舊位置。只有搬移的最上層產生事件，跟著父目錄一起搬、名稱沒變的子目錄不重複回報。
+    sources: Dict[str, str] = {}
+    vanished = {old.dir_keys[d]: d for d in old.dirs if d not in new.dirs and old.dir_keys.get(d, (0, 0))[1]}
+    if vanished:
+        for directory in new.dirs:
+            source = None if directory in old.dirs else vanished.get(new.dir_keys.get(directory))
+            if source is None:
+                continue
+            sources[directory] = source
+            parent_source = sources.get(os.path.dirname(directory))
+            if parent_source is None or os.path.join(parent_source, os.path.basename(directory)) != source:
+                results.append(MockEvent(source, 'moved', dest_path=directory, is_directory=True))
+
+    # 初始化（init）新出現的檔案（身分 -> (結果索引, 新列)）與消失的檔案（身分, 舊列）。
+    born: Dict[Tuple[int, int], Tuple[int, int]] = {}
+    gone: List[Tuple[Tuple[int, int], int]] = []
+
+    # 結構有變：逐目錄對齊。列相同的目錄整段比較，列不同的目錄才逐檔比對。
+    for directory, (_, ns, ne, _) in new.dirs.items():
+        # 獲取（get）舊目錄記錄；搬移過來的目錄改用舊位置的記錄。
+        record = old.dirs.get(directory)
+        source = sources.get(directory)
+        # 如果（if）舊目錄存在且 id 列完全相同...
+        if record is not None and old.ids[record[1]:record[2]] == new.ids[ns:ne]:
+            for i in _changed_rows(old, record[1], new, ns, ne - ns):
+                results.append(MockEvent(path_of(new.ids[ns + i]), 'modified', new.sizes[ns + i]))
+            continue
+        # 建立（dict）舊目錄的對照：同一路徑以 id 對齊，搬移過來的目錄以檔名對齊。
+        if source is not None:
+            record = old.dirs[source]
+            old_rows = {file_name[old.ids[j]]: j for j in range(record[1], record[2])}
+        else:
+            old_rows = {} if record is None else {old.ids[j]: j for j in range(record[1], record[2])}
+        dev = new.dir_keys.get(directory, (0, 0))[0]
+        # 遍歷（loop）新目錄的每一列。
+        for i in range(ns, ne):
+            fid = new.ids[i]
+            j = old_rows.pop(fid if source is None else file_name[fid], None)
+            # 如果（if）舊目錄沒有這個檔案（新增），記下身分供改名比對...
+            if j is None:
+                if new.inodes[i]:
+                    born.setdefault((dev, new.inodes[i]), (len(results), i))
+                results.append(MockEvent(path_of(fid), 'created', new.sizes[i]))
+            # 否則（elif），如果時間或大小變了（修改）...
+            elif new.mtimes[i] > old.mtimes[j] or new.sizes[i] != old.sizes[j]:
+                results.append(MockEvent(path_of(fid), 'modified', new.sizes[i]))
+        # 剩下的舊列都是消失的檔案。
+        old_dev = old.dir_keys.get(source or directory, (0, 0))[0]
+        gone.extend(((old_dev, old.inodes[j]), j) for j in old_rows.values())
+
+    # 整個目錄消失（且不是搬走）：其下所有檔案都是消失的檔案。
+    claimed = set(sources.values())
+    for directory, (_, s, e, _) in old.dirs.items():
+        if directory not in new.dirs and directory not in claimed:
+            old_dev = old.dir_keys.get(directory, (0, 0))[0]
+            gone.extend(((old_dev, old.inodes[j]), j) for j in range(s, e))
+
+    # 改名 / 搬移：消失的檔案與新出現的檔案身分相同，把那筆 created 換成 moved；其餘才是刪除。
+    for key, j in gone:
+        match = born.pop(key, None) if key[1] else None
+        if match is not None and old.mtimes[j] == new.mtimes[match[1]]:
+            index, i = match
+            results[index] = MockEvent(path_of(old.ids[j]), 'moved', new.sizes[i], dest_path=results[index].src_path)
+        else:
+            results.append(MockEvent(path_of(old.ids[j]), 'deleted', old.sizes[j]))
+    # 返回（return）差異事件。
+    return results
+
+# 我們定義（def）把差異事件送進大腦審查的函式。
+def process_events(events: List[MockEvent], throttler: SmartThrottler, output_file_set: Set[str]) -> List[MockEvent]:
+    # 初始化（init）有效變動列表。
+    effective: List[MockEvent] = []
+    # 剔除（filter）輸出檔案，其餘事件一次交給節流器判斷（整個節拍共用同一個時間點）。
+    candidates = [evt for evt in events if evt.src_path not in output_file_set]
+    verdicts = throttler.should_process_batch(candidates)
+    # 遍歷（loop）事件與判斷結果。
+    for evt, allowed in zip(candidates, verdicts):
+        # 如果（if）被擋下的是搬移事件，舊位置的消失仍要反映到輸出：降級為刪除。
+        if evt.event_type == 'moved' and not allowed:
+            evt = MockEvent(evt.src_path, 'deleted', evt.file_size, is_directory=evt.is_directory)
+        # 刪除事件不受節流器結果影響，直接視為有效（與舊版行為一致）。
+        if evt.event_type == 'deleted' or allowed:
+            # 輸出（print）偵測訊息：搬移同時顯示新位置。
+            name = os.path.basename(evt.src_path)
+            if evt.event_type == 'moved':
+                name = f"{name} -> {os.path.relpath(evt.dest_path, os.path.dirname(evt.src_path))}"
+            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [偵測] {evt.event_type}: {name}", flush=True)
+            # 收集（append）有效變動。
+            effective.append(evt)
+    # 返回（return）結果。
+    return effective
+
+# 我們定義（class）自適應輪詢間隔類別。
+class AdaptiveInterval:
+    """
+    依活動程度調整主迴圈的休眠間隔。
+
+    - 本輪有任何變動：立刻回到最快間隔（minimum）。
+    - 連續閒置：每輪乘上 factor，直到上限（ceiling）。
+    閒置專案幾乎不耗 CPU，忙碌專案則以最快間隔反應。
+    """
+
+    # 我們定義（def）初始化函式。
+    def __init__(self, minimum: float = POLL_INTERVAL_MIN_SECONDS, ceiling: float = POLL_INTERVAL_MAX_SECONDS,
+                 factor: float = POLL_BACKOFF_FACTOR):
+        # 設定（set）下限、上限與倍率（上限不得低於下限）。
+        self.minimum = minimum
+        self.ceiling = max(minimum, ceiling)
+        self.factor = factor
+        # 初始化（init）當前間隔：啟動後先以最快間隔觀察。
+        self.current = minimum
+
+    # 我們定義（def）依本輪結果更新間隔的函式；回傳間隔是否改變。
+    def record(self, active: bool) -> bool:
+        # 記錄（save）舊值。
+        previous = self.current
+        # 如果（if）有活動，回到最快間隔；否則（else）指數退避。
+        self.current = self.minimum if active else min(self.current * self.factor, self.ceiling)
+        # 返回（return）是否改變。
+        return self.current != previous
+
+# 我們定義（def）解析秒數設定的函式（無效值退回預設，有效值限制在範圍內）。
+def parse_seconds(raw: Optional[str], default: float, lower: float, upper: float) -> float:
+    # 嘗試（try）轉為浮點數。
+    try:
+        value = float(raw)
+    # 如果（except）缺少或無效，使用預設值。
+    except (TypeError, ValueError):
+        return default
+    # 如果（if）不是有限正數，使用預設值。
+    if not value > 0 or value == float('inf'):
+        return default
+    # 返回（return）限制在合理範圍內的值。
+    return min(max(value, lower), upper)
+
+# 我們定義（def）解析輪詢間隔上限設定的函式。
+def parse_poll_ceiling(raw: Optional[str]) -> float:
+    return parse_seconds(raw, POLL_INTERVAL_MAX_SECONDS, POLL_INTERVAL_MIN_SECONDS, POLL_INTERVAL_CEILING_LIMIT)
+
+# 我們定義（def）解析開關參數的函式：空字串或未提供時用預設值。
+def parse_flag(raw: Optional[str], default: bool) -> bool:
+    # 如果（if）沒有提供，返回預設值。
+    if raw is None or not raw.strip():
+        return default
+    # 返回（return）是否為「開」。
+    return raw.strip().lower() not in ('0', 'false', 'no', 'off')
+
+# 我們定義（def）從 projects.json 的單一專案設定讀取忽略規則的函式（與 daemon.list_ignore_patterns_for_project 相同的正規化）。
+def ignore_patterns_from_project(project_config: Dict) -> List[str]:
+    # 獲取（get）原始設定。
+    raw = project_config.get('ignore_patterns')
+    # 如果（if）不是列表，視為沒有規則。
+    if not isinstance(raw, list):
+        return []
+    # 返回（return）去重、排序後的名稱。
+    return sorted({p for p in raw if isinstance(p, str) and p})
+
+# 我們定義（def）解析忽略規則參數（JSON 列表字串）的函式：缺少或損壞時視為沒有規則。
+def parse_ignore_patterns(raw: Optional[str]) -> List[str]:
+    # 嘗試（try）解析 JSON。
+    try:
+        value = json.loads(raw) if raw and raw.strip() else []
+    # 如果（except）格式錯誤，視為沒有規則。
+    except ValueError:
+        return []
+    # 返回（return）正規化後的名稱。
+    return ignore_patterns_from_project({'ignore_patterns': value})
+
+# 我們定義（def）組合哨兵掃描與監看使用的忽略規則的函式：與目錄樹隱藏的項目完全相同（engine 系統預設 + 專案規則，編譯一次）；
+# 指定 gitignore_root 時另外套用該專案內各層的 .gitignore。內部名單不在這裡，改由 drop_internal_events() 在事件階段剔除。
+def build_ignore_rules(patterns: List[str], gitignore_root: Optional[str] = None) -> ignore_rules.IgnoreMatcher:
+    return ignore_rules.build_matcher(frozenset(engine.SYSTEM_DEFAULT_IGNORE).union(patterns), gitignore_root)
+
+# 我們定義（class）projects.json 變動偵測器類別。
+class ProjectConfigWatcher:
+    """
+    每個節拍只 stat 一次 projects.json；mtime 變了才以唯讀方式重新讀取，回傳本專案的設定。
+
+    - 讀到寫了一半或損壞的檔案時不記錄 mtime，下一個節拍再試。
+    - 不經過 daemon 的讀寫閘道（不加鎖、不做備份恢復），哨兵對設定檔只讀不寫。
+    """
+
+    # 我們定義（def）初始化函式：mtime 從 None 開始，第一個節拍一定會讀取一次。
+    def __init__(self, project_uuid: str, projects_file: Optional[str] = None):
+        self.project_uuid = project_uuid
+        self.projects_file = projects_file or daemon.get_projects_file_path()
+        self.mtime_ns: Optional[int] = None
+
+    # 我們定義（def）檢查變動的函式：沒變、讀取失敗或找不到專案時返回 None。
+    def poll(self) -> Optional[Dict]:
+        # 嘗試（try）獲取設定檔 mtime。
+        try:
+            mtime_ns = os.stat(self.projects_file).st_mtime_ns
+        # 如果（except）設定檔暫時不存在（正在被改名替換），下次再看。
+        except OSError:
+            return None
+        # 如果（if）沒變，不讀。
+        if mtime_ns == self.mtime_ns:
+            return None
+        # 嘗試（try）讀取並解析（load）JSON。
+        try:
+            with open(self.projects_file, 'r', encoding='utf-8') as f:
+                projects = json.load(f)
+        # 如果（except）讀到寫了一半的檔案，下次再試。
+        except (OSError, ValueError):
+            return None
+        # 記錄（save）已處理的 mtime。
+        self.mtime_ns = mtime_ns
+        # 如果（if）格式不對，視為找不到。
+        if not isinstance(projects, list):
+            return None
+        # 返回（return）本專案的設定。
+        return next((p for p in projects if isinstance(p, dict) and p.get('uuid') == self.project_uuid), None)
+
+    # 我們定義（def）確認本專案仍登記在設定檔中的函式（不看 mtime）；讀不到或格式不對時視為仍登記。
+    def registered(self) -> bool:
+        # 嘗試（try）讀取並解析（load）JSON。
+        try:
+            with open(self.projects_file, 'r', encoding='utf-8') as f:
+                projects = json.load(f)
+        # 如果（except）讀取失敗，無法判斷，當作仍登記。
+        except (OSError, ValueError):
+            return True
+        # 如果（if）格式不對，同樣當作仍登記。
+        if not isinstance(projects, list):
+            return True
+        # 返回（return）是否找得到本專案。
+        return any(isinstance(p, dict) and p.get('uuid') == self.project_uuid for p in projects)
+
+# 我們定義（class）更新去抖動器類別。
+class UpdateDebouncer:
+    """
+    把連續的有效變動合併成一次更新。
+
+    - 每次有變動就重新計時；最後一次變動後靜默 quiet 秒才觸發（git checkout / npm install
+      期間不會每個節拍都重新生成一次）。
+    - 第一次變動後最多等待 max_latency 秒，持續不斷的寫入也不會讓更新無限延後。
+    - 同一路徑的多個事件合併成淨效果：建立後刪除 = 無變動、刪除後建立 = 修改。
+    - 搬移記在新位置；先建立再搬走，淨效果是在新位置建立。
+    """
+
+    # 我們定義（def）初始化函式。
+    def __init__(self, quiet: float = DEBOUNCE_QUIET_SECONDS, max_latency: float = DEBOUNCE_MAX_LATENCY_SECONDS):
+        # 設定（set）靜默期與最大延遲（最大延遲不得短於靜默期）。
+        self.quiet = quiet
+        self.max_latency = max(quiet, max_latency)
+        # 初始化（init）待處理變動：路徑 -> 淨事件類型（保持首次出現的順序）。
+        self.changes: Dict[str, str] = {}
+        # 初始化（init）第一次與最後一次變動的時間（monotonic）。
+        self.first_at: Optional[float] = None
+        self.last_at: Optional[float] = None
+
+    # 我們定義（def）判斷是否有待處理變動的函式。
+    def __bool__(self) -> bool:
+        return self.first_at is not None
+
+    # 我們定義（def）加入一批有效變動的函式。
+    def add(self, events: List[MockEvent], now: float):
+        # 如果（if）沒有事件，不重新計時。
+        if not events:
+            return
+        # 遍歷（loop）事件並合併成淨效果。
+        for evt in events:
+            path, kind = evt.src_path, evt.event_type
+            # 如果（if）是搬移，改記在新位置；舊位置先前的建立隨之帶走。
+            if kind == 'moved':
+                if self.changes.pop(path, None) == 'created':
+                    kind = 'created'
+                path = evt.dest_path
+            merged = self._merge(self.changes.get(path), kind)
+            if merged is None:
+                self.changes.pop(path, None)
+            else:
+                self.changes[path] = merged
+        # 記錄（save）時間：第一次變動只記一次，最後一次變動每批更新。
+        if self.first_at is None:
+            self.first_at = now
+        self.last_at = now
+
+    # 我們定義（staticmethod）合併同一路徑前後兩個事件的函式；None 代表互相抵銷。
+    @staticmethod
+    def _merge(previous: Optional[str], current: str) -> Optional[str]:
+        # 如果（if）之前沒有事件，直接採用。
+        if previous is None:
+            return current
+        # 如果（if）建立後又刪除，互相抵銷；建立後修改，仍是建立。
+        if previous == 'created':
+            return None if current == 'deleted' else 'created'
+        # 如果（if）刪除後又建立（或搬入），視為修改。
+        if previous == 'deleted' and current in ('created', 'moved'):
+            return 'modified'
+        # 否則（else）以後來的事件為準。
+        return current
+
+    # 我們定義（def）計算距離觸發還有幾秒的函式（沒有待處理變動時為無限大）。
+    def seconds_until_due(self, now: float) -> float:
+        # 如果（if）沒有待處理變動，返回無限大。
+        if self.first_at is None:
+            return float('inf')
+        # 返回（return）靜默期到期與最大延遲到期中較早者。
+        deadline = min(self.last_at + self.quiet, self.first_at + self.max_latency)
+        return max(0.0, deadline - now)
+
+    # 我們定義（def）判斷是否該觸發更新的函式。
+    def is_due(self, now: float) -> bool:
+        return self.seconds_until_due(now) == 0.0
+
+    # 我們定義（def）取出並清空合併後變動的函式。
+    def drain(self) -> Dict[str, str]:
+        # 取出（swap）變動並重設計時。
+        changes, self.changes = self.changes, {}
+        self.first_at = self.last_at = None
+        # 返回（return）合併後的變動。
+        return changes
+
+# 我們定義（class）全專案變動風暴偵測器類別。
+class StormDetector:
+    """
+    切換分支、解壓縮、npm install 這類一次動到上萬個檔案的操作，不值得逐一事件審查與記錄。
+
+    - 某個節拍的變動數達到 threshold，就進入風暴模式：之後的事件不經節流器、不逐筆輸出，
+      只暫存起來，每個節拍輸出一行摘要。
+    - 變動數回到門檻以下並持續 calm 秒，風暴平息：暫存的事件一次交給去抖動器，只觸發一次重新生成。
+    - 風暴期間去抖動器也暫停觸發，避免在風暴中途因最大延遲而多生成幾次。
+    """
+
+    # 我們定義（def）初始化函式。
+    def __init__(self, threshold: int = STORM_EVENT_THRESHOLD, calm: float = STORM_CALM_SECONDS):
+        self.threshold = threshold
+        self.calm = calm
+        # 初始化（init）風暴狀態：暫存事件、最後一次超過門檻的時間、開始時間。
+        self.held: List[MockEvent] = []
+        self.last_surge: Optional[float] = None
+        self.started_at: Optional[float] = None
+
+    # 我們定義（def）返回是否處於風暴模式的函式。
+    def __bool__(self) -> bool:
+        return self.started_at is not None
+
+    # 我們定義（def）套用 projects.json 設定的函式：返回是否有任何值改變。
+    def configure(self, settings: Dict[str, float]) -> bool:
+        threshold = settings.get('storm_event_threshold', self.threshold)
+        calm = settings.get('storm_calm_seconds', self.calm)
+        changed = (threshold, calm) != (self.threshold, self.calm)
+        self.threshold, self.calm = threshold, calm
+        return changed
+
+    # 我們定義（def）吸收一個節拍事件的函式：返回 True 代表事件已由風暴模式接手（呼叫端不再逐筆審查）。
+    def absorb(self, events: List[MockEvent], now: float) -> bool:
+        # 如果（if）不在風暴中且未達門檻，交回呼叫端照常處理。
+        if not self and len(events) < self.threshold:
+            return False
+        # 如果（if）剛進入風暴，記錄開始時間並輸出提示。
+        if not self:
+            self.started_at = now
+            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 🌪️ [Storm] 單一節拍 {len(events)} 個變動，進入風暴模式：暫停逐筆審查，平息後只更新一次", flush=True)
+        # 如果（if）本輪仍達門檻，延後平息時間。
+        if len(events) >= self.threshold:
+            self.last_surge = now
+        # 暫存（extend）事件並輸出一行摘要。
+        if events:
+            self.held.extend(events)
+            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [Storm] 本輪 {len(events)} 個變動（累計 {len(self.held)}）", flush=True)
+        # 返回（return）True。
+        return True
+
+    # 我們定義（def）檢查風暴是否平息的函式：平息時返回暫存的事件並重設狀態，否則返回 None。
+    def end_if_calm(self, now: float) -> Optional[List[MockEvent]]:
+        # 如果（if）不在風暴中，或安靜時間還不夠，返回 None。
+        if not self or now - self.last_surge < self.calm:
+            return None
+        # 取出（take）暫存事件並重設狀態。
+        held, self.held = self.held, []
+        duration = now - self.started_at
+        self.started_at = self.last_surge = None
+        # 輸出（print）平息摘要。
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [Storm] 風暴平息（持續 {duration:.1f}s，共 {len(held)} 個變動），合併為一次更新", flush=True)
+        # 返回（return）暫存事件。
+        return held
+
+# 我們定義（def）把合併後的變動摘要成一行日誌的函式。
+def summarize_changes(changes: Dict[str, str]) -> str:
+    # 計數（count）各類事件。
+    counts: Dict[str, int] = {}
+    for event_type in changes.values():
+        counts[event_type] = counts.get(event_type, 0) + 1
+    # 返回（return）固定順序的摘要。
+    return ", ".join(f"{t}: {counts[t]}" for t in ('created', 'modified', 'moved', 'deleted') if t in counts)
+
+# 我們定義（def）找出變動所在目錄的函式：目錄樹只在這些目錄需要重列（內容修改不影響目錄樹）。
+def changed_directories(events: List[MockEvent]) -> Set[str]:
+    # 初始化（init）目錄集合。
+    dirs: Set[str] = set()
+    # 遍歷（loop）事件：新增 / 刪除影響所在目錄，搬移同時影響舊位置與新位置的所在目錄；
+    # 修改過的 .gitignore 會改變所在目錄以下的忽略規則，所在目錄同樣要重列。
+    for evt in events:
+        if evt.event_type == 'modified' and os.path.basename(evt.src_path) != ignore_rules.GITIGNORE_FILENAME:
+            continue
+        dirs.add(os.path.dirname(evt.src_path))
+        if evt.dest_path:
+            dirs.add(os.path.dirname(evt.dest_path))
+    # 返回（return）結果。
+    return dirs
+
+# 我們定義（def）剔除內部名單下變動的函式：它們仍用來標記目錄樹快取，但不觸發更新（與只在掃描時剪掉的舊版行為相同）。
+def drop_internal_events(root_path: str, events: List[MockEvent]) -> List[MockEvent]:
+    # 初始化（init）結果列表。
+    kept: List[MockEvent] = []
+    # 遍歷（loop）事件：搬移只要有一端落在內部名單之外就保留。
+    for evt in events:
+        if not _is_internal_ignored(root_path, evt.src_path, SENTRY_INTERNAL_RULES, evt.is_directory):
+            kept.append(evt)
+        elif evt.dest_path and not _is_internal_ignored(root_path, evt.dest_path, SENTRY_INTERNAL_RULES, evt.is_directory):
+            kept.append(evt)
+    # 返回（return）結果。
+    return kept
+
+# 我們定義（def）找出新出現或消失的目錄所在上層的函式：空資料夾也會顯示在目錄樹中，但 diff_snapshots 只對檔案產生事件。
+def vanished_or_new_dir_parents(old: FileSnapshot, new: FileSnapshot) -> Set[str]:
+    # 如果（if）是同一份快照，沒有變動。
+    if old is new:
+        return set()
+    # 返回（return）兩份快照目錄集合的差集所在的上層目錄。
+    return {os.path.dirname(d) for d in old.dirs.keys() ^ new.dirs.keys()}
+
+# 我們定義（def）判斷變動是否碰到 .gitignore 的函式：碰到時規則本身變了，需要重新套用。
+def touches_gitignore(events: List[MockEvent]) -> bool:
+    # 遍歷（loop）事件：新舊路徑任一個是 .gitignore 就成立。
+    for evt in events:
+        if os.path.basename(evt.src_path) == ignore_rules.GITIGNORE_FILENAME:
+            return True
+        if evt.dest_path and os.path.basename(evt.dest_path) == ignore_rules.GITIGNORE_FILENAME:
+            return True
+    # 返回（return）結果。
+    return False
+
+# 我們定義（def）嘗試建立 inotify 監看器的函式；不可用時回傳 None（退回輪詢）。
+def open_watcher(project_path: str, ignore=SENTRY_INTERNAL_RULES):
+    # 獲取（get）時間戳。
+    ts = time.strftime('%Y-%m-%d %H:%M:%S')
+    # 如果（if）使用者強制指定輪詢模式...
+    if os.environ.get('LAPLACE_SENTRY_BACKEND', '').lower() == 'poll':
+        print(f"[{ts}] [Backend] 已指定輪詢模式 (LAPLACE_SENTRY_BACKEND=poll)", flush=True)
+        return None
+    # 如果（if）平台或檔案系統不支援 inotify...
+    if not inotify_backend.supports_path(project_path):
+        print(f"[{ts}] [Backend] inotify 不可用或該掛載點不可靠，使用輪詢模式", flush=True)
+        return None
+    # 初始化（init）監看器變數。
+    watcher = None
+    # 嘗試（try）建立監看。
+    try:
+        watcher = inotify_backend.InotifyWatcher(ignore, root=project_path)
+        watcher.add_tree(project_path)
+    # 如果（except）監看數量用盡...
+    except inotify_backend.WatchLimitReached as e:
+        print(f"[{ts}] [Backend] {e}，退回輪詢模式", flush=True)
+        watcher.close()
+        return None
+    # 如果（except）其他系統錯誤...
+    except OSError as e:
+        print(f"[{ts}] [Backend] inotify 初始化失敗 ({e})，退回輪詢模式", flush=True)
+        if watcher is not None: watcher.close()
+        return None
+    # 輸出（print）事件模式訊息。
+    print(f"[{ts}] [Backend] inotify 事件模式 (監看目錄: {watcher.watch_count})", flush=True)
+    # 返回（return）監看器。
+    return watcher
+
+# 我們定義（def）開啟變動日誌的函式；無法寫入時回傳 None（只影響下游讀取，不影響監控）。
+def open_journal(project_uuid: str) -> Optional[journal.ChangeJournal]:
+    # 嘗試（try）開啟（並修復）日誌。
+    try:
+        return journal.ChangeJournal(project_uuid)
+    # 如果（except）無法寫入，輸出警告。
+    except OSError as e:
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [Journal] 無法開啟變動日誌 ({e})，本次不記錄", flush=True)
+        return None
+
+# 我們定義（def）把有效變動追加到變動日誌的函式：失敗只返回 0，不影響監控。
+def record_changes(change_journal: Optional[journal.ChangeJournal], events: List[MockEvent]) -> int:
+    # 如果（if）沒有日誌或沒有事件，不處理。
+    if change_journal is None or not events:
+        return 0
+    # 嘗試（try）追加，時間戳為牆上時鐘。
+    try:
+        return change_journal.append(events, time.time())
+    # 忽略（except）錯誤。
+    except OSError:
+        return 0
+
+# 我們定義（def）寫入節流器狀態檔的函式（臨時檔 + 改名）：失敗只返回 False，不影響監控。
+def save_throttler_state(throttler: SmartThrottler, state_file: str) -> bool:
+    # 嘗試（try）寫入。
+    try:
+        temp_file = f"{state_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(throttler.to_state(), f, ensure_ascii=False)
+        os.replace(temp_file, state_file)
+        return True
+    # 如果（except）寫入失敗，返回 False。
+    except OSError:
+        return False
+
+# 我們定義（def）讀取節流器狀態檔的函式：檔案不存在或損壞時從空白狀態開始；返回還原的靜默數。
+def load_throttler_state(throttler: SmartThrottler, state_file: str) -> int:
+    # 嘗試（try）讀取並還原。
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return throttler.restore_state(json.load(f))
+    # 如果（except）不存在或格式錯誤，不還原。
+    except (OSError, ValueError, TypeError, AttributeError):
+        return 0
+
+# 我們定義（def）SIGTERM 處理函式：轉成 SystemExit 以走正常的收尾流程。
+def _raise_system_exit(signum, frame):
+    raise SystemExit(0)
 
 # 5. 主入口
-# 我們定義（def）主函式。
-def main():
-    # 如果（if）參數不足...
-    if len(sys.argv) < 3:
-        # 退出（exit）。
-        sys.exit(1)
+# 我們定義（def）監控單一專案的函式：args 即命令列參數（不含腳本名）。
+# 獨立行程模式由 main() 呼叫；單一監督行程模式（sentry_supervisor.py）在各自的執行緒中呼叫，
+# 並以 stop 事件通知停止。
+def run_sentry(args: List[str], stop: Optional[threading.Event] = None):
+    # 初始化（init）停止事件（獨立行程模式下由 SIGTERM 轉成的 SystemExit 結束迴圈）。
+    if stop is None:
+        stop = threading.Event()
 
     # 獲取（get）專案 UUID。
-    project_uuid = sys.argv[1]
+    project_uuid = args[0]
     # 獲取（get）專案路徑。
-    project_path = sys.argv[2]
+    project_path = args[1]
     
     # 初始化（init）輸出檔案列表。
     output_files = []
     # 如果（if）有提供輸出檔案參數...
-    if len(sys.argv) > 3:
+    if len(args) > 2:
         # 解析（split）逗號分隔的字串。
-        output_files = [p.strip() for p in sys.argv[3].split(',') if p.strip()]
+        output_files = [p.strip() for p in args[2].split(',') if p.strip()]
     # 轉為（set）集合以加速查詢。
     output_file_set = set(output_files)
+    # 獲取（get）設定指紋（由 daemon 提供；沒有就不做 checkpoint）。
+    fingerprint = args[3].strip() if len(args) > 3 else ''
+    # 獲取（get）掃描並行度與池類型（由 daemon 從 projects.json 帶入；沒有就單執行緒）。
+    scan_workers, scan_pool_kind = scan_pool.normalize_scan_settings(
+        args[4] if len(args) > 4 else None,
+        args[5].strip() if len(args) > 5 else None,
+    )
+    # 初始化（init）自適應輪詢間隔（上限由 daemon 從 projects.json 帶入；沒有就用預設）。
+    interval = AdaptiveInterval(ceiling=parse_poll_ceiling(args[6] if len(args) > 6 else None))
+    # 初始化（init）更新去抖動器（靜默期與最大延遲由 daemon 從 projects.json 帶入；沒有就用預設）。
+    debouncer = UpdateDebouncer(
+        quiet=parse_seconds(args[7] if len(args) > 7 else None, DEBOUNCE_QUIET_SECONDS, 0.1, 60.0),
+        max_latency=parse_seconds(args[8] if len(args) > 8 else None, DEBOUNCE_MAX_LATENCY_SECONDS, 0.1, 600.0),
+    )
+    # 獲取（get）是否為結構模式（由 daemon 從 projects.json 帶入；沒有就開啟）：只有新增 / 刪除 / 改名觸發更新。
+    structure_only = parse_flag(args[9] if len(args) > 9 else None, STRUCTURE_ONLY_DEFAULT)
+    # 獲取（get）專案的忽略規則（由 daemon 從 projects.json 帶入），組合成掃描與監看共用的忽略名單。
+    ignore_patterns = parse_ignore_patterns(args[10] if len(args) > 10 else None)
+    # 獲取（get）是否另外套用專案內的 .gitignore（由 daemon 從 projects.json 帶入；沒有就關閉）。
+    use_gitignore = parse_flag(args[11] if len(args) > 11 else None, False)
+    ignore = build_ignore_rules(ignore_patterns, project_path if use_gitignore else None)
+    # 初始化（init）設定檔變動偵測器：忽略規則改變時就地重新套用，不必重啟哨兵。
+    config_watcher = ProjectConfigWatcher(project_uuid)
 
     # 獲取啟動時間
     now = datetime.now()
@@ -266,118 +1938,358 @@ def main():
     else:
         print(f"[{ts}] 【OUTPUT-FILE-BLACKLIST】未接收到任何輸出文件黑名單", flush=True)
     # --------------------
+    # 如果（if）專案有自訂忽略規則，記錄下來。
+    if ignore_patterns:
+        print(f"[{ts}] [Ignore] 已套用 {len(ignore_patterns)} 條專案忽略規則: {', '.join(ignore_patterns)}", flush=True)
+    # 如果（if）有套用 .gitignore，記錄下來。
+    if use_gitignore:
+        print(f"[{ts}] [Ignore] 已啟用 .gitignore 規則（含各層子目錄）", flush=True)
+
+    # 建立（open）子樹並行掃描的執行器（worker 數為 1 時為 None，走單執行緒）。
+    pool = scan_pool.open_pool(scan_workers, scan_pool_kind)
+    if pool is not None:
+        print(f"[{ts}] [Scan] 頂層子樹並行掃描：{scan_workers} 個 {scan_pool_kind} worker", flush=True)
     
-    # 初始化（init）智能節流器。
+    # 初始化（init）智能節流器與變動風暴偵測器，先套用專案的節流設定（還原的窗口長度以設定為準）。
     throttler = SmartThrottler()
-    # 初始化（init）上一次的靜默狀態。
-    last_muted_state: Set[str] = set()
+    storm = StormDetector()
+    startup_config = ProjectConfigWatcher(project_uuid).poll()
+    if startup_config is not None:
+        startup_settings = daemon.throttle_settings_from_project(startup_config)
+        throttler.configure(startup_settings)
+        storm.configure(startup_settings)
+    # 還原（load）上次停機前的節流器狀態：已到期的靜默與窗口外的紀錄在載入時丟棄。
+    throttle_state_file = daemon._get_throttle_state_file_path(project_uuid)
+    restored_mutes = load_throttler_state(throttler, throttle_state_file)
+    if restored_mutes:
+        print(f"[{ts}] [Throttle] 已還原 {restored_mutes} 條仍在靜默中的路徑", flush=True)
+    # 初始化（init）上一次寫入狀態檔的內容（靜默名單 + 輪詢間隔）。
+    last_status: Optional[Tuple[frozenset, float]] = None
 
     # 我們定義（def）更新狀態檔的函式。
     def update_status_file():
         # 宣告（nonlocal）使用外部變數。
-        nonlocal last_muted_state
-        # 獲取（get）當前靜默名單。
-        current_muted = throttler.muted_paths
-        # 如果（if）狀態有變動...
-        if current_muted != last_muted_state:
-            # 定義（define）狀態檔路徑。
-            status_file = f"/tmp/{project_uuid}.sentry_status"
-            # 嘗試（try）寫入檔案。
-            try:
-                # 開啟（open）檔案。
-                with open(status_file, 'w', encoding='utf-8') as f:
-                    # 寫入（dump）JSON。
-                    json.dump(list(current_muted), f)
-                # 更新（update）緩存狀態。
-                last_muted_state = current_muted.copy()
-            # 忽略（except）錯誤。
-            except:
-                pass
+        nonlocal last_status
+        # 獲取（get）當前狀態：靜默名單與輪詢間隔。
+        current_status = (frozenset(throttler.muted_paths), interval.current)
+        # 如果（if）狀態沒變，不寫。
+        if current_status == last_status:
+            return
+        # 定義（define）狀態檔路徑。
+        status_file = f"/tmp/{project_uuid}.sentry_status"
+        # 組合（dict）狀態內容。
+        status = {
+            "muted_paths": sorted(current_status[0]),
+            "poll_interval": interval.current,
+            "updated_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        # 嘗試（try）以「臨時檔 + 改名」寫入，讀取端不會讀到寫了一半的 JSON。
+        try:
+            # 開啟（open）臨時檔並寫入（dump）JSON。
+            temp_file = f"{status_file}.{os.getpid()}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(status, f, ensure_ascii=False)
+            # 改名（replace）為正式狀態檔。
+            os.replace(temp_file, status_file)
+            # 更新（update）緩存狀態。
+            last_status = current_status
+            # 靜默名單有變，順便保存節流器狀態。
+            save_throttler_state(throttler, throttle_state_file)
+        # 忽略（except）錯誤。
+        except OSError:
+            pass
 
-    # 輸出（print）建立快照訊息。
-    print(f"[{ts}] [Step] 建立初始快照...", flush=True)
-    # 建立（create）初始快照。
-    last_snapshot = FileSnapshot(project_path)
+    # 先建立（open）監看器，確保快照建立期間發生的變動也會進入事件佇列。
+    watcher = open_watcher(project_path, ignore)
+    # 開啟（open）變動日誌：偵測到的有效變動以二進位紀錄追加，daemon 以游標增量讀取。
+    change_journal = open_journal(project_uuid)
+
+    # 嘗試（load）讀取與當前設定相符的 checkpoint。
+    payload = snapshot_store.load_checkpoint(project_uuid, fingerprint) if fingerprint else None
+    # 初始化（init）啟動時的待更新標記。
+    pending_update = False
+    # 如果（if）有可用的 checkpoint（暖啟動）...
+    if payload is not None:
+        # 輸出（print）暖啟動訊息。
+        print(f"[{ts}] [Step] 暖啟動：載入快照 checkpoint，比對停機期間的變動...", flush=True)
+        # 還原（restore）停機前的快照。
+        checkpoint = FileSnapshot.from_bytes(project_path, payload)
+        # 以增量掃描比對磁碟（只重列 mtime 變動的目錄）；套用 .gitignore 時全量重列，
+        # 停機期間原地修改的 .gitignore 不會改變所在目錄的 mtime。
+        last_snapshot = FileSnapshot(project_path, previous=checkpoint, pool=pool, structure_only=structure_only,
+                                     ignore=ignore, full=use_gitignore)
+        # 篩選（filter）結構性變動：目錄樹只取決於名稱與目錄結構。
+        structural = [e for e in drop_internal_events(project_path, diff_snapshots(checkpoint, last_snapshot))
+                      if e.event_type != 'modified' and e.src_path not in output_file_set]
+        # 如果（if）停機期間結構有變...
+        if structural:
+            print(f"[{ts}] [Step] 停機期間偵測到 {len(structural)} 個結構變動，將觸發更新", flush=True)
+            record_changes(change_journal, structural)
+            pending_update = True
+        # 否則（else）略過初始更新。
+        else:
+            print(f"[{ts}] [Step] 停機期間結構未變，略過初始更新", flush=True)
+    # 否則（else）冷啟動。
+    else:
+        # 輸出（print）建立快照訊息。
+        print(f"[{ts}] [Step] 建立初始快照...", flush=True)
+        # 建立（create）初始快照。
+        last_snapshot = FileSnapshot(project_path, pool=pool, structure_only=structure_only, ignore=ignore)
+    # 記錄（monotonic）上一次全量對帳時間。
+    last_reconcile = time.monotonic()
+    # 記錄（snapshot）上一次寫入 checkpoint 的快照。
+    saved_snapshot = None if pending_update or payload is None else last_snapshot
     # 輸出（print）監控中訊息。
-    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [Step] 監控中 (Files: {len(last_snapshot.files)})", flush=True)
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [Step] 監控中 (Files: {len(last_snapshot)}, 輪詢間隔: {interval.minimum:g}s–{interval.ceiling:g}s, 變動模式: {'結構' if structure_only else '完整'})", flush=True)
+
+    # 我們定義（def）寫入 checkpoint 的函式。
+    def save_checkpoint():
+        # 宣告（nonlocal）使用外部變數。
+        nonlocal saved_snapshot
+        # 如果（if）沒有指紋、有尚未完成的更新、或快照沒變，就不寫。
+        if not fingerprint or pending_update or saved_snapshot is last_snapshot:
+            return
+        # 嘗試（try）寫入。
+        try:
+            snapshot_store.save_checkpoint(project_uuid, fingerprint, last_snapshot.to_bytes(project_path))
+            saved_snapshot = last_snapshot
+        # 如果（except）寫入失敗，只記錄，不影響監控。
+        except OSError as e:
+            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [Checkpoint] 寫入失敗: {e}", flush=True)
+
+    # 我們定義（def）重新套用忽略規則的函式：返回以新名單全量重掃後的結構變動。
+    def reload_ignore_rules(project_config: Dict) -> List[MockEvent]:
+        # 宣告（nonlocal）使用外部變數。
+        nonlocal ignore_patterns, use_gitignore, ignore, fingerprint
+        # 獲取（get）新的忽略規則與 .gitignore 開關；如果（if）都沒變，什麼都不做。
+        new_patterns = ignore_patterns_from_project(project_config)
+        new_use_gitignore = daemon.use_gitignore_from_project(project_config)
+        if new_patterns == ignore_patterns and new_use_gitignore == use_gitignore:
+            return []
+        # 判斷（check）是否可能有目錄被重新納入（規則被移除或 .gitignore 開關改變），需要補上監看。
+        rewatch = bool(set(ignore_patterns) - set(new_patterns)) or new_use_gitignore != use_gitignore
+        # 更新（update）忽略名單。
+        ignore_patterns = new_patterns
+        use_gitignore = new_use_gitignore
+        ignore = build_ignore_rules(ignore_patterns, project_path if use_gitignore else None)
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [Ignore] 偵測到忽略規則變更，重新套用 ({len(ignore_patterns)} 條, .gitignore: {'開' if use_gitignore else '關'}): {', '.join(ignore_patterns) or '無'}", flush=True)
+        # 如果（if）有設定指紋，以新規則重算（與 daemon 啟動時的算法相同），checkpoint 才能在下次啟動時沿用。
+        if fingerprint:
+            raw_ignore = project_config.get('ignore_patterns')
+            fingerprint = snapshot_store.compute_fingerprint(
+                project_path, daemon._get_targets_from_project(project_config),
+                raw_ignore if isinstance(raw_ignore, list) else None, structure_only=structure_only,
+                use_gitignore=use_gitignore)
+        # 返回（return）以新規則全量重掃的變動。
+        return reapply_ignore_rules(rewatch)
+
+    # 我們定義（def）把當前規則套用到監看器與快照的函式：返回以當前規則全量重掃後的結構變動。
+    def reapply_ignore_rules(rewatch: bool) -> List[MockEvent]:
+        # 宣告（nonlocal）使用外部變數。
+        nonlocal watcher, last_snapshot, last_reconcile
+        # 如果（if）處於事件模式，更新監看器的忽略名單；可能有目錄被重新納入時，補上監看。
+        if watcher is not None:
+            watcher.ignore = ignore
+            if rewatch:
+                try:
+                    watcher.add_tree(project_path)
+                # 如果（except）監看數量用盡，退回輪詢模式。
+                except inotify_backend.WatchLimitReached as e:
+                    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [Backend] {e}，退回輪詢模式", flush=True)
+                    watcher.close()
+                    watcher = None
+        # 以新名單全量重掃（不沿用任何記錄），比對出被剪掉或重新納入的項目。
+        current_snapshot = FileSnapshot(project_path, table=last_snapshot.table, pool=pool,
+                                        structure_only=structure_only, ignore=ignore)
+        events = [e for e in diff_snapshots(last_snapshot, current_snapshot) if e.src_path not in output_file_set]
+        # 更新（update）基準快照與對帳時間。
+        last_snapshot = current_snapshot
+        last_reconcile = time.monotonic()
+        # 返回（return）變動。
+        return events
+
+    # 啟動（start）背景更新器：更新在本行程的背景執行緒進行，掃描不會被它卡住；
+    # 目錄樹快取讓更新只重繪有變動的子樹，並與全量對帳同一節奏定期完整重繪，補上哨兵看不到的變動。
+    updater = BackgroundUpdater(project_uuid, tree_cache=engine.TreeCache(max_age=RECONCILE_INTERVAL_SECONDS))
 
     # 嘗試（try）進入主迴圈。
     try:
+        # 如果（if）暖啟動時發現結構變動，先補一次更新（checkpoint 待更新完成後的對帳時再寫）。
+        if pending_update:
+            updater.request()
+
         # 無窮迴圈（while True）。
         while True:
-            # 休眠（sleep）2 秒。
-            time.sleep(2)
-            
-            # 建立（create）當前快照。
-            current_snapshot = FileSnapshot(project_path)
-            # 初始化（init）有效變動標記。
-            any_effective_change = False
-            
-            # 1. 檢查變動 (新增/修改)
-            # 遍歷（loop）當前快照中的檔案。
-            for path, info in current_snapshot.files.items():
-                # 如果（if）是輸出檔案，跳過（continue）。
-                if path in output_file_set: continue
-                
-                # 解構（unpack）資訊。
-                mtime, size = info
-                # 獲取（get）舊資訊。
-                old_info = last_snapshot.files.get(path)
-                
-                # 如果（if）舊資訊不存在（新增）...
-                if old_info is None:
-                    # 建立（create）模擬事件。
-                    evt = MockEvent(path, 'created', size)
-                    # 如果（if）通過大腦審查...
-                    if throttler.should_process(evt): 
-                        # 輸出（print）偵測訊息。
-                        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [偵測] created: {os.path.basename(path)}", flush=True)
-                        # 標記（mark）為有效變動。
-                        any_effective_change = True
-                
-                # 否則（elif），如果時間或大小變了（修改）...
-                elif mtime > old_info[0] or size != old_info[1]:
-                    # 建立（create）模擬事件。
-                    evt = MockEvent(path, 'modified', size)
-                    # 如果（if）通過大腦審查...
-                    if throttler.should_process(evt): 
-                        # 輸出（print）偵測訊息。
-                        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [偵測] modified: {os.path.basename(path)}", flush=True)
-                        # 標記（mark）為有效變動。
-                        any_effective_change = True
-            
-            # 2. 檢查刪除
-            # 遍歷（loop）舊快照中的檔案。
-            for path in last_snapshot.files:
-                # 如果（if）不在當前快照中（被刪除）...
-                if path not in current_snapshot.files:
-                    # 如果（if）不是輸出檔案...
-                    if path not in output_file_set:
-                        # 輸出（print）偵測訊息。
-                        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [偵測] deleted: {os.path.basename(path)}", flush=True)
-                        # 標記（mark）為有效變動。
-                        any_effective_change = True
+            # 休眠（wait）一個自適應節拍；有待觸發的更新時，最晚在到期時醒來（風暴中去抖動器暫停，不提早醒）；
+            # 收到停止事件就離開迴圈。
+            wait = interval.current if storm else min(interval.current, debouncer.seconds_until_due(time.monotonic()))
+            if stop.wait(wait):
+                break
 
-            # 更新（update）狀態檔。
-            update_status_file()
-            
-            # 如果（if）有有效變動...
-            if any_effective_change:
-                # 觸發（trigger）更新指令。
-                trigger_update_cli(project_uuid)
-            
-            # 如果（if）快照有變化...
-            if current_snapshot.files != last_snapshot.files:
+            # 初始化（init）本輪事件，並記下本輪開始時的快照（比對目錄的新增 / 消失用）。
+            events: List[MockEvent] = []
+            tick_snapshot = last_snapshot
+
+            # 如果（if）projects.json 有變動，檢查本專案的忽略規則是否改變。
+            project_config = config_watcher.poll()
+            if project_config is not None:
+                # 重新套用（reload）規則；產生的變動來自設定而非檔案活動，不經過節流器，直接進入去抖動器。
+                reloaded = reload_ignore_rules(project_config)
+                if reloaded:
+                    updater.mark_dirty(changed_directories(reloaded))
+                    debouncer.add(drop_internal_events(project_path, reloaded), time.monotonic())
+                # 套用（configure）節流器與風暴門檻：改了立即生效。
+                throttle_settings = daemon.throttle_settings_from_project(project_config)
+                storm.configure(throttle_settings)
+                if throttler.configure(throttle_settings):
+                    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [Throttle] 已套用節流設定 (R1 {throttler.hot_threshold} 次/{throttler.hot_period:g}s, R3 {throttler.burst_threshold} 個/{throttler.burst_period:g}s, R4 {throttler.size_threshold_bytes // (1024 * 1024)}MB/{throttler.size_period:g}s, 靜默 {throttler.mute_ttl:g}s–{throttler.mute_ttl_max:g}s)", flush=True)
+
+            # 解除（release）到期的靜默：被凍結的靜默子樹要重新掃描才能補上靜默期間的變動。
+            released = throttler.release_expired()
+
+            # 如果（if）處於 inotify 事件模式...
+            if watcher is not None:
+                # 嘗試（try）讀取事件。
+                try:
+                    # 讀取（read）核心佇列，翻譯成需要重新列出的目錄。
+                    dirty_dirs, dirty_trees = collect_dirty_dirs(project_path, watcher.read_events(), ignore)
+                    # 如果（if）有被點名的目錄，只重新列出它們，其餘目錄整段沿用。
+                    if dirty_dirs or dirty_trees:
+                        current_snapshot = FileSnapshot(project_path, previous=last_snapshot,
+                                                        dirty_dirs=dirty_dirs, dirty_trees=dirty_trees, pool=pool,
+                                                        structure_only=structure_only, ignore=ignore,
+                                                        muted=throttler.muted_paths)
+                        events = diff_snapshots(last_snapshot, current_snapshot)
+                        last_snapshot = current_snapshot
+                # 如果（except）新目錄的監看超出上限...
+                except inotify_backend.WatchLimitReached as e:
+                    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [Backend] {e}，退回輪詢模式", flush=True)
+                    watcher.close()
+                    watcher = None
+
+            # 如果（if）是輪詢模式、佇列溢出、或到了對帳時間，就掃描一次（輪詢模式平時走增量掃描）。
+            need_full_scan = (
+                watcher is None
+                or watcher.overflowed
+                or bool(released)
+                or time.monotonic() - last_reconcile >= RECONCILE_INTERVAL_SECONDS
+            )
+            if need_full_scan:
+                # 如果（if）事件模式下觸發（對帳或溢出），記錄原因。
+                if watcher is not None:
+                    # 如果（if）佇列溢出，輸出提示。
+                    if watcher.overflowed:
+                        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [Backend] inotify 佇列溢出，執行全量對帳", flush=True)
+                    # 清除（reset）溢出旗標。
+                    watcher.overflowed = False
+                # 判斷（check）是否到了全量掃描時間（增量掃描抓不到原地修改）。
+                is_full = time.monotonic() - last_reconcile >= RECONCILE_INTERVAL_SECONDS or watcher is not None
+                # 建立（create）當前快照：全量掃描只沿用靜默子樹，否則只重列 mtime 變動的目錄。
+                current_snapshot = FileSnapshot(project_path, previous=last_snapshot, pool=pool,
+                                                structure_only=structure_only, ignore=ignore,
+                                                muted=throttler.muted_paths, full=is_full)
+                # 比對（diff）快照並合併事件。
+                events.extend(diff_snapshots(last_snapshot, current_snapshot))
                 # 更新（update）基準快照。
                 last_snapshot = current_snapshot
+                # 如果（if）是全量掃描，更新（update）對帳時間並順便寫入 checkpoint。
+                if is_full:
+                    last_reconcile = time.monotonic()
+                    # 如果（if）駐留表中失效的 id 太多（大量刪除 / 改名後），換一張新表。
+                    if len(last_snapshot.table) > 2 * len(last_snapshot) + TABLE_COMPACT_SLACK:
+                        last_snapshot = last_snapshot.compacted()
+                    save_checkpoint()
+                    # 定期保存（save）節流器狀態（滑動窗口隨時在變，跟著對帳節奏寫入）。
+                    save_throttler_state(throttler, throttle_state_file)
+
+            # 如果（if）套用 .gitignore 且本輪有 .gitignore 變動，以重新讀取的規則全量重掃（規則可能放寬或收緊）。
+            if use_gitignore and touches_gitignore(events):
+                print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [Ignore] 偵測到 .gitignore 變更，重新套用", flush=True)
+                ignore = build_ignore_rules(ignore_patterns, project_path)
+                events.extend(reapply_ignore_rules(True))
 
-    # 捕獲（except）中斷信號。
-    except KeyboardInterrupt:
+            # 記錄（mark）變動目錄：不論之後是否被節流器擋下，下次更新都要重列這些目錄（包含新增 / 刪除空資料夾的上層）。
+            updater.mark_dirty(changed_directories(events) | vanished_or_new_dir_parents(tick_snapshot, last_snapshot))
+            # 剔除（filter）內部名單下的變動：只更新快取標記，不觸發更新、不寫入變動日誌。
+            events = drop_internal_events(project_path, events)
+
+            # 如果（if）處於變動風暴中（或本輪剛觸發），事件由風暴模式暫存，不逐筆審查與輸出。
+            if storm.absorb(events, time.monotonic()):
+                # 風暴平息時，暫存的變動不經節流器，一次交給去抖動器（節流器規則是為零星熱點設計的）。
+                effective = [e for e in (storm.end_if_calm(time.monotonic()) or []) if e.src_path not in output_file_set]
+            # 否則（else）審查（process）事件，收集有效變動。
+            else:
+                effective = process_events(events, throttler, output_file_set)
+            # 追加（record）有效變動到變動日誌。
+            record_changes(change_journal, effective)
+
+            # 更新（record）自適應間隔：本輪有任何變動就回到最快間隔，否則退避。
+            if interval.record(bool(events)):
+                print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [Poll] 輪詢間隔調整為 {interval.current:g}s", flush=True)
+
+            # 更新（update）狀態檔。
+            update_status_file()
+
+            # 加入（add）去抖動器：只要有未觸發的變動或未完成的更新，checkpoint 就不能宣稱輸出已同步。
+            debouncer.add(effective, time.monotonic())
+            pending_update = bool(debouncer) or updater.busy or bool(storm)
+
+            # 如果（if）靜默期已過（或已達最大延遲），且不在風暴中...
+            if not storm and debouncer.is_due(time.monotonic()):
+                # 取出（drain）合併後的變動。
+                changes = debouncer.drain()
+                # 如果（if）變動互相抵銷（例如暫存檔建立後又刪除），不需要更新。
+                if not changes:
+                    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [Debounce] 變動已互相抵銷，略過更新", flush=True)
+                    pending_update = updater.busy
+                    continue
+                # 輸出（print）合併摘要。
+                print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [Debounce] 合併 {len(changes)} 個變動為一次更新 ({summarize_changes(changes)})", flush=True)
+                # 送出（request）更新請求：背景執行緒負責執行，本執行緒立刻回到掃描。
+                updater.request()
+
+    # 捕獲（except）中斷信號與 SIGTERM。
+    except (KeyboardInterrupt, SystemExit):
         pass
     # 捕獲（except）所有其他異常。
     except Exception as e:
         # 輸出（print）崩潰訊息。
         print(f"哨兵崩潰: {e}", file=sys.stderr)
+    # 最終（finally）釋放監看器並保存 checkpoint。
+    finally:
+        if watcher is not None:
+            watcher.close()
+        # 關閉（close）變動日誌。
+        if change_journal is not None:
+            change_journal.close()
+        # 關閉（shutdown）掃描執行器。
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        # 關閉（close）背景更新器：等待進行中的更新；來不及完成或仍在排隊的更新視為未完成。
+        if not updater.close():
+            pending_update = True
+        # 如果（if）專案已被刪除（daemon 先移除設定再停止哨兵），不再寫入任何狀態，否則會重新建立剛被清掉的暫存目錄。
+        if not config_watcher.registered():
+            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [Step] 專案已刪除，略過 checkpoint 與節流器狀態", flush=True)
+        # 如果（elif）中斷時仍有未完成的更新，作廢舊 checkpoint，下次冷啟動時由 daemon 補更新。
+        elif pending_update:
+            snapshot_store.discard_checkpoint(project_uuid)
+            save_throttler_state(throttler, throttle_state_file)
+        # 否則（else）寫入 checkpoint 並保存（save）節流器狀態，下次啟動時還原。
+        else:
+            save_checkpoint()
+            save_throttler_state(throttler, throttle_state_file)
+
+# 我們定義（def）主函式（獨立行程模式）。
+def main():
+    # 如果（if）參數不足...
+    if len(sys.argv) < 3:
+        # 退出（exit）。
+        sys.exit(1)
+    # 設定（signal）SIGTERM 轉為 SystemExit，讓 finally 有機會寫入 checkpoint。
+    signal.signal(signal.SIGTERM, _raise_system_exit)
+    # 執行（call）單一專案監控。
+    run_sentry(sys.argv[1:])
 
 # 如果（if）直接執行此腳本...
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+# ==============================================================================
+# 模組職責：snapshot_store.py
+# - 負責哨兵快照 checkpoint 的落盤位置、檔頭格式、完整性檢查與原子寫入。
+# - 位置：temp/projects/<uuid>/sentry_snapshot.bin（與 io_gateway 的專案族譜一致）。
+# - 不理解快照內容本身：payload 由 sentry_worker.FileSnapshot 自行編碼 / 解碼。
+#
+# 檔案格式（little-endian）：
+#   magic(4) = b"LSNP" | version(u16) | fingerprint(32 bytes, sha256)
+#   | payload_len(u64) | crc32(u32) | zlib(payload)
+#
+# fingerprint 由「會影響輸出內容、但不會反映在檔案系統上」的設定算出
+# （專案路徑、目標檔、忽略規則、結構模式）。設定一變，舊 checkpoint 即自動作廢，
+# 因為輸出檔已不再對應那份快照。
+# ==============================================================================
+
+import os
+import json
+import zlib
+import struct
+import hashlib
+import tempfile
+from typing import Optional, Iterable
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+# 測試時以 TEST_TEMP_DIR 改到沙盒（與 daemon.TEMP_DIR 相同，哨兵子行程會繼承）。
+TEMP_PROJECTS_DIR = os.path.join(os.environ.get('TEST_TEMP_DIR') or os.path.join(project_root, 'temp'), 'projects')
+
+CHECKPOINT_FILENAME = "sentry_snapshot.bin"
+MAGIC = b"LSNP"
+# 3：payload 加入 inode 欄位與目錄 (st_dev, st_ino)，供改名 / 搬移偵測；舊版 checkpoint 視為冷啟動。
+FORMAT_VERSION = 3
+
+_HEADER = struct.Struct("<4sH32sQI")
+
+
+def compute_fingerprint(project_path: str, targets: Iterable[str], ignore_patterns: Optional[Iterable[str]],
+                        structure_only: bool = False, use_gitignore: bool = False) -> str:
+    """
+    以專案路徑、目標檔與忽略規則算出設定指紋（十六進位字串）。
+
+    結構模式的快照不記錄 mtime / size，與完整模式的快照不能互相沿用，因此也計入指紋；
+    只在開啟時加入，完整模式的既有 checkpoint 不受影響。
+    套用 .gitignore 的快照剪掉的目錄不同，同樣只在開啟時計入。
+    """
+    material_fields = {
+        "path": project_path,
+        "targets": sorted(str(t) for t in targets),
+        "ignore_patterns": sorted(str(p) for p in (ignore_patterns or [])),
+    }
+    if structure_only:
+        material_fields["structure_only"] = True
+    if use_gitignore:
+        material_fields["use_gitignore"] = True
+    material = json.dumps(material_fields, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def checkpoint_path(project_uuid: str) -> str:
+    return os.path.join(TEMP_PROJECTS_DIR, project_uuid, CHECKPOINT_FILENAME)
+
+
+def _read_header(f) -> Optional[tuple]:
+    raw = f.read(_HEADER.size)
+    if len(raw) != _HEADER.size:
+        return None
+    magic, version, fingerprint, payload_len, crc = _HEADER.unpack(raw)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        return None
+    return fingerprint, payload_len, crc
+
+
+def has_checkpoint(project_uuid: str, fingerprint: str) -> bool:
+    """只讀檔頭，判斷是否存在與當前設定相符的 checkpoint。"""
+    try:
+        with open(checkpoint_path(project_uuid), "rb") as f:
+            header = _read_header(f)
+    except OSError:
+        return False
+    return header is not None and header[0] == bytes.fromhex(fingerprint)
+
+
+def load_checkpoint(project_uuid: str, fingerprint: str) -> Optional[bytes]:
+    """
+    讀取 checkpoint 的 payload。
+
+    指紋不符、格式版本不符、長度或 CRC 錯誤時一律回傳 None（視為冷啟動），不拋例外。
+    """
+    try:
+        with open(checkpoint_path(project_uuid), "rb") as f:
+            header = _read_header(f)
+            if header is None or header[0] != bytes.fromhex(fingerprint):
+                return None
+            compressed = f.read()
+    except (OSError, ValueError):
+        return None
+
+    _, payload_len, crc = header
+    try:
+        payload = zlib.decompress(compressed)
+    except zlib.error:
+        return None
+    if len(payload) != payload_len or zlib.crc32(payload) != crc:
+        return None
+    return payload
+
+
+def save_checkpoint(project_uuid: str, fingerprint: str, payload: bytes) -> None:
+    """以「臨時檔 + os.replace」原子寫入 checkpoint。"""
+    target = checkpoint_path(project_uuid)
+    target_dir = os.path.dirname(target)
+    os.makedirs(target_dir, exist_ok=True)
+
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, bytes.fromhex(fingerprint), len(payload), zlib.crc32(payload))
+    fd, temp_path = tempfile.mkstemp(dir=target_dir, prefix=".snapshot_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(zlib.compress(payload, 6))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, target)
+        temp_path = None
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def discard_checkpoint(project_uuid: str) -> None:
+    try:
+        os.remove(checkpoint_path(project_uuid))
+    except OSError:
+        pass
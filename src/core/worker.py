@@ -19,8 +19,7 @@
 
 import os
 import sys
-from io import StringIO
-from typing import Optional, Set
+from typing import Iterable, Optional, Set
 
 # ------------------------------------------------------------------------------
 # HACK: 專案根目錄導入修正（僅在直接執行 worker.py 時使用）
@@ -47,7 +46,7 @@ from src.core import engine, formatter
 #
 # 流程：
 #   1. 調用 engine.generate_annotated_tree() 產生純內容（raw material）
-#   2. 透過 fake_stdin / fake_stdout 技巧安全執行 formatter.main()
+#   2. 調用 formatter.apply_strategy() 套用 obsidian 包裝（純函式，執行緒安全）
 #   3. 回傳最終成品給 daemon，由 daemon 寫入檔案
 #
 # 回傳格式：
@@ -59,11 +58,20 @@ def execute_update_workflow(
     project_path: str,
     target_doc: str,
     old_content: str,
-    ignore_patterns: Optional[Set[str]] = None
+    ignore_patterns: Optional[Set[str]] = None,
+    scan_workers: int = 1,
+    scan_pool: str = "thread",
+    tree_cache: Optional[engine.TreeCache] = None,
+    changed_dirs: Optional[Iterable[str]] = None,
+    use_gitignore: bool = False,
 ) -> tuple[int, str]:
     """
     【工人專家 v2.0 - 純 Python 版】
     執行完整的「生產 → 包裝」更新流水線。
+
+    scan_workers / scan_pool 原樣轉交 engine，決定頂層資料夾是否並行產生。
+    tree_cache / changed_dirs 原樣轉交 engine，只重繪有變動的子樹（快取由呼叫端持有）。
+    use_gitignore 原樣轉交 engine，另外套用專案內各層的 .gitignore。
     """
     try:
         # ----------------------------------------------------------------------
@@ -72,29 +80,21 @@ def execute_update_workflow(
         raw_material = engine.generate_annotated_tree(
             project_path,
             old_content,
-            ignore_patterns=ignore_patterns
+            ignore_patterns=ignore_patterns,
+            scan_workers=scan_workers,
+            scan_pool=scan_pool,
+            tree_cache=tree_cache,
+            changed_dirs=changed_dirs,
+            use_gitignore=use_gitignore,
         )
 
         # ----------------------------------------------------------------------
         # 步驟 2：包裝線（formatter）
         #
-        # 為了安全地呼叫 formatter.main()
-        # 我們創建 fake_stdin + fake_stdout 模擬一個完整 CLI 執行環境。
+        # 直接呼叫純函式 formatter.apply_strategy()，不替換 sys.stdin / stdout / argv，
+        # 因此本流程可以安全地在哨兵的背景執行緒中執行。
         # ----------------------------------------------------------------------
-        fake_stdin = StringIO(raw_material)
-        fake_stdout = StringIO()
-        fake_argv = ['formatter.py', '--strategy', 'obsidian']
-
-        # 備份原本的系統 I/O 狀態
-        original_stdin, original_stdout, original_argv = sys.stdin, sys.stdout, sys.argv
-
-        try:
-            sys.stdin, sys.stdout, sys.argv = fake_stdin, fake_stdout, fake_argv
-            formatter.main()  # 在隔離環境內安全執行 formatter
-            finished_product = fake_stdout.getvalue()
-        finally:
-            # 無論是否發生錯誤，均要確保 I/O 狀態恢復
-            sys.stdin, sys.stdout, sys.argv = original_stdin, original_stdout, original_argv
+        finished_product = formatter.apply_strategy(raw_material, 'obsidian')
 
         # 工人成功完成任務
         return (0, finished_product.strip())